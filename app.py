@@ -16,8 +16,14 @@ from rq.job import Job
 from logging_config import setup_logging
 setup_logging()
 
-from engine.chain import run_chain
+from engine.chain import run_chain, router_stats
+from engine.models import warm_up_models, model_memory_report
+from engine.rag import invalidate_query_engine, query_engine_cache_stats, retrieval_cache_stats, rerank_stats
+from engine.answer_cache import answer_cache_stats, invalidate_answers
+from engine.agent import invalidate_agent_executor, agent_executor_cache_stats
 from worker import process_repository, get_project_name_from_url
+from scripts.build_index import get_index_stats
+from engine.graph_index import get_graph_index, invalidate_graph, graph_cache_stats, traverse
 # --- THE FIX: Import the config module itself ---
 import config
 
@@ -25,6 +31,9 @@ load_dotenv()
 # --- THE FIX: Call the configuration function on startup ---
 config.configure_google_genai()
 
+if config.WARM_START_MODELS:
+    warm_up_models()
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get("FLASK_SECRET_KEY", "a-default-secret-key-for-dev")
 
@@ -56,12 +65,28 @@ def list_projects():
         logging.error(f"Error listing projects: {e}", exc_info=True)
         return jsonify({"error": "Could not retrieve project list."}), 500
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Reports in-process model memory and cache statistics."""
+    return jsonify({
+        "models": model_memory_report(),
+        "query_engines": query_engine_cache_stats(),
+        **retrieval_cache_stats(),
+        "rerank": rerank_stats(),
+        "answers": answer_cache_stats(),
+        "agent_executors": agent_executor_cache_stats(),
+        "code_graphs": graph_cache_stats(),
+        "router": router_stats(),
+    })
+
 @app.route("/query", methods=["POST"])
 def query():
     data = request.get_json()
     question = data.get("question")
     project_id = data.get("project_id")
     session_id = data.get("session_id")
+    # Clients can ask for a freshly generated answer instead of a cached one.
+    use_cache = data.get("use_cache", True) is not False
 
     if not question or not project_id:
         logging.error("Missing question or project_id in the request.")
@@ -77,7 +102,7 @@ def query():
                 logging.info(f"Generated new session ID: {session_id}")
             else:
                 logging.info(f"Using provided session ID: {session_id}")
-            for event in run_chain(question, project_id, session_id):
+            for event in run_chain(question, project_id, session_id, use_cache=use_cache):
                 yield f"data: {json.dumps(event)}\n\n"
         except Exception as e:
             logging.error(f"An error occurred during stream generation: {e}", exc_info=True)
@@ -147,12 +172,63 @@ def get_project_status(job_id):
             "status": status,
             "detailed_status": detailed_status,
             "message": message,
+            "progress": meta.get('index_progress'),
             "result": result
         }), 200
     except Exception:
         return jsonify({"error": "Job not found or invalid."}), 404
 
 
+@app.route("/projects/<project_name>/index/stats", methods=["GET"])
+def get_project_index_stats(project_name):
+    """Reports live and dead chunk counts for a project's vector store."""
+    if not project_name or "/" in project_name or ".." in project_name:
+        return jsonify({"error": "Invalid project name."}), 400
+    if not config.get_vector_store_path(project_name).is_dir():
+        return jsonify({"error": "Project is not indexed."}), 404
+    try:
+        return jsonify(get_index_stats(project_name)), 200
+    except Exception as e:
+        logging.error(f"Error reading index stats for {project_name}: {e}", exc_info=True)
+        return jsonify({"error": "Could not read index stats."}), 500
+
+
+@app.route("/projects/<project_name>/graph/traverse", methods=["GET"])
+def traverse_project_graph(project_name):
+    """
+    Multi-hop call graph queries: k-hop callers/callees, impact sets and call paths.
+    Query parameters: mode, entity, target (mode=path), depth, min_confidence, max_nodes.
+    """
+    if not project_name or "/" in project_name or ".." in project_name:
+        return jsonify({"error": "Invalid project name."}), 400
+    graph_path = config.get_code_graph_path(project_name)
+    if not graph_path.is_file():
+        return jsonify({"error": "Code graph not found for project."}), 404
+
+    args = request.args
+    if not args.get("mode") or not args.get("entity"):
+        return jsonify({"error": "Missing 'mode' or 'entity'."}), 400
+    try:
+        depth = args.get("depth", type=int)
+        max_nodes = args.get("max_nodes", type=int)
+        min_confidence = float(args.get("min_confidence", 0.8))
+        result = traverse(
+            get_graph_index(graph_path),
+            args["mode"],
+            args["entity"],
+            target=args.get("target"),
+            depth=depth,
+            min_confidence=min_confidence,
+            max_nodes=max_nodes,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error traversing code graph for {project_name}: {e}", exc_info=True)
+        return jsonify({"error": "Could not query the code graph."}), 500
+    return jsonify(result), 200
+
+
 @app.route("/projects/<project_name>", methods=["DELETE"])
 def delete_project(project_name):
     """Delete a project and all its associated data."""
@@ -247,6 +323,11 @@ def delete_project(project_name):
                 return jsonify({"error": "Project directory is in use. Close any Explorer windows or editors open in this repo and try again."}), 423
             logging.info(f"Deleted repository directory: {project_path}")
         
+        # Release the cached query engine and agent before their files are removed
+        invalidate_query_engine(project_name)
+        invalidate_answers(project_name)
+        invalidate_agent_executor(project_name)
+
         # Delete vector store directory
         # Resolve vector store and code graph paths using config
         vector_store_path = str(config.get_vector_store_path(project_name))
@@ -258,10 +339,14 @@ def delete_project(project_name):
             logging.info(f"Deleted vector store directory: {vector_store_path}")
         
         # Delete code graph file
-        code_graph_path = str(config.get_code_graph_path(project_name))
-        if os.path.exists(code_graph_path):
-            os.remove(code_graph_path)
-            logging.info(f"Deleted code graph file: {code_graph_path}")
+        for graph_format in config.CODE_GRAPH_SUFFIXES:
+            code_graph_path = str(config.get_code_graph_path(project_name, graph_format))
+            invalidate_graph(code_graph_path)
+            # SQLite graphs keep '-wal' and '-shm' files next to the database.
+            for path in (code_graph_path, f"{code_graph_path}-wal", f"{code_graph_path}-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+                    logging.info(f"Deleted code graph file: {path}")
         
         logging.info(f"Successfully deleted project: {project_name}")
         return jsonify({"message": f"Project '{project_name}' deleted successfully."}), 200
@@ -1,6 +1,7 @@
 # --- config.py ---
 
 import os
+import json
 from pathlib import Path
 import google.generativeai as genai
 import logging
@@ -12,14 +13,148 @@ DATA_PATH = ROOT_DIR / "data"
 VECTOR_STORE_BASE_PATH = DATA_PATH / "vector_stores"
 CODE_GRAPH_BASE_PATH = DATA_PATH / "code_graphs"
 REPOS_BASE_PATH = DATA_PATH / "repos"
+ONNX_MODEL_PATH = DATA_PATH / "onnx_models"
 
 # --- Model Configuration ---
 AGENT_MODEL_NAME = "gemini-2.5-flash"
 CLASSIFICATION_MODEL_NAME = "gemini-2.5-flash"
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+RERANKER_MODEL_NAME = "BAAI/bge-reranker-base"
+# Inference backend for the embedding model and the reranker: 'torch' (full
+# precision PyTorch via sentence-transformers) or 'onnx' (ONNX Runtime, exported
+# on first use; see engine/onnx_models.py). Each can be overridden separately.
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch").lower()
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", INFERENCE_BACKEND).lower()
+RERANKER_BACKEND = os.environ.get("RERANKER_BACKEND", INFERENCE_BACKEND).lower()
+# Quantize exported ONNX weights to int8 (dynamic quantization).
+ONNX_QUANTIZE = os.environ.get("ONNX_QUANTIZE", "True").lower() in ('true', '1', 't')
+# ONNX Runtime intra-op threads per session; 0 lets ONNX Runtime use every core.
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", "0"))
+
+# --- Reranker Batching ---
+# Concurrent rerank requests are merged into one forward pass: the batcher waits up
+# to RERANK_BATCH_WAIT_MS for more requests, up to RERANK_MAX_BATCH_PAIRS pairs.
+RERANK_BATCH_WAIT_MS = float(os.environ.get("RERANK_BATCH_WAIT_MS", "5"))
+RERANK_MAX_BATCH_PAIRS = int(os.environ.get("RERANK_MAX_BATCH_PAIRS", "64"))
+
+# Load the embedding/reranker models when the API server or worker starts,
+# instead of on the first query/job that needs them.
+WARM_START_MODELS = os.environ.get("WARM_START_MODELS", "False").lower() in ('true', '1', 't')
+
+# --- Query Engine Cache ---
+# Upper bounds for the per-project RAG engines kept in memory by the API process.
+RAG_ENGINE_CACHE_MAX_ENTRIES = int(os.environ.get("RAG_ENGINE_CACHE_MAX_ENTRIES", "16"))
+RAG_ENGINE_CACHE_MAX_BYTES = int(os.environ.get("RAG_ENGINE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# --- Retrieval Caches ---
+# Query embeddings (keyed by model and query text) and rerank scores (keyed by
+# project, index version, query and chunk content), reused across requests.
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+RERANK_SCORE_CACHE_MAX_ENTRIES = int(os.environ.get("RERANK_SCORE_CACHE_MAX_ENTRIES", "100000"))
+
+# --- Adaptive Reranking ---
+# RERANK_MODE 'full' cross-encodes every retrieved candidate. 'adaptive' skips
+# reranking when the retrieval scores already separate the top-n from the rest by
+# at least RERANK_SKIP_MARGIN (relative to the best score), and otherwise reranks
+# in score-ordered batches of RERANK_BATCH_SIZE, stopping once the top-n has not
+# changed for RERANK_PATIENCE batches.
+RERANK_MODE = os.environ.get("RERANK_MODE", "full").lower()
+RERANK_SKIP_MARGIN = float(os.environ.get("RERANK_SKIP_MARGIN", "0.25"))
+RERANK_BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", "3"))
+RERANK_PATIENCE = int(os.environ.get("RERANK_PATIENCE", "1"))
+# Per-project overrides as JSON, e.g. '{"my_project": {"mode": "adaptive", "skip_margin": 0.3}}'.
+RERANK_PROJECT_OVERRIDES = json.loads(os.environ.get("RERANK_PROJECT_OVERRIDES", "{}"))
+
+# --- Answer Cache ---
+# RAG answers are reused for the same project and index version when a new
+# question matches a stored one exactly or with at least
+# ANSWER_CACHE_MIN_SIMILARITY cosine similarity (and names the same identifiers).
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "True").lower() in ('true', '1', 't')
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+ANSWER_CACHE_MIN_SIMILARITY = float(os.environ.get("ANSWER_CACHE_MIN_SIMILARITY", "0.95"))
+
+# --- Hybrid Retrieval ---
+# RAG retrieval fuses dense (vector) and lexical (BM25 over identifiers) results by
+# reciprocal rank. Questions that name identifiers found verbatim in the code skip
+# the vector search and go straight to the chunks containing them.
+HYBRID_RETRIEVAL_ENABLED = os.environ.get("HYBRID_RETRIEVAL_ENABLED", "True").lower() in ('true', '1', 't')
+HYBRID_IDENTIFIER_SHORTCIRCUIT = os.environ.get("HYBRID_IDENTIFIER_SHORTCIRCUIT", "True").lower() in ('true', '1', 't')
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", "60"))
+# Candidates handed to the reranker.
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "10"))
+
+# --- Query Routing ---
+# The local router answers obvious RAG/AGENT decisions without an LLM call and
+# falls back to the LLM router when its nearest-exemplar match is weak.
+LOCAL_ROUTER_ENABLED = os.environ.get("LOCAL_ROUTER_ENABLED", "True").lower() in ('true', '1', 't')
+ROUTER_MIN_SIMILARITY = float(os.environ.get("ROUTER_MIN_SIMILARITY", "0.6"))
+ROUTER_MIN_MARGIN = float(os.environ.get("ROUTER_MIN_MARGIN", "0.08"))
+ROUTER_CACHE_MAX_ENTRIES = int(os.environ.get("ROUTER_CACHE_MAX_ENTRIES", "1024"))
+ROUTER_HISTORY_TURNS = 6
+# Fraction of fast-path decisions re-checked by the LLM router in the background,
+# to measure how often the two agree.
+ROUTER_SHADOW_RATE = float(os.environ.get("ROUTER_SHADOW_RATE", "0.02"))
+# At most this many shadow checks run or wait at once; further samples are skipped.
+ROUTER_SHADOW_MAX_PENDING = int(os.environ.get("ROUTER_SHADOW_MAX_PENDING", "4"))
+
+# Start vector retrieval + reranking while the LLM router is still deciding.
+# The result is used if the route is RAG and discarded otherwise.
+SPECULATIVE_RETRIEVAL = os.environ.get("SPECULATIVE_RETRIEVAL", "False").lower() in ('true', '1', 't')
+SPECULATIVE_RETRIEVAL_WORKERS = int(os.environ.get("SPECULATIVE_RETRIEVAL_WORKERS", "4"))
+
+# --- Vector Index Construction ---
+# Files are read and chunked INDEX_FILE_BATCH_SIZE at a time on a background
+# thread that runs at most INDEX_PREFETCH_BATCHES batches ahead of embedding,
+# so memory use does not grow with the size of the repository.
+INDEX_FILE_BATCH_SIZE = int(os.environ.get("INDEX_FILE_BATCH_SIZE", "64"))
+INDEX_PREFETCH_BATCHES = int(os.environ.get("INDEX_PREFETCH_BATCHES", "2"))
+# Larger .py files (generated or vendored bundles) are not indexed.
+INDEX_MAX_FILE_BYTES = int(os.environ.get("INDEX_MAX_FILE_BYTES", str(1024 * 1024)))
+# Chunks per embedding forward pass. Sorting chunks by length first keeps the
+# padding inside each batch small. INDEX_EMBED_WORKERS batches run concurrently,
+# each with INDEX_EMBED_THREADS torch threads (0 = split all cores between them).
+INDEX_EMBED_BATCH_SIZE = int(os.environ.get("INDEX_EMBED_BATCH_SIZE", "32"))
+INDEX_EMBED_WORKERS = int(os.environ.get("INDEX_EMBED_WORKERS", "1"))
+INDEX_EMBED_THREADS = int(os.environ.get("INDEX_EMBED_THREADS", "0"))
+INDEX_EMBED_SORT_BY_LENGTH = os.environ.get("INDEX_EMBED_SORT_BY_LENGTH", "True").lower() in ('true', '1', 't')
+# Content-addressed embedding cache shared by every project: identical chunks
+# (vendored files, forks, re-indexes) are embedded once per model.
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE_ENABLED", "True").lower() in ('true', '1', 't')
+EMBEDDING_CACHE_PATH = Path(os.environ.get("EMBEDDING_CACHE_PATH", str(DATA_PATH / "embedding_cache.sqlite")))
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("EMBEDDING_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# --- Code Graph Construction ---
+# Worker processes used to parse files (0 = one per CPU core). Projects with fewer
+# than GRAPH_PARALLEL_MIN_FILES files are parsed in-process to skip pool start-up.
+GRAPH_BUILD_WORKERS = int(os.environ.get("GRAPH_BUILD_WORKERS", "0"))
+GRAPH_PARALLEL_MIN_FILES = int(os.environ.get("GRAPH_PARALLEL_MIN_FILES", "200"))
+# An unresolved obj.method() call is linked to every definition named `method`,
+# unless more than this many exist (the guess would be noise).
+GRAPH_MAX_HEURISTIC_CANDIDATES = int(os.environ.get("GRAPH_MAX_HEURISTIC_CANDIDATES", "25"))
+# On-disk format of code graphs: 'json' (one JSON document), 'csr' (compact
+# binary arrays that are memory-mapped instead of parsed; see engine/graph_storage.py)
+# or 'sqlite' (indexed tables with per-file updates; see engine/graph_sqlite.py).
+CODE_GRAPH_FORMAT = os.environ.get("CODE_GRAPH_FORMAT", "json").lower()
+# With the 'csr' or 'sqlite' format, also write the JSON graph for tools that read it directly.
+CODE_GRAPH_EXPORT_JSON = os.environ.get("CODE_GRAPH_EXPORT_JSON", "False").lower() in ('true', '1', 't')
+
+# --- Code Graph Traversal ---
+# Hard limits for multi-hop call graph queries (agent tool and HTTP endpoint).
+GRAPH_TRAVERSAL_MAX_DEPTH = int(os.environ.get("GRAPH_TRAVERSAL_MAX_DEPTH", "6"))
+GRAPH_TRAVERSAL_MAX_NODES = int(os.environ.get("GRAPH_TRAVERSAL_MAX_NODES", "500"))
+GRAPH_TRAVERSAL_TIMEOUT_MS = float(os.environ.get("GRAPH_TRAVERSAL_TIMEOUT_MS", "100"))
+
+# --- Code Graph Cache ---
+# Loaded graphs are shared by every request in a process and reloaded when the
+# file changes. JSON graphs count against the memory budget; memory-mapped and
+# SQLite graphs barely do.
+GRAPH_CACHE_MAX_ENTRIES = int(os.environ.get("GRAPH_CACHE_MAX_ENTRIES", "8"))
+GRAPH_CACHE_MAX_BYTES = int(os.environ.get("GRAPH_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
 
 # --- Agent Configuration ---
 AGENT_VERBOSE = os.environ.get("AGENT_VERBOSE", "False").lower() in ('true', '1', 't')
+AGENT_CACHE_MAX_ENTRIES = int(os.environ.get("AGENT_CACHE_MAX_ENTRIES", "16"))
 
 # --- NEW: Global API Key Configuration ---
 def configure_google_genai():
@@ -38,8 +173,12 @@ def configure_google_genai():
         logging.error(f"Failed to configure Google Generative AI: {e}")
 
 # --- (The rest of the functions remain the same) ---
-def get_code_graph_path(project_name: str) -> Path:
-    return CODE_GRAPH_BASE_PATH / f"{project_name}_graph.json"
+CODE_GRAPH_SUFFIXES = {"json": ".json", "csr": ".csr", "sqlite": ".sqlite"}
+
+def get_code_graph_path(project_name: str, graph_format: str | None = None) -> Path:
+    """Path of a project's code graph in the configured (or the given) format."""
+    suffix = CODE_GRAPH_SUFFIXES[graph_format or CODE_GRAPH_FORMAT]
+    return CODE_GRAPH_BASE_PATH / f"{project_name}_graph{suffix}"
 
 def get_vector_store_path(project_name: str) -> Path:
     return VECTOR_STORE_BASE_PATH / project_name
@@ -47,6 +186,23 @@ def get_vector_store_path(project_name: str) -> Path:
 def get_collection_name(project_name: str) -> str:
     return f"{project_name}_embeddings"
 
+def get_index_manifest_path(project_name: str) -> Path:
+    return get_vector_store_path(project_name) / "index_manifest.json"
+
+def get_rerank_settings(project_name: str | None = None) -> dict:
+    """Reranking settings for a project: the global defaults plus its overrides."""
+    settings = {
+        "mode": RERANK_MODE,
+        "skip_margin": RERANK_SKIP_MARGIN,
+        "batch_size": RERANK_BATCH_SIZE,
+        "patience": RERANK_PATIENCE,
+    }
+    settings.update(RERANK_PROJECT_OVERRIDES.get(project_name, {}))
+    return settings
+
+def get_lexical_index_path(project_name: str) -> Path:
+    return get_vector_store_path(project_name) / "lexical_index.json"
+
 def setup_directories():
     os.makedirs(TARGET_REPO_PATH, exist_ok=True)
     os.makedirs(WORKSPACE_PATH, exist_ok=True)
@@ -2,12 +2,13 @@
 
 import os
 import logging
-from langchain import hub
 from langchain.agents import create_react_agent, AgentExecutor
 from langchain.tools import Tool
+from langchain_core.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 import config
+from engine.cache import LRUCache
 from engine.context import ProjectContext
 from tools.file_system import (
     ReadFileTool, 
@@ -16,12 +17,77 @@ from tools.file_system import (
     UpdateFileInWorkspaceTool,
     ListWorkspaceFilesTool
 )
-from tools.code_graph import QueryCodeGraphTool
+from tools.code_graph import QueryCodeGraphTool, TraceCallGraphTool
 from tools.test_generator import GenerateTestsTool
 from tools.test_runner import RunTestsTool
 from tools.refactor import RefactorCodeTool
 from tools.bug_fixer import FixBugTool
 
+# Bundled copy of the "hwchase17/react-chat" prompt from the LangChain hub, so
+# building an agent never needs a network round-trip.
+REACT_CHAT_TEMPLATE = """Assistant is a large language model trained by OpenAI.
+
+Assistant is designed to be able to assist with a wide range of tasks, from answering simple questions to providing in-depth explanations and discussions on a wide range of topics. As a language model, Assistant is able to generate human-like text based on the input it receives, allowing it to engage in natural-sounding conversations and provide responses that are coherent and relevant to the topic at hand.
+
+Assistant is constantly learning and improving, and its capabilities are constantly evolving. It is able to process and understand large amounts of text, and can use this knowledge to provide accurate and informative responses to a wide range of questions. Additionally, Assistant is able to generate its own text based on the input it receives, allowing it to engage in discussions and provide explanations and descriptions on a wide range of topics.
+
+Overall, Assistant is a powerful tool that can help with a wide range of tasks and provide valuable insights and information on a wide range of topics. Whether you need help with a specific question or just want to have a conversation about a particular topic, Assistant is here to assist.
+
+TOOLS:
+------
+
+Assistant has access to the following tools:
+
+{tools}
+
+To use a tool, please use the following format:
+
+```
+Thought: Do I need to use a tool? Yes
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+```
+
+When you have a response to say to the Human, or if you do not need to use a tool, you MUST use the format:
+
+```
+Thought: Do I need to use a tool? No
+Final Answer: [your response here]
+```
+
+Begin!
+
+Previous conversation history:
+{chat_history}
+
+New input: {input}
+{agent_scratchpad}"""
+
+REACT_CHAT_PROMPT = PromptTemplate.from_template(REACT_CHAT_TEMPLATE)
+
+# Executors are keyed by project and by the versions of the assets their tools
+# read, so a re-index produces a fresh executor. They hold no per-session state:
+# chat history is passed in with every call.
+_agent_executors = LRUCache("agent_executors", max_entries=config.AGENT_CACHE_MAX_ENTRIES)
+
+def get_agent_executor(context: ProjectContext) -> AgentExecutor:
+    """Returns the cached AgentExecutor for a project, building it on first use."""
+    key = (context.project_id, context.index_version, context.code_graph_version)
+    agent_executor = _agent_executors.get(key)
+    if agent_executor is None:
+        # Drop executors built against older versions of this project's assets.
+        _agent_executors.invalidate_where(lambda k: k[0] == context.project_id)
+        agent_executor = create_agent_executor(context)
+        _agent_executors.put(key, agent_executor)
+    return agent_executor
+
+def invalidate_agent_executor(project_id: str) -> int:
+    return _agent_executors.invalidate_where(lambda k: k[0] == project_id)
+
+def agent_executor_cache_stats() -> dict:
+    return _agent_executors.stats()
+
 def create_agent_executor(context: ProjectContext) -> AgentExecutor:
     """
     Creates and returns a LangChain AgentExecutor scoped to a specific project.
@@ -39,6 +105,7 @@ def create_agent_executor(context: ProjectContext) -> AgentExecutor:
         ReadFileTool(context),
         ListFilesTool(context),
         QueryCodeGraphTool(context),
+        TraceCallGraphTool(context),
         CreateFileInWorkspaceTool(context),
         UpdateFileInWorkspaceTool(context),
         ListWorkspaceFilesTool(context),
@@ -57,8 +124,7 @@ def create_agent_executor(context: ProjectContext) -> AgentExecutor:
         ) for tool in all_tools
     ]
     
-    prompt = hub.pull("hwchase17/react-chat")
-    agent_runnable = create_react_agent(llm, langchain_tools, prompt)
+    agent_runnable = create_react_agent(llm, langchain_tools, REACT_CHAT_PROMPT)
     agent_executor = AgentExecutor(
         agent=agent_runnable,
         tools=langchain_tools,
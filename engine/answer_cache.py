@@ -0,0 +1,154 @@
+# --- engine/answer_cache.py ---
+
+import logging
+import re
+import time
+from threading import Lock
+from typing import Callable
+
+import numpy as np
+
+import config
+from engine.cache import LRUCache
+from engine.lexical_index import query_identifiers
+from engine.router import normalize_query
+
+def stream_pieces(answer: str, size: int = 64) -> list[str]:
+    """Splits a stored answer into chunks of about `size` characters, at whitespace."""
+    pieces, current = [], ""
+    for token in re.split(r"(?<=\s)", answer):
+        current += token
+        if len(current) >= size:
+            pieces.append(current)
+            current = ""
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class AnswerCache:
+    """
+    Caches RAG answers per (project, index version). A question is answered
+    from the cache if it matches a stored one exactly (after normalization),
+    or if its embedding is at least `min_similarity` cosine-similar to a
+    stored question that names the same identifiers. Entries expire after
+    `ttl_seconds`, and a project's entries are dropped as soon as a newer
+    index version is stored. Each answer is stored with the sources it was
+    based on, so a cache hit can show them too.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, min_similarity: float, clock: Callable[[], float] = time.monotonic):
+        self._entries = LRUCache("answers", max_entries=max_entries, on_evict=self._forget)
+        self._ttl = ttl_seconds
+        self._min_similarity = min_similarity
+        self._clock = clock
+        # (project, version) -> {entry key: (unit query vector, identifiers)} for similarity lookups.
+        self._scopes: dict[tuple[str, str], dict[tuple, tuple]] = {}
+        self._lock = Lock()
+        self._counts = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "expired": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    def _forget(self, key: tuple, entry: dict):
+        with self._lock:
+            scope = self._scopes.get(key[:2])
+            if scope is not None:
+                scope.pop(key, None)
+                if not scope:
+                    del self._scopes[key[:2]]
+
+    def _fresh(self, key: tuple) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._clock() - entry["created"] > self._ttl:
+            self._entries.invalidate(key)
+            self._count("expired")
+            return None
+        return entry
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _most_similar(self, project: str, version: str, query: str, embedding) -> tuple | None:
+        identifiers = frozenset(query_identifiers(query))
+        with self._lock:
+            candidates = [
+                (key, vector) for key, (vector, names) in self._scopes.get((project, version), {}).items()
+                if names == identifiers
+            ]
+        if not candidates:
+            return None
+        vector = self._unit(embedding)
+        similarities = np.stack([candidate for _, candidate in candidates]) @ vector
+        best = int(np.argmax(similarities))
+        return candidates[best][0] if similarities[best] >= self._min_similarity else None
+
+    def lookup(self, project: str, version: str, query: str,
+               embed: Callable[[], list[float]] | None = None) -> tuple[str, list[dict]] | None:
+        """
+        The cached (answer, sources) for a question, or None. `embed` returns the
+        question's embedding; it is only called when there is no exact match.
+        """
+        entry = self._fresh((project, version, normalize_query(query)))
+        if entry is not None:
+            self._count("exact_hits")
+            return entry["answer"], entry["sources"]
+        if embed is not None and (project, version) in self._scopes:
+            key = self._most_similar(project, version, query, embed())
+            entry = self._fresh(key) if key is not None else None
+            if entry is not None:
+                self._count("semantic_hits")
+                logging.info(f"--- [ANSWER CACHE] '{query}' matched cached question '{entry['query']}' ---")
+                return entry["answer"], entry["sources"]
+        self._count("misses")
+        return None
+
+    def store(self, project: str, version: str, query: str, answer: str, sources: list[dict] | None = None, embedding=None):
+        # Answers for an older index version can never be served again.
+        self._entries.invalidate_where(lambda key: key[0] == project and key[1] != version)
+        key = (project, version, normalize_query(query))
+        sources = list(sources or [])
+        entry = {"query": query, "answer": answer, "sources": sources, "created": self._clock()}
+        self._entries.put(key, entry, size_bytes=len(answer) + len(repr(sources)))
+        if embedding is not None:
+            with self._lock:
+                self._scopes.setdefault((project, version), {})[key] = (
+                    self._unit(embedding), frozenset(query_identifiers(query)),
+                )
+
+    def invalidate_project(self, project: str) -> int:
+        return self._entries.invalidate_where(lambda key: key[0] == project)
+
+    def stats(self) -> dict:
+        entries = self._entries.stats()
+        with self._lock:
+            counts = dict(self._counts)
+        hits = counts["exact_hits"] + counts["semantic_hits"]
+        lookups = hits + counts["misses"]
+        return {
+            **counts,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries["entries"],
+            "approx_bytes": entries["approx_bytes"],
+            "evictions": entries["evictions"],
+        }
+
+
+answer_cache = AnswerCache(
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS,
+    min_similarity=config.ANSWER_CACHE_MIN_SIMILARITY,
+)
+
+def answer_cache_stats() -> dict:
+    return answer_cache.stats()
+
+def invalidate_answers(project_name: str) -> int:
+    """Drops every cached answer for a project, e.g. after it was deleted."""
+    return answer_cache.invalidate_project(project_name)
@@ -0,0 +1,120 @@
+# --- engine/cache.py ---
+
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by entry count and, optionally, by the
+    approximate memory of its entries. Keeps hit/miss/eviction counters.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        max_bytes: int | None = None,
+        on_evict: Callable[[Hashable, Any], None] | None = None,
+    ):
+        self.name = name
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._on_evict = on_evict
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size_bytes: int = 0):
+        evicted = []
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._entries[key] = (value, size_bytes)
+            self._total_bytes += size_bytes
+            # Always keep the entry just inserted, even if it alone exceeds the budget.
+            while len(self._entries) > 1 and (
+                len(self._entries) > self._max_entries
+                or (self._max_bytes is not None and self._total_bytes > self._max_bytes)
+            ):
+                evicted_key, (evicted_value, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+                evicted.append((evicted_key, evicted_value))
+        if evicted:
+            # Keys can hold user query text, and hot caches evict constantly; the
+            # eviction counter in stats() is the signal to watch.
+            logging.debug(f"--- [CACHE:{self.name}] Evicted {len(evicted)} entries ---")
+        for evicted_key, evicted_value in evicted:
+            self._notify_evict(evicted_key, evicted_value)
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._total_bytes -= entry[1]
+            self.invalidations += 1
+        self._notify_evict(key, entry[0])
+        return True
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drops every entry whose key matches predicate. Returns the number dropped."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            dropped = [(key, self._entries.pop(key)) for key in keys]
+            for _, (_, size) in dropped:
+                self._total_bytes -= size
+            self.invalidations += len(dropped)
+        for key, (value, _) in dropped:
+            self._notify_evict(key, value)
+        return len(dropped)
+
+    def clear(self):
+        self.invalidate_where(lambda key: True)
+
+    def _notify_evict(self, key, value):
+        if self._on_evict is None:
+            return
+        try:
+            self._on_evict(key, value)
+        except Exception as e:
+            logging.warning(f"--- [CACHE:{self.name}] Eviction hook failed for '{key}': {e} ---")
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self._max_entries,
+                "approx_bytes": self._total_bytes,
+                "max_bytes": self._max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
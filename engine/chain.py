@@ -1,6 +1,7 @@
 # --- engine/chain.py ---
 
 import logging
+import time
 from typing import Literal
 from threading import Lock
 
@@ -13,8 +14,11 @@ from dotenv import load_dotenv
 
 import config
 from engine.context import ProjectContext, ProjectNotIndexedError
-from engine.rag import get_query_engine
-from engine.agent import create_agent_executor
+from llama_index.core import QueryBundle
+from engine.rag import get_query_engine, get_query_embedding, node_sources, retrieve_nodes, speculative_retrieval
+from engine.answer_cache import answer_cache, stream_pieces
+from engine.agent import get_agent_executor
+from engine.router import QueryRouter
 
 load_dotenv()
 
@@ -83,10 +87,35 @@ Respond with a JSON object containing a single key 'route' with a value of eithe
     _routing_chain = prompt | llm | output_parser
     return _routing_chain
 
+def _route_with_llm(query: str, chat_history) -> str | None:
+    routing_decision = get_routing_chain().invoke({
+        "input": query,
+        "chat_history": chat_history
+    })
+    return routing_decision.get("route")
+
+_query_router = QueryRouter(llm_router=_route_with_llm)
+
+def router_stats() -> dict:
+    stats = _query_router.stats()
+    stats["speculative_retrieval"] = speculative_retrieval.stats()
+    return stats
+
+
+def run_chain(query: str, project_id: str, session_id: str, use_cache: bool = True):
+    """
+    The main entry point for processing a user query for a specific project.
+    With use_cache=False a RAG answer is always generated fresh (and replaces
+    any cached answer for the question).
+
+    A RAG answer is preceded by a 'sources' event listing the chunks it is
+    based on, sent before generation starts, and followed by a 'timing' event
+    with the duration of each stage in milliseconds.
+    """
+    started = time.perf_counter()
+    def elapsed_ms(since: float) -> float:
+        return round((time.perf_counter() - since) * 1000, 1)
 
-def run_chain(query: str, project_id: str, session_id: str):
-    """The main entry point for processing a user query for a specific project."""
-    
     try:
         context = ProjectContext(project_id=project_id)
         logging.info(f"Context validated for project '{context.project_id}'")
@@ -100,17 +129,29 @@ def run_chain(query: str, project_id: str, session_id: str):
     memory = _memory_manager.get_memory(session_id)
     chat_history = memory.load_memory_variables({}).get("history", [])
 
-    routing_chain = get_routing_chain()
-    routing_decision = routing_chain.invoke({
-        "input": query,
-        "chat_history": chat_history
-    })
-    route = routing_decision.get("route")
+    # Speculation only starts when routing actually has to wait for the LLM;
+    # fast-path decisions return before it would help.
+    speculation = None
+    def start_speculation():
+        nonlocal speculation
+        if config.SPECULATIVE_RETRIEVAL:
+            speculation = speculative_retrieval.start(context, query)
+
+    routing_started = time.perf_counter()
+    if config.LOCAL_ROUTER_ENABLED:
+        route = _query_router.route(query, chat_history, before_llm=start_speculation)
+    else:
+        start_speculation()
+        route = _route_with_llm(query, chat_history)
+    timings = {"route_ms": elapsed_ms(routing_started)}
+
+    if speculation is not None and route != "RAG":
+        speculative_retrieval.discard(speculation)
     logging.info(f"--- [ROUTE] Chosen: {route} ---")
 
     if route == "AGENT":
         logging.info("--- [AGENT] Invoking Agent Executor... ---")
-        agent_executor = create_agent_executor(context)
+        agent_executor = get_agent_executor(context)
         inputs = {"input": query, "chat_history": chat_history}
         
         # --- ENHANCED STREAMING WITH STRUCTURED EVENTS ---
@@ -182,14 +223,62 @@ def run_chain(query: str, project_id: str, session_id: str):
 
     elif route == "RAG":
         # ... (RAG logic remains the same) ...
+        index_version = context.index_version
+        if config.ANSWER_CACHE_ENABLED and use_cache:
+            lookup_started = time.perf_counter()
+            cached = answer_cache.lookup(
+                context.project_id, index_version, query, embed=lambda: get_query_embedding(query)
+            )
+            timings["cache_lookup_ms"] = elapsed_ms(lookup_started)
+            if cached is not None:
+                logging.info("--- [RAG] Serving answer from cache ---")
+                if speculation is not None:
+                    speculative_retrieval.discard(speculation)
+                cached_answer, cached_sources = cached
+                yield {"type": "sources", "sources": cached_sources, "cached": True}
+                for piece in stream_pieces(cached_answer):
+                    yield {"type": "chunk", "content": piece, "cached": True}
+                _memory_manager.save_context(session_id, {"input": query}, {"output": cached_answer})
+                timings["total_ms"] = elapsed_ms(started)
+                yield {"type": "timing", "timings": timings}
+                return
+
         logging.info("--- [RAG] Invoking Stream... ---")
-        query_engine = get_query_engine(context)
-        response = query_engine.query(query)
+        query_bundle = QueryBundle(query)
+        if speculation is not None:
+            # Retrieval overlapped with routing; only the remaining wait is on the critical path.
+            wait_started = time.perf_counter()
+            query_engine, nodes, retrieval_timings = speculative_retrieval.claim(speculation)
+            timings["speculation_wait_ms"] = elapsed_ms(wait_started)
+        else:
+            engine_started = time.perf_counter()
+            query_engine = get_query_engine(context)
+            engine_ms = elapsed_ms(engine_started)
+            nodes, retrieval_timings = retrieve_nodes(query_engine, query_bundle)
+            retrieval_timings["engine_ms"] = engine_ms
+        timings.update(retrieval_timings)
+        # Sources go out before generation, so the client has something to show
+        # while the LLM works on its first token.
+        sources = node_sources(nodes)
+        yield {"type": "sources", "sources": sources}
+
+        generation_started = time.perf_counter()
+        response = query_engine.synthesize(query_bundle, nodes)
         full_response = ""
         for chunk in response.response_gen:
+            if "first_token_ms" not in timings:
+                timings["first_token_ms"] = elapsed_ms(generation_started)
             yield {"type": "chunk", "content": chunk}
             full_response += chunk
+        timings["generate_ms"] = elapsed_ms(generation_started)
         _memory_manager.save_context(session_id, {"input": query}, {"output": full_response})
+        if config.ANSWER_CACHE_ENABLED and full_response:
+            answer_cache.store(
+                context.project_id, index_version, query, full_response,
+                sources=sources, embedding=get_query_embedding(query)
+            )
+        timings["total_ms"] = elapsed_ms(started)
+        yield {"type": "timing", "timings": timings}
 
     else:
         yield {"type": "error", "content": "Error: Could not determine how to handle the query."}
\ No newline at end of file
@@ -5,6 +5,7 @@ from abc import ABC, abstractmethod
 from pydantic import BaseModel, Field, validator
 
 import config
+from engine.graph_index import graph_file_version
 
 class ProjectNotIndexedError(Exception):
     """Custom exception for when a project's assets are not found."""
@@ -37,7 +38,24 @@ class ProjectContext(BaseModel):
 
     @property
     def code_graph_path(self) -> Path:
-        return config.CODE_GRAPH_BASE_PATH / f"{self.project_id}_graph.json"
+        return config.get_code_graph_path(self.project_id)
+
+    @property
+    def index_version(self) -> str:
+        """
+        A cheap token that changes whenever the worker re-indexes the project.
+        Derived from the index manifest's mtime and size, so it works across processes.
+        """
+        try:
+            stat = config.get_index_manifest_path(self.project_id).stat()
+        except FileNotFoundError:
+            return "unversioned"
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    @property
+    def code_graph_version(self) -> str:
+        """Same as index_version, for the project's code graph file."""
+        return graph_file_version(self.code_graph_path)
 
     @validator('project_id')
     def validate_project_assets(cls, v):
@@ -47,7 +65,7 @@ class ProjectContext(BaseModel):
         """
         project_id = v
         vector_store_dir = config.VECTOR_STORE_BASE_PATH / project_id
-        code_graph_file = config.CODE_GRAPH_BASE_PATH / f"{project_id}_graph.json"
+        code_graph_file = config.get_code_graph_path(project_id)
         repo_dir = config.REPOS_BASE_PATH / project_id
 
         if not vector_store_dir.is_dir():
@@ -0,0 +1,168 @@
+# --- engine/embedding.py ---
+
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from engine.embedding_cache import round_vector
+
+# Rough stand-in for a subword tokenizer when the model does not expose one.
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def _resolve_threads(threads: int, workers: int) -> int:
+    """Intra-op threads per worker; 0 means share every core between the workers."""
+    if threads > 0:
+        return threads
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def _configure_torch_threads(threads: int) -> int | None:
+    """Sets torch's intra-op thread count and returns the previous one (None without torch)."""
+    try:
+        import torch
+    except ImportError:
+        return None
+    previous = torch.get_num_threads()
+    if previous != threads:
+        torch.set_num_threads(threads)
+        logging.info(f"--- [EMBED] Using {threads} torch threads ---")
+    return previous
+
+def _find_tokenizer(embed_model):
+    """The HuggingFace tokenizer behind an embedding model, if one can be found."""
+    module = embed_model
+    for _ in range(3):
+        tokenizer = getattr(module, "tokenizer", None)
+        if tokenizer is not None and callable(tokenizer):
+            return tokenizer
+        module = getattr(module, "_model", None) or getattr(module, "model", None)
+        if module is None:
+            return None
+    return None
+
+
+class EmbeddingStage:
+    """
+    The embedding step of the indexer. Texts are embedded in fixed-size
+    batches, optionally sorted by length first so each batch pads to a similar
+    length, and spread over `workers` concurrent batches that each get a share
+    of the CPU cores. Keeps running chunk and token counts for throughput
+    reporting.
+
+    With a cache, only texts the cache has not seen for `model_name` reach the
+    model. Vectors then always come back at the cache's precision, whether
+    they were cached or freshly computed.
+
+    The model is usually shared with the query path, so the torch thread count
+    and the model's embed_batch_size set here are restored by close().
+    """
+
+    def __init__(self, embed_model, batch_size: int = None, workers: int = None,
+                 threads: int = None, sort_by_length: bool = None,
+                 cache=None, model_name: str = None):
+        self.embed_model = embed_model
+        self.cache = cache
+        self.model_name = model_name or getattr(embed_model, "model_name", None) or type(embed_model).__name__
+        self.batch_size = max(1, batch_size or config.INDEX_EMBED_BATCH_SIZE)
+        self.workers = max(1, workers or config.INDEX_EMBED_WORKERS)
+        self.threads = _resolve_threads(config.INDEX_EMBED_THREADS if threads is None else threads, self.workers)
+        self.sort_by_length = config.INDEX_EMBED_SORT_BY_LENGTH if sort_by_length is None else sort_by_length
+        self._tokenizer = _find_tokenizer(embed_model)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self.cache_hits = 0
+
+        self._previous_threads = _configure_torch_threads(self.threads)
+        # LlamaIndex splits each call into embed_batch_size sub-batches, so make
+        # that match the batches built here.
+        self._previous_batch_size = getattr(embed_model, "embed_batch_size", None)
+        if self._previous_batch_size is not None:
+            embed_model.embed_batch_size = self.batch_size
+
+    def count_tokens(self, texts: list[str]) -> int:
+        if self._tokenizer is not None:
+            try:
+                encoded = self._tokenizer(texts, add_special_tokens=True, truncation=True)
+                return sum(len(ids) for ids in encoded["input_ids"])
+            except Exception:
+                self._tokenizer = None
+        return sum(len(_TOKEN_PATTERN.findall(text)) for text in texts)
+
+    def _batches(self, texts: list[str]) -> list[list[int]]:
+        order = list(range(len(texts)))
+        if self.sort_by_length:
+            order.sort(key=lambda i: len(texts[i]))
+        return [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_model.get_text_embedding_batch(texts)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embeds texts and returns their vectors in the original order."""
+        if self.cache is None:
+            return self._embed(texts)
+        embeddings = self.cache.get_many(self.model_name, texts)
+        missing = [i for i, vector in enumerate(embeddings) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            vectors = [round_vector(vector) for vector in self._embed(missing_texts)]
+            self.cache.put_many(self.model_name, missing_texts, vectors)
+            for i, vector in zip(missing, vectors):
+                embeddings[i] = vector
+        with self._lock:
+            self.cache_hits += len(texts) - len(missing)
+        return embeddings
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        started = time.perf_counter()
+        batches = self._batches(texts)
+        batch_texts = [[texts[i] for i in batch] for batch in batches]
+        if self.workers > 1 and len(batches) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embed")
+            results = list(self._executor.map(self._embed_batch, batch_texts))
+        else:
+            results = [self._embed_batch(chunk) for chunk in batch_texts]
+        elapsed = time.perf_counter() - started
+
+        embeddings = [None] * len(texts)
+        for batch, vectors in zip(batches, results):
+            for i, vector in zip(batch, vectors):
+                embeddings[i] = vector
+        tokens = self.count_tokens(texts)
+        with self._lock:
+            self.chunks += len(texts)
+            self.tokens += tokens
+            self.seconds += elapsed
+        return embeddings
+
+    def stats(self) -> dict:
+        with self._lock:
+            seconds = self.seconds
+            return {
+                "chunks_embedded": self.chunks,
+                "tokens_embedded": self.tokens,
+                "embed_seconds": round(seconds, 3),
+                "chunks_per_sec": round(self.chunks / seconds, 1) if seconds else 0.0,
+                "tokens_per_sec": round(self.tokens / seconds, 1) if seconds else 0.0,
+                "cache_hits": self.cache_hits,
+            }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._previous_batch_size is not None:
+            self.embed_model.embed_batch_size = self._previous_batch_size
+            self._previous_batch_size = None
+        if self._previous_threads is not None:
+            _configure_torch_threads(self._previous_threads)
+            self._previous_threads = None
@@ -0,0 +1,167 @@
+# --- engine/embedding_cache.py ---
+
+"""
+Persistent, content-addressed embedding cache.
+
+Vectors are keyed by (embedding model name, SHA-256 of the chunk text), so an
+identical chunk is embedded once no matter which project, fork or re-index it
+comes from. Vectors are stored as float16, half the size of float32 and
+well within the precision cosine similarity needs. The database runs in WAL
+mode so concurrent indexing jobs can share it.
+
+When the live data grows past `max_bytes`, the least recently used entries
+are evicted down to EVICT_TO_FRACTION of the limit.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_hash BLOB NOT NULL,
+    vector BLOB NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (model, text_hash)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);
+"""
+
+BUSY_TIMEOUT_SECONDS = 30
+EVICT_TO_FRACTION = 0.9
+VECTOR_DTYPE = np.float16
+
+# Stay well below SQLite's limit on bound parameters per statement.
+_MAX_SQL_PARAMS = 500
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+def round_vector(vector) -> list[float]:
+    """A vector as it reads back from the cache, so fresh and cached vectors match."""
+    return np.asarray(vector, dtype=VECTOR_DTYPE).astype(np.float32).tolist()
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding cache, with one connection per thread."""
+
+    def __init__(self, path: Path, max_bytes: int | None = None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """Cached vectors for texts, in order, with None for every miss."""
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        conn = self._connection()
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), _MAX_SQL_PARAMS):
+            chunk = unique[start:start + _MAX_SQL_PARAMS]
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                [model, *chunk],
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=VECTOR_DTYPE).astype(np.float32).tolist()
+        if found:
+            now = int(time.time())
+            with conn:
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key in found],
+                )
+        results = [found.get(key) for key in hashes]
+        hits = sum(1 for vector in results if vector is not None)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]):
+        now = int(time.time())
+        rows = [
+            (model, text_hash(text), np.asarray(vector, dtype=VECTOR_DTYPE).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+        if self.max_bytes:
+            self.evict()
+
+    def used_bytes(self) -> int:
+        """Bytes of the database in use, excluding free pages left by deletions."""
+        conn = self._connection()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def evict(self) -> int:
+        """Drops least recently used entries until the cache fits its size bound."""
+        if not self.max_bytes:
+            return 0
+        conn = self._connection()
+        removed = 0
+        used = self.used_bytes()
+        while used > self.max_bytes:
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if not entries:
+                break
+            # Entries are close to uniform in size, so remove a proportional share.
+            # Pages are not packed perfectly after deletes, hence the loop.
+            target = min(entries, int(entries * (1 - EVICT_TO_FRACTION * self.max_bytes / used)) + 1)
+            with conn:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE (model, text_hash) IN "
+                    "(SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (target,),
+                )
+            removed += target
+            used = self.used_bytes()
+        if removed:
+            with self._lock:
+                self.evictions += removed
+            logging.info(f"--- [EMBED CACHE] Evicted {removed} least recently used embeddings ---")
+        return removed
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM embeddings")
+
+    def stats(self) -> dict:
+        entries = self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "approx_bytes": self.used_bytes(),
+            }
@@ -0,0 +1,390 @@
+# --- engine/graph_index.py ---
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import config
+from engine.cache import LRUCache
+
+class GraphTraversal:
+    """
+    Bounded multi-hop traversals shared by the code graph representations.
+    Subclasses provide find(), node(), node_id() and _iter_neighbors(); the
+    traversal code treats node keys as opaque (IDs or array positions).
+    """
+
+    def find(self, entity: str) -> list:
+        raise NotImplementedError
+
+    def node(self, key) -> dict | None:
+        """The node record for a key, or None for endpoints with no definition."""
+        raise NotImplementedError
+
+    def node_id(self, key) -> str:
+        raise NotImplementedError
+
+    def _iter_neighbors(self, key, relationship: str, min_confidence: float):
+        raise NotImplementedError
+
+    def neighbors(self, key, relationship: str, min_confidence: float = 0.0) -> list[tuple]:
+        """
+        Returns (neighbor, confidence) pairs for 'callers' or 'callees' of a node,
+        highest confidence first. Stops at the first edge below min_confidence.
+        """
+        return list(self._iter_neighbors(key, relationship, min_confidence))
+
+    def callers(self, key, min_confidence: float = 0.0) -> list[tuple]:
+        return self.neighbors(key, "callers", min_confidence)
+
+    def callees(self, key, min_confidence: float = 0.0) -> list[tuple]:
+        return self.neighbors(key, "callees", min_confidence)
+
+    # --- Multi-hop traversal ---
+
+    def expand(
+        self,
+        start_ids: list,
+        relationship: str,
+        max_depth: int,
+        min_confidence: float = 0.0,
+        max_nodes: int | None = None,
+        deadline: float | None = None,
+    ) -> dict:
+        """
+        Breadth-first k-hop expansion along 'callers' or 'callees' edges.
+        Returns {"depths": {node: hops}, "truncated": reason or None}; the
+        start nodes have depth 0. Stops early when the node budget or the
+        deadline (a time.perf_counter() value) is exhausted.
+        """
+        depths = {node_id: 0 for node_id in start_ids}
+        frontier = list(start_ids)
+        for depth in range(1, max_depth + 1):
+            next_frontier = []
+            for node_id in frontier:
+                for neighbor_id, _ in self._iter_neighbors(node_id, relationship, min_confidence):
+                    if neighbor_id in depths:
+                        continue
+                    depths[neighbor_id] = depth
+                    next_frontier.append(neighbor_id)
+                    if max_nodes is not None and len(depths) >= max_nodes:
+                        return {"depths": depths, "truncated": "max_nodes"}
+                if deadline is not None and time.perf_counter() > deadline:
+                    return {"depths": depths, "truncated": "timeout"}
+            if not next_frontier:
+                return {"depths": depths, "truncated": None}
+            frontier = next_frontier
+        more = any(
+            neighbor_id not in depths
+            for node_id in frontier
+            for neighbor_id, _ in self._iter_neighbors(node_id, relationship, min_confidence)
+        )
+        return {"depths": depths, "truncated": "max_depth" if more else None}
+
+    def impact_set(self, node_ids: list, **budgets) -> dict:
+        """Everything that (transitively) calls the given nodes, i.e. what a change to them can break."""
+        return self.expand(node_ids, "callers", **budgets)
+
+    def shortest_path(
+        self,
+        source_ids: list,
+        target_ids: list,
+        max_depth: int,
+        min_confidence: float = 0.0,
+        max_nodes: int | None = None,
+        deadline: float | None = None,
+    ) -> dict:
+        """
+        Shortest call path from any source to any target, found with a
+        bidirectional BFS (callees forward from the sources, callers backward
+        from the targets). Returns {"path": [nodes] or None, "truncated": reason or None}.
+        """
+        forward = {node_id: None for node_id in source_ids}
+        backward = {node_id: None for node_id in target_ids}
+        meeting = next((node_id for node_id in forward if node_id in backward), None)
+        forward_frontier, backward_frontier = list(forward), list(backward)
+        truncated = None
+        hops = 0
+        while meeting is None and forward_frontier and backward_frontier and hops < max_depth:
+            # Grow the smaller side first; this keeps the search balanced.
+            if len(forward_frontier) <= len(backward_frontier):
+                frontier, parents, others, relationship = forward_frontier, forward, backward, "callees"
+            else:
+                frontier, parents, others, relationship = backward_frontier, backward, forward, "callers"
+            next_frontier = []
+            for node_id in frontier:
+                for neighbor_id, _ in self._iter_neighbors(node_id, relationship, min_confidence):
+                    if neighbor_id in parents:
+                        continue
+                    parents[neighbor_id] = node_id
+                    next_frontier.append(neighbor_id)
+                    if neighbor_id in others:
+                        meeting = neighbor_id
+                        break
+                if meeting is not None:
+                    break
+            if relationship == "callees":
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+            hops += 1
+            if meeting is None and max_nodes is not None and len(forward) + len(backward) >= max_nodes:
+                truncated = "max_nodes"
+                break
+            if meeting is None and deadline is not None and time.perf_counter() > deadline:
+                truncated = "timeout"
+                break
+
+        if meeting is None:
+            if truncated is None and hops >= max_depth and forward_frontier and backward_frontier:
+                truncated = "max_depth"
+            return {"path": None, "truncated": truncated}
+
+        path = []
+        node_id = meeting
+        while node_id is not None:
+            path.append(node_id)
+            node_id = forward[node_id]
+        path.reverse()
+        node_id = backward[meeting]
+        while node_id is not None:
+            path.append(node_id)
+            node_id = backward[node_id]
+        return {"path": path, "truncated": None}
+
+    def describe(self, key, **extra) -> dict:
+        node = self.node(key)
+        if node is None:
+            # Calls into libraries or unresolved imports have no definition node.
+            return {"id": self.node_id(key), "external": True, **extra}
+        return {**node, **extra}
+
+
+class CodeGraphIndex(GraphTraversal):
+    """
+    In-memory, adjacency-indexed view of a project's code graph.
+
+    Builds name -> ids and id -> node lookups plus forward (callees) and
+    reverse (callers) adjacency lists sorted by descending confidence, so a
+    callers/callees lookup costs O(degree) instead of a scan of the whole graph.
+    """
+
+    def __init__(self, nodes: list[dict], edges: list[dict]):
+        self.nodes_by_id: dict[str, dict] = {}
+        self.ids_by_name: dict[str, list[str]] = defaultdict(list)
+        for node in nodes:
+            if node["id"] in self.nodes_by_id:
+                continue
+            self.nodes_by_id[node["id"]] = node
+            self.ids_by_name[node["name"]].append(node["id"])
+
+        self._callees: dict[str, list[tuple[float, str]]] = defaultdict(list)
+        self._callers: dict[str, list[tuple[float, str]]] = defaultdict(list)
+        for edge in edges:
+            confidence = edge.get("confidence", 1.0)
+            self._callees[edge["source"]].append((confidence, edge["target"]))
+            self._callers[edge["target"]].append((confidence, edge["source"]))
+        for adjacency in (self._callees, self._callers):
+            for neighbors in adjacency.values():
+                neighbors.sort(key=lambda item: item[0], reverse=True)
+
+    @classmethod
+    def from_dict(cls, graph: dict) -> "CodeGraphIndex":
+        return cls(graph.get("nodes", []), graph.get("edges", []))
+
+    def __len__(self) -> int:
+        return len(self.nodes_by_id)
+
+    @property
+    def edge_count(self) -> int:
+        return sum(len(neighbors) for neighbors in self._callees.values())
+
+    def find(self, entity: str) -> list[str]:
+        """Returns the IDs of every node named `entity` (or the node whose ID is `entity`)."""
+        if entity in self.nodes_by_id:
+            return [entity]
+        return list(self.ids_by_name.get(entity, []))
+
+    def node(self, node_id: str) -> dict | None:
+        return self.nodes_by_id.get(node_id)
+
+    def node_id(self, node_id: str) -> str:
+        return node_id
+
+    def _iter_neighbors(self, node_id: str, relationship: str, min_confidence: float):
+        adjacency = self._callers if relationship == "callers" else self._callees
+        for confidence, neighbor_id in adjacency.get(node_id, ()):
+            if confidence < min_confidence:
+                return
+            yield neighbor_id, confidence
+
+
+TRAVERSAL_MODES = ("callers", "callees", "impact", "path")
+
+def traverse(
+    graph: GraphTraversal,
+    mode: str,
+    entity: str,
+    target: str | None = None,
+    depth: int | None = None,
+    min_confidence: float = 0.8,
+    max_nodes: int | None = None,
+) -> dict:
+    """
+    Runs a bounded multi-hop traversal and returns a JSON-serializable result.
+    - mode: 'callers' / 'callees' (k-hop expansion), 'impact' (everything that
+      transitively calls the entity) or 'path' (shortest call path entity -> target).
+    Raises ValueError for invalid requests.
+    """
+    if mode not in TRAVERSAL_MODES:
+        raise ValueError(f"Invalid mode '{mode}'. Must be one of: {', '.join(TRAVERSAL_MODES)}.")
+    if depth is not None and depth < 0:
+        raise ValueError(f"Invalid depth {depth}. Must be 0 or more.")
+    start_ids = graph.find(entity)
+    if not start_ids:
+        raise ValueError(f"Entity '{entity}' not found in the code graph.")
+
+    depth = config.GRAPH_TRAVERSAL_MAX_DEPTH if depth is None else min(depth, config.GRAPH_TRAVERSAL_MAX_DEPTH)
+    max_nodes = min(max_nodes or config.GRAPH_TRAVERSAL_MAX_NODES, config.GRAPH_TRAVERSAL_MAX_NODES)
+    started = time.perf_counter()
+    budgets = {
+        "max_depth": depth,
+        "min_confidence": min_confidence,
+        "max_nodes": max_nodes,
+        "deadline": started + config.GRAPH_TRAVERSAL_TIMEOUT_MS / 1000,
+    }
+
+    result = {
+        "mode": mode,
+        "entity": entity,
+        "matched": [graph.node_id(key) for key in start_ids],
+        "min_confidence": min_confidence,
+    }
+    if mode == "path":
+        if not target:
+            raise ValueError("Mode 'path' requires a 'target' entity.")
+        target_ids = graph.find(target)
+        if not target_ids:
+            raise ValueError(f"Entity '{target}' not found in the code graph.")
+        found = graph.shortest_path(start_ids, target_ids, **budgets)
+        result["target"] = target
+        result["path"] = [graph.describe(key) for key in found["path"]] if found["path"] else None
+        result["truncated"] = found["truncated"]
+    else:
+        if mode == "impact":
+            found = graph.impact_set(start_ids, **budgets)
+        else:
+            found = graph.expand(start_ids, mode, **budgets)
+        result["nodes"] = [
+            graph.describe(key, depth=hops)
+            for key, hops in sorted(found["depths"].items(), key=lambda item: item[1])
+            if hops > 0
+        ]
+        result["truncated"] = found["truncated"]
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+def load_graph_index(graph_path: Path) -> GraphTraversal:
+    """
+    Loads a code graph file into an index; a missing or corrupt file yields an empty graph.
+    Binary '.csr' graphs are memory-mapped rather than parsed, and '.sqlite'
+    graphs are queried in place.
+    """
+    try:
+        if Path(graph_path).suffix == ".sqlite":
+            from engine.graph_sqlite import SqliteCodeGraph
+            return SqliteCodeGraph(graph_path)
+        if Path(graph_path).suffix == ".csr":
+            from engine.graph_storage import GraphFormatError, load_csr_graph
+            try:
+                return load_csr_graph(graph_path)
+            except GraphFormatError:
+                return CodeGraphIndex([], [])
+        with open(graph_path, 'r', encoding='utf-8') as f:
+            return CodeGraphIndex.from_dict(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return CodeGraphIndex([], [])
+
+
+# --- Process-wide graph cache ---
+
+# Rough in-memory footprint of a CodeGraphIndex built from JSON; CSR and
+# SQLite graphs keep their data in the OS page cache instead.
+_BYTES_PER_NODE = 600
+_BYTES_PER_EDGE = 160
+_MAPPED_GRAPH_BYTES = 64 * 1024
+
+def _close_graph(key: str, entry: tuple):
+    # SQLite graphs hold a connection per thread that used them.
+    close = getattr(entry[1], "close", None)
+    if close is not None:
+        close()
+
+_graphs = LRUCache(
+    "code_graphs", max_entries=config.GRAPH_CACHE_MAX_ENTRIES, max_bytes=config.GRAPH_CACHE_MAX_BYTES,
+    on_evict=_close_graph,
+)
+_graph_locks: dict[str, threading.Lock] = {}
+_graph_locks_guard = threading.Lock()
+_graph_reloads = 0
+
+def graph_file_version(graph_path: Path) -> str:
+    """
+    A cheap token that changes whenever a graph file is rewritten: its mtime and
+    size. SQLite graphs are updated in place (and their files change on WAL
+    checkpoints too), so for them it is the file's inode plus the generation
+    counter every write transaction bumps.
+    """
+    graph_path = Path(graph_path)
+    try:
+        stat = graph_path.stat()
+    except FileNotFoundError:
+        return "unversioned"
+    if graph_path.suffix == ".sqlite":
+        from engine.graph_sqlite import read_generation
+        return f"{stat.st_ino}-g{read_generation(graph_path)}"
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def _approx_graph_bytes(graph: GraphTraversal) -> int:
+    if isinstance(graph, CodeGraphIndex):
+        return len(graph) * _BYTES_PER_NODE + graph.edge_count * _BYTES_PER_EDGE
+    return _MAPPED_GRAPH_BYTES
+
+def get_graph_index(graph_path: Path) -> GraphTraversal:
+    """
+    Returns the loaded graph for a file, shared by all threads of the process.
+    The file's version is checked on every call, so a graph rewritten by the
+    worker is reloaded on next use. Each file is loaded by one thread at a time.
+    """
+    global _graph_reloads
+    key = str(graph_path)
+    with _graph_locks_guard:
+        lock = _graph_locks.setdefault(key, threading.Lock())
+    with lock:
+        version = graph_file_version(graph_path)
+        cached = _graphs.get(key)
+        if cached is not None:
+            cached_version, cached_graph = cached
+            if cached_version == version:
+                return cached_graph
+            _graph_reloads += 1
+            logging.info(f"--- [GRAPH] {graph_path} changed; reloading. ---")
+            # Drop the stale graph first, so its connections are closed.
+            _graphs.invalidate(key)
+        graph = load_graph_index(graph_path)
+        _graphs.put(key, (version, graph), size_bytes=_approx_graph_bytes(graph))
+        return graph
+
+def invalidate_graph(graph_path: Path) -> bool:
+    key = str(graph_path)
+    with _graph_locks_guard:
+        _graph_locks.pop(key, None)
+    return _graphs.invalidate(key)
+
+def graph_cache_stats() -> dict:
+    stats = _graphs.stats()
+    stats["reloads"] = _graph_reloads
+    return stats
@@ -0,0 +1,384 @@
+# --- engine/graph_sqlite.py ---
+
+"""
+SQLite-backed code graph store.
+
+Nodes and call edges live in indexed tables, so callers/callees/file lookups
+are single indexed queries and no process has to hold the whole graph in
+memory. The database runs in WAL mode: any number of API and worker processes
+can read while one writer replaces a file's definitions and calls in a single
+transaction.
+
+For incremental updates the store also keeps each file's unresolved
+attribute calls (caller, method name). Indexed by name, that table is the
+reverse dependency index: when definitions named `save` appear or disappear,
+only the calls to `.save()` have to be re-resolved.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable
+
+from engine.graph_index import GraphTraversal
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    type TEXT,
+    file TEXT
+);
+
+CREATE TABLE IF NOT EXISTS edges (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    file TEXT NOT NULL,
+    via TEXT  -- method name of a heuristic (name-resolved) call, NULL for direct calls
+);
+
+CREATE TABLE IF NOT EXISTS unresolved (
+    caller TEXT NOT NULL,
+    name TEXT NOT NULL,
+    file TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Secondary indexes, kept apart so full rebuilds can drop them and build them
+# once after the bulk insert instead of updating them row by row.
+INDEXES = {
+    "idx_nodes_name": "nodes(name)",
+    "idx_nodes_file": "nodes(file)",
+    "idx_edges_source": "edges(source, confidence DESC)",
+    "idx_edges_target": "edges(target, confidence DESC)",
+    "idx_edges_file": "edges(file)",
+    "idx_edges_via": "edges(via)",
+    "idx_unresolved_name": "unresolved(name)",
+    "idx_unresolved_file": "unresolved(file)",
+}
+
+# How long a connection waits for a concurrent writer before failing.
+BUSY_TIMEOUT_SECONDS = 30
+
+# Stay well below SQLite's limit on bound parameters per statement.
+_MAX_SQL_PARAMS = 500
+
+def edge_file(source_id: str) -> str:
+    """The file an edge belongs to: the caller's file (IDs are 'path::Class::name' or just 'path')."""
+    return source_id.split("::", 1)[0]
+
+def _batches(values: Iterable, size: int = _MAX_SQL_PARAMS):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """
+    One explicit transaction, DDL included. Writer connections run in
+    autocommit mode (isolation_level=None): sqlite3's implicit transactions
+    only start at the first DML statement, so a leading DROP/CREATE INDEX
+    would otherwise commit on its own. Every write transaction also bumps
+    the graph's generation counter.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('generation', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def read_generation(path: Path) -> str | None:
+    """
+    The generation counter of a graph database: it changes with every committed
+    write, unlike the file stats, which also change when a reader creates the
+    '-wal'/'-shm' files or the WAL is checkpointed. None if it cannot be read.
+    """
+    try:
+        conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_SECONDS)
+    except sqlite3.Error:
+        return None
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else "0"
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+class SqliteCodeGraph(GraphTraversal):
+    """
+    Code graph stored in a SQLite database. Node keys are node IDs, as in
+    CodeGraphIndex. Each thread gets its own connection; read-only instances
+    never create or modify the database. close() closes the connections of
+    every thread; a thread that uses the graph afterwards opens a new one.
+    """
+
+    def __init__(self, path: Path, readonly: bool = True):
+        self.path = Path(path)
+        self.readonly = readonly
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._epoch = 0
+        if not readonly:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = self._connection()
+            conn.executescript(SCHEMA)
+            self._create_indexes(conn)
+        elif not self.path.is_file():
+            raise FileNotFoundError(f"Code graph database not found at {self.path}")
+
+    def __enter__(self) -> "SqliteCodeGraph":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.epoch != self._epoch:
+            # check_same_thread=False only so close() can close every thread's
+            # connection; each connection is still used by its own thread.
+            if self.readonly:
+                conn = sqlite3.connect(
+                    f"{self.path.resolve().as_uri()}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_SECONDS,
+                    check_same_thread=False,
+                )
+            else:
+                conn = sqlite3.connect(
+                    self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False,
+                )
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            with self._connections_lock:
+                self._connections.append(conn)
+                self._local.epoch = self._epoch
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._epoch += 1
+        for conn in connections:
+            conn.close()
+
+    # --- Reads ---
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    @property
+    def edge_count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+
+    def find(self, entity: str) -> list[str]:
+        """Returns the IDs of every node named `entity` (or the node whose ID is `entity`)."""
+        conn = self._connection()
+        if conn.execute("SELECT 1 FROM nodes WHERE id = ?", (entity,)).fetchone():
+            return [entity]
+        return [row[0] for row in conn.execute("SELECT id FROM nodes WHERE name = ? ORDER BY seq", (entity,))]
+
+    @staticmethod
+    def _node_dict(row) -> dict:
+        node_id, name, node_type, file = row
+        node = {"id": node_id, "name": name}
+        if node_type is not None:
+            node["type"] = node_type
+        if file is not None:
+            node["file"] = file
+        return node
+
+    def node(self, node_id: str) -> dict | None:
+        row = self._connection().execute("SELECT id, name, type, file FROM nodes WHERE id = ?", (node_id,)).fetchone()
+        return self._node_dict(row) if row else None
+
+    def node_id(self, node_id: str) -> str:
+        return node_id
+
+    def _iter_neighbors(self, node_id: str, relationship: str, min_confidence: float):
+        if relationship == "callers":
+            query = "SELECT source, confidence FROM edges WHERE target = ? AND confidence >= ? ORDER BY confidence DESC, rowid"
+        else:
+            query = "SELECT target, confidence FROM edges WHERE source = ? AND confidence >= ? ORDER BY confidence DESC, rowid"
+        yield from self._connection().execute(query, (node_id, min_confidence)).fetchall()
+
+    def file_nodes(self, file: str) -> list[dict]:
+        """Every definition in a file."""
+        rows = self._connection().execute("SELECT id, name, type, file FROM nodes WHERE file = ? ORDER BY seq", (file,))
+        return [self._node_dict(row) for row in rows]
+
+    def file_edges(self, file: str) -> list[dict]:
+        """Every call made from a file."""
+        rows = self._connection().execute("SELECT source, target, confidence FROM edges WHERE file = ? ORDER BY rowid", (file,))
+        return [{"source": s, "target": t, "type": "CALLS", "confidence": c} for s, t, c in rows]
+
+    def files(self) -> list[str]:
+        rows = self._connection().execute("SELECT file FROM nodes WHERE file IS NOT NULL UNION SELECT file FROM edges")
+        return sorted(row[0] for row in rows)
+
+    def get_meta(self, key: str) -> str | None:
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def to_dict(self) -> dict:
+        """The graph in the JSON layout written by build_code_graph."""
+        conn = self._connection()
+        nodes = [self._node_dict(row) for row in conn.execute("SELECT id, name, type, file FROM nodes ORDER BY seq")]
+        edges = [
+            {"source": s, "target": t, "type": "CALLS", "confidence": c}
+            for s, t, c in conn.execute("SELECT source, target, confidence FROM edges ORDER BY rowid")
+        ]
+        return {"nodes": nodes, "edges": edges}
+
+    # --- Writes ---
+
+    def _insert(self, conn: sqlite3.Connection, nodes: list[dict], edges: list[dict]):
+        conn.executemany(
+            "INSERT OR IGNORE INTO nodes (id, name, type, file) VALUES (?, ?, ?, ?)",
+            ((n["id"], n["name"], n.get("type"), n.get("file")) for n in nodes),
+        )
+        conn.executemany(
+            "INSERT INTO edges (source, target, confidence, file) VALUES (?, ?, ?, ?)",
+            ((e["source"], e["target"], e.get("confidence", 1.0), edge_file(e["source"])) for e in edges),
+        )
+
+    @staticmethod
+    def _create_indexes(conn: sqlite3.Connection):
+        for name, columns in INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+    @staticmethod
+    def _delete_files(conn: sqlite3.Connection, files: list[str]):
+        for batch in _batches(files):
+            marks = ",".join("?" * len(batch))
+            for table in ("nodes", "edges", "unresolved"):
+                conn.execute(f"DELETE FROM {table} WHERE file IN ({marks})", batch)
+
+    def replace_graph(self, graph: dict):
+        """Replaces the whole graph in one transaction; readers see either the old or the new graph."""
+        conn = self._connection()
+        with _transaction(conn):
+            for table in ("nodes", "edges", "unresolved"):
+                conn.execute(f"DELETE FROM {table}")
+            self._insert(conn, graph.get("nodes", []), graph.get("edges", []))
+
+    def replace_files(self, files: dict[str, tuple[list[dict], list[dict]]]):
+        """
+        Replaces the definitions and outgoing calls of several files in one
+        transaction. `files` maps a relative path to its (nodes, edges); a file
+        mapped to ([], []) is removed from the graph.
+        """
+        conn = self._connection()
+        with _transaction(conn):
+            self._delete_files(conn, list(files))
+            for nodes, edges in files.values():
+                self._insert(conn, nodes, edges)
+
+    def replace_file(self, file: str, nodes: list[dict], edges: list[dict]):
+        self.replace_files({file: (nodes, edges)})
+
+    def apply_summaries(
+        self,
+        summaries: list[dict],
+        removed: Iterable[str] = (),
+        resolve: Callable[[str, dict], list[tuple[str, float]]] | None = None,
+        clear: bool = False,
+        meta: dict | None = None,
+    ) -> dict:
+        """
+        Replaces the files in `summaries` (scripts.build_graph.summarize_file output)
+        and drops the `removed` files, then re-resolves the heuristic calls that
+        can have changed: every unresolved call in the replaced files, plus calls
+        anywhere in the project to a name that was defined or removed. With
+        clear=True the graph is rebuilt from `summaries` alone. All of it is one
+        transaction. `resolve(name, name_index)` returns (target, confidence) pairs.
+        """
+        conn = self._connection()
+        files = [summary["file"] for summary in summaries] + list(removed)
+        with _transaction(conn):
+            if clear:
+                for name in INDEXES:
+                    conn.execute(f"DROP INDEX IF EXISTS {name}")
+                for table in ("nodes", "edges", "unresolved"):
+                    conn.execute(f"DELETE FROM {table}")
+                affected = set()
+            else:
+                affected = set()
+                for batch in _batches(files):
+                    rows = conn.execute(f"SELECT name FROM nodes WHERE file IN ({','.join('?' * len(batch))})", batch)
+                    affected.update(row[0] for row in rows)
+                self._delete_files(conn, files)
+
+            for summary in summaries:
+                file = summary["file"]
+                nodes = summary.get("nodes", [])
+                conn.executemany(
+                    "INSERT OR IGNORE INTO nodes (id, name, type, file) VALUES (?, ?, ?, ?)",
+                    ((node_id, name, node_type, file) for node_id, node_type, name in nodes),
+                )
+                conn.executemany(
+                    "INSERT INTO edges (source, target, confidence, file) VALUES (?, ?, ?, ?)",
+                    ((source, target, confidence, file) for source, target, confidence in dict.fromkeys(
+                        tuple(edge) for edge in summary.get("edges", [])
+                    )),
+                )
+                conn.executemany(
+                    "INSERT INTO unresolved (caller, name, file) VALUES (?, ?, ?)",
+                    ((caller, name, file) for caller, name in summary.get("unresolved", [])),
+                )
+                affected.update(name for _, _, name in nodes)
+
+            # Calls that need (re-)resolution: all of the new files' unresolved calls,
+            # plus the calls elsewhere whose candidate set may have changed.
+            if clear:
+                # Resolution looks definitions up by name; everything else is indexed at the end.
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_nodes_name ON {INDEXES['idx_nodes_name']}")
+                pending = conn.execute("SELECT caller, name, file FROM unresolved").fetchall()
+            else:
+                pending = []
+                for batch in _batches(files):
+                    marks = ",".join("?" * len(batch))
+                    pending += conn.execute(f"SELECT caller, name, file FROM unresolved WHERE file IN ({marks})", batch).fetchall()
+                for batch in _batches(sorted(affected)):
+                    marks = ",".join("?" * len(batch))
+                    conn.execute(f"DELETE FROM edges WHERE via IN ({marks})", batch)
+                    pending += conn.execute(f"SELECT caller, name, file FROM unresolved WHERE name IN ({marks})", batch).fetchall()
+
+            resolved, candidates = {}, {}
+            for caller, name, file in pending:
+                if name not in candidates:
+                    rows = conn.execute("SELECT id FROM nodes WHERE name = ? ORDER BY seq", (name,))
+                    candidates[name] = resolve(name, {name: [row[0] for row in rows]}) if resolve else []
+                for target, confidence in candidates[name]:
+                    resolved[(caller, target, confidence, file, name)] = None
+            conn.executemany("INSERT INTO edges (source, target, confidence, file, via) VALUES (?, ?, ?, ?, ?)", resolved)
+            if clear:
+                self._create_indexes(conn)
+
+            for key, value in (meta or {}).items():
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        return {"files": len(files), "names_resolved": len(candidates), "heuristic_edges": len(resolved)}
+
+
+def write_sqlite_graph(graph: dict, path: Path):
+    store = SqliteCodeGraph(path, readonly=False)
+    try:
+        store.replace_graph(graph)
+    finally:
+        store.close()
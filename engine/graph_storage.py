@@ -0,0 +1,262 @@
+# --- engine/graph_storage.py ---
+
+"""
+Compact binary ("CSR") storage for code graphs.
+
+Layout of a .csr file:
+    8 bytes   magic (b"CGRAPH01")
+    8 bytes   little-endian length of the JSON header
+    header    {"node_count", "vertex_count", "edge_count", "arrays": {name: [dtype, offset, length]}}
+    arrays    raw little-endian arrays, each aligned to 8 bytes
+
+Every string (IDs, names, types, files) is stored once in an interned string
+table. Vertices 0..node_count-1 are the graph's nodes in file order; the
+remaining vertices are edge endpoints without a definition (library calls).
+Calls are stored twice in compressed sparse row form, by source (callees) and
+by target (callers), sorted by descending float16 confidence within each row.
+Loading memory-maps the file; nothing is parsed up front.
+"""
+
+import json
+import mmap
+import os
+from pathlib import Path
+
+import numpy as np
+
+from engine.graph_index import GraphTraversal
+
+MAGIC = b"CGRAPH01"
+_ALIGN = 8
+# float16 has ~3 significant digits: 0.9 is stored as 0.8999. Thresholds are
+# compared with this much slack so min_confidence=0.9 still matches 0.9 edges.
+CONFIDENCE_TOLERANCE = 1e-3
+_NO_STRING = -1
+
+class GraphFormatError(Exception):
+    """Raised when a file is not a readable CSR code graph."""
+
+
+class CsrCodeGraph(GraphTraversal):
+    """
+    Read-only code graph backed by (memory-mapped) CSR arrays.
+    Node keys are vertex numbers; node_id() and node() turn them back into
+    the same IDs and node dicts as the JSON graph.
+    """
+
+    def __init__(self, header: dict, arrays: dict, buffer=None):
+        self.header = header
+        self._buffer = buffer  # keeps the mmap alive while arrays reference it
+        self._node_count = header["node_count"]
+        self._string_offsets = arrays["string_offsets"]
+        self._string_blob = arrays["string_blob"]
+        self._vertex_string = arrays["vertex_string"]
+        self._node_name = arrays["node_name"]
+        self._node_type = arrays["node_type"]
+        self._node_file = arrays["node_file"]
+        self._id_order = arrays["id_order"]
+        self._name_order = arrays["name_order"]
+        self._adjacency = {
+            "callees": (arrays["out_offsets"], arrays["out_targets"], arrays["out_conf"]),
+            "callers": (arrays["in_offsets"], arrays["in_sources"], arrays["in_conf"]),
+        }
+
+    def __len__(self) -> int:
+        return self._node_count
+
+    @property
+    def edge_count(self) -> int:
+        return self.header["edge_count"]
+
+    def _bytes(self, string_index: int) -> bytes:
+        start, end = self._string_offsets[string_index], self._string_offsets[string_index + 1]
+        return self._string_blob[start:end].tobytes()
+
+    def _string(self, string_index: int) -> str | None:
+        if string_index == _NO_STRING:
+            return None
+        return self._bytes(string_index).decode("utf-8")
+
+    def _lookup(self, order, string_of, key: bytes) -> list[int]:
+        """Binary search over vertices sorted by a string column; returns every match."""
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(string_of[order[mid]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        matches = []
+        while lo < len(order) and self._bytes(string_of[order[lo]]) == key:
+            matches.append(int(order[lo]))
+            lo += 1
+        return sorted(matches)
+
+    def find(self, entity: str) -> list[int]:
+        """Returns the vertices of every node named `entity` (or the node whose ID is `entity`)."""
+        key = entity.encode("utf-8")
+        by_id = self._lookup(self._id_order, self._vertex_string, key)
+        if by_id:
+            return by_id[:1]
+        return self._lookup(self._name_order, self._node_name, key)
+
+    def node_id(self, vertex: int) -> str:
+        return self._string(int(self._vertex_string[vertex]))
+
+    def node(self, vertex: int) -> dict | None:
+        if vertex >= self._node_count:
+            return None
+        node = {"id": self.node_id(vertex), "name": self._string(int(self._node_name[vertex]))}
+        for field, column in (("type", self._node_type), ("file", self._node_file)):
+            value = self._string(int(column[vertex]))
+            if value is not None:
+                node[field] = value
+        return node
+
+    def _iter_neighbors(self, vertex: int, relationship: str, min_confidence: float):
+        offsets, neighbors, confidences = self._adjacency["callers" if relationship == "callers" else "callees"]
+        start, end = int(offsets[vertex]), int(offsets[vertex + 1])
+        threshold = min_confidence - CONFIDENCE_TOLERANCE
+        for neighbor, confidence in zip(neighbors[start:end].tolist(), confidences[start:end].tolist()):
+            if confidence < threshold:
+                return
+            yield neighbor, round(confidence, 3)
+
+    def to_dict(self) -> dict:
+        """The graph in the JSON layout written by build_code_graph."""
+        nodes = [self.node(vertex) for vertex in range(self._node_count)]
+        offsets, targets, confidences = self._adjacency["callees"]
+        edges = []
+        for source in range(len(self._vertex_string)):
+            start, end = int(offsets[source]), int(offsets[source + 1])
+            if start == end:
+                continue
+            source_id = self.node_id(source)
+            for target, confidence in zip(targets[start:end].tolist(), confidences[start:end].tolist()):
+                edges.append({
+                    "source": source_id,
+                    "target": self.node_id(target),
+                    "type": "CALLS",
+                    "confidence": round(confidence, 3),
+                })
+        return {"nodes": nodes, "edges": edges}
+
+
+def _csr(keys: np.ndarray, values: np.ndarray, confidences: np.ndarray, vertex_count: int):
+    """Groups edges by key, highest confidence first (stable for ties)."""
+    order = np.lexsort((-confidences.astype(np.float32), keys))
+    offsets = np.zeros(vertex_count + 1, dtype="<i8")
+    np.cumsum(np.bincount(keys, minlength=vertex_count), out=offsets[1:])
+    return offsets, values[order].astype("<i4"), confidences[order].astype("<f2")
+
+def encode_graph(graph: dict) -> tuple[dict, dict]:
+    """Converts a JSON-layout graph into the header and arrays of a CSR file."""
+    strings: dict[str, int] = {}
+    def intern(value) -> int:
+        if value is None:
+            return _NO_STRING
+        return strings.setdefault(value, len(strings))
+
+    vertices: dict[str, int] = {}
+    node_name, node_type, node_file = [], [], []
+    for node in graph.get("nodes", []):
+        if node["id"] in vertices:
+            continue
+        vertices[node["id"]] = len(vertices)
+        node_name.append(intern(node["name"]))
+        node_type.append(intern(node.get("type")))
+        node_file.append(intern(node.get("file")))
+    node_count = len(vertices)
+
+    sources, targets, confidences = [], [], []
+    for edge in graph.get("edges", []):
+        for endpoint in (edge["source"], edge["target"]):
+            if endpoint not in vertices:
+                vertices[endpoint] = len(vertices)
+        sources.append(vertices[edge["source"]])
+        targets.append(vertices[edge["target"]])
+        confidences.append(edge.get("confidence", 1.0))
+    vertex_string = [intern(vertex_id) for vertex_id in vertices]
+
+    encoded = [value.encode("utf-8") for value in strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    np.cumsum([len(value) for value in encoded], out=string_offsets[1:])
+    vertex_count = len(vertices)
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    confidences = np.asarray(confidences, dtype=np.float16)
+    out_offsets, out_targets, out_conf = _csr(sources, targets, confidences, vertex_count)
+    in_offsets, in_sources, in_conf = _csr(targets, sources, confidences, vertex_count)
+
+    node_ids = list(vertices)[:node_count]
+    arrays = {
+        "string_offsets": string_offsets,
+        "string_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "vertex_string": np.asarray(vertex_string, dtype="<i4"),
+        "node_name": np.asarray(node_name, dtype="<i4"),
+        "node_type": np.asarray(node_type, dtype="<i4"),
+        "node_file": np.asarray(node_file, dtype="<i4"),
+        # Sorted by UTF-8 bytes, the same order the binary search compares in.
+        "id_order": np.asarray(sorted(range(node_count), key=lambda v: node_ids[v].encode("utf-8")), dtype="<i4"),
+        "name_order": np.asarray(sorted(range(node_count), key=lambda v: encoded[node_name[v]]), dtype="<i4"),
+        "out_offsets": out_offsets, "out_targets": out_targets, "out_conf": out_conf,
+        "in_offsets": in_offsets, "in_sources": in_sources, "in_conf": in_conf,
+    }
+    header = {
+        "node_count": node_count,
+        "vertex_count": vertex_count,
+        "edge_count": len(sources),
+        "string_count": len(strings),
+    }
+    return header, arrays
+
+def write_csr_graph(graph: dict, path: Path):
+    """Writes a JSON-layout graph as a CSR file (atomically, so readers never see a partial file)."""
+    header, arrays = encode_graph(graph)
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, offset, int(array.size)]
+        offset += -(-array.nbytes // _ALIGN) * _ALIGN
+    header = {**header, "arrays": layout}
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-(len(MAGIC) + 8 + len(header_bytes)) % _ALIGN)
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for array in arrays.values():
+            data = array.tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % _ALIGN))
+    os.replace(tmp_path, path)
+
+def load_csr_graph(path: Path) -> CsrCodeGraph:
+    """Memory-maps a CSR graph file. Raises FileNotFoundError or GraphFormatError."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC) + 8:
+            raise GraphFormatError(f"{path} is too small to be a code graph.")
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise GraphFormatError(f"{path} is not a CSR code graph.")
+    header_length = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 8], "little")
+    data_start = len(MAGIC) + 8 + header_length
+    try:
+        header = json.loads(buffer[len(MAGIC) + 8:data_start])
+        arrays = {
+            name: np.frombuffer(buffer, dtype=np.dtype(dtype), count=length, offset=data_start + offset)
+            if length else np.empty(0, dtype=np.dtype(dtype))
+            for name, (dtype, offset, length) in header["arrays"].items()
+        }
+    except (ValueError, KeyError) as e:
+        raise GraphFormatError(f"{path} has a corrupt header: {e}") from e
+    return CsrCodeGraph(header, arrays, buffer)
+
+def export_json(csr_path: Path, json_path: Path):
+    """Writes the JSON graph for a CSR file, for tools that still read JSON."""
+    graph = load_csr_graph(csr_path).to_dict()
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(graph, f, indent=2)
@@ -0,0 +1,254 @@
+# --- engine/lexical_index.py ---
+
+"""
+Per-project lexical index over code chunks, used next to the vector index.
+
+Chunks are tokenized into identifiers: every identifier is indexed whole
+(lowercased) and split into its snake_case/camelCase parts, so both
+`get_collection_name` and "collection name" find the same chunk. Ranking is
+BM25. A trigram index over the identifier vocabulary catches misspelled or
+partial identifiers.
+
+The index is stored as JSON next to the index manifest. Per-chunk term
+frequencies are kept, so the indexer can add and drop chunks incrementally.
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL_PARTS = re.compile(r"[A-Z]+(?=[A-Z][a-z]|[0-9]|\b)|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+_BACKTICKED = re.compile(r"`([^`]+)`")
+# A name directly followed by "(": "config.get_path()" but not "work (incremental mode)".
+_CALL = re.compile(r"([A-Za-z_][A-Za-z0-9_.]*)\(")
+# A lowercase-to-uppercase hump ("getUser") or an acronym prefix ("LRUCache"),
+# but not capitalised words such as "iOS", "macOS" or "URLs".
+_CAMEL_CASE = re.compile(r"[a-z][A-Z][a-z]|[A-Z]{2}[a-z]{2}")
+
+# Words that carry no signal in questions about code.
+STOPWORDS = frozenset("""
+a an and are as at be by can code does do for from how i in is it its of on or
+show tell that the this to used uses using what when where which who why with
+""".split())
+
+def split_identifier(identifier: str) -> list[str]:
+    """snake_case and camelCase parts of an identifier, lowercased."""
+    parts = []
+    for piece in identifier.split("_"):
+        parts.extend(part.lower() for part in _CAMEL_PARTS.findall(piece))
+    return parts
+
+def tokenize(text: str) -> list[str]:
+    """Whole identifiers plus their parts, lowercased."""
+    tokens = []
+    for identifier in _IDENTIFIER.findall(text):
+        whole = identifier.lower()
+        tokens.append(whole)
+        parts = split_identifier(identifier)
+        if parts != [whole]:
+            tokens.extend(parts)
+    return tokens
+
+def _looks_like_code(name: str) -> bool:
+    """snake_case, dotted or camelCase; plain words ("save", "work", "iOS") read as prose."""
+    return "_" in name.strip("_") or "." in name.strip(".") or bool(_CAMEL_CASE.search(name))
+
+def query_identifiers(query: str) -> list[str]:
+    """
+    Identifiers a question names explicitly: anything in backticks, plus
+    snake_case, dotted or camelCase names, whether directly followed by '(' or
+    bare. Dotted names count as their last part (`config.get_collection_name`
+    -> get_collection_name).
+    """
+    found = []
+    for match in _BACKTICKED.findall(query):
+        name = match.split("(")[0].strip()
+        found.extend(_IDENTIFIER.findall(name.split(".")[-1]))
+    for match in _CALL.findall(query):
+        if _looks_like_code(match):
+            found.append(match.split(".")[-1])
+    found.extend(word for word in _IDENTIFIER.findall(_BACKTICKED.sub(" ", query)) if _looks_like_code(word))
+    return [ident for ident in dict.fromkeys(found) if ident]
+
+def trigrams(term: str) -> set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Fuses ranked ID lists: each ID scores the sum of 1 / (k + rank) over the lists it appears in."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
+
+
+class LexicalIndex:
+    """BM25 index over chunk IDs, with a trigram index over its vocabulary."""
+
+    def __init__(self):
+        self._chunks: dict[str, tuple[dict[str, int], int]] = {}
+        self._postings: dict[str, dict[str, int]] = defaultdict(dict)
+        self._total_length = 0
+        self._trigrams = None
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._chunks
+
+    def chunk_ids(self) -> set[str]:
+        return set(self._chunks)
+
+    def _add_counts(self, chunk_id: str, counts: dict[str, int], length: int):
+        if chunk_id in self._chunks:
+            self.remove(chunk_id)
+        self._chunks[chunk_id] = (counts, length)
+        self._total_length += length
+        for term, tf in counts.items():
+            self._postings[term][chunk_id] = tf
+        self._trigrams = None
+
+    def add(self, chunk_id: str, text: str):
+        tokens = tokenize(text)
+        self._add_counts(chunk_id, dict(Counter(tokens)), len(tokens))
+
+    def remove(self, chunk_id: str) -> bool:
+        entry = self._chunks.pop(chunk_id, None)
+        if entry is None:
+            return False
+        counts, length = entry
+        self._total_length -= length
+        for term in counts:
+            postings = self._postings[term]
+            postings.pop(chunk_id, None)
+            if not postings:
+                del self._postings[term]
+        self._trigrams = None
+        return True
+
+    def retain(self, chunk_ids: set[str]) -> int:
+        """Drops every chunk not in chunk_ids. Returns the number dropped."""
+        stale = [chunk_id for chunk_id in self._chunks if chunk_id not in chunk_ids]
+        for chunk_id in stale:
+            self.remove(chunk_id)
+        return len(stale)
+
+    def build_trigram_index(self):
+        """Builds the trigram index now instead of on the first fuzzy lookup."""
+        if self._trigrams is None:
+            index = defaultdict(set)
+            for vocab_term in self._postings:
+                for gram in trigrams(vocab_term):
+                    index[gram].add(vocab_term)
+            self._trigrams = index
+        return self._trigrams
+
+    def similar_terms(self, term: str, limit: int = 3, min_similarity: float = 0.5) -> list[str]:
+        """Vocabulary terms closest to `term` by trigram Jaccard similarity."""
+        index = self.build_trigram_index()
+        grams = sorted(trigrams(term), key=lambda gram: len(index.get(gram, ())))
+        # A match shares at least min_overlap grams with the term, so it must
+        # contain one of the rarest len(grams) - min_overlap + 1 of them. Only
+        # those grams are used to collect candidates.
+        min_overlap = math.ceil(min_similarity * len(grams))
+        candidates = set()
+        for gram in grams[:len(grams) - min_overlap + 1]:
+            candidates.update(index.get(gram, ()))
+        term_grams = set(grams)
+        # Similar terms also have a similar number of trigrams (about length + 1).
+        shortest = min_similarity * len(grams) - 1
+        longest = len(grams) / min_similarity - 1
+        scored = []
+        for candidate in candidates:
+            if not shortest <= len(candidate) <= longest:
+                continue
+            candidate_grams = trigrams(candidate)
+            overlap = len(term_grams & candidate_grams)
+            similarity = overlap / (len(term_grams) + len(candidate_grams) - overlap)
+            if similarity >= min_similarity:
+                scored.append((similarity, candidate))
+        scored.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [candidate for _, candidate in scored[:limit]]
+
+    def _query_terms(self, query: str) -> list[str]:
+        terms = [term for term in tokenize(query) if term not in STOPWORDS]
+        # Identifiers the index has never seen are probably misspelled or partial.
+        for ident in query_identifiers(query):
+            if ident.lower() not in self._postings:
+                terms.extend(self.similar_terms(ident.lower()))
+        return list(dict.fromkeys(terms))
+
+    def _score(self, terms: list[str], candidates: set[str] | None = None) -> dict[str, float]:
+        count = len(self._chunks)
+        if not count:
+            return {}
+        average_length = self._total_length / count or 1.0
+        scores = defaultdict(float)
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                if candidates is not None and chunk_id not in candidates:
+                    continue
+                length = self._chunks[chunk_id][1]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 10) -> list[tuple[str, float]]:
+        """The top_k chunks by BM25 score, best first."""
+        scores = self._score(self._query_terms(query))
+        return sorted(scores.items(), key=lambda entry: entry[1], reverse=True)[:top_k]
+
+    def identifier_matches(self, query: str, top_k: int = 10) -> list[tuple[str, float]] | None:
+        """
+        If the query names identifiers and every one of them occurs verbatim
+        in the index, returns the chunks containing them, ranked by BM25 and
+        by how many of the identifiers each contains. Otherwise returns None
+        and the caller should fall back to full retrieval.
+        """
+        idents = [ident.lower() for ident in query_identifiers(query)]
+        if not idents or any(ident not in self._postings for ident in idents):
+            return None
+        hits = Counter(chunk_id for ident in idents for chunk_id in self._postings[ident])
+        scores = self._score(self._query_terms(query), candidates=set(hits))
+        ranked = sorted(hits, key=lambda chunk_id: (hits[chunk_id], scores.get(chunk_id, 0.0)), reverse=True)
+        return [(chunk_id, scores.get(chunk_id, 0.0)) for chunk_id in ranked[:top_k]]
+
+    def to_dict(self) -> dict:
+        return {"chunks": {chunk_id: {"tf": counts, "length": length} for chunk_id, (counts, length) in self._chunks.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LexicalIndex":
+        index = cls()
+        for chunk_id, entry in data.get("chunks", {}).items():
+            index._add_counts(chunk_id, entry["tf"], entry["length"])
+        return index
+
+
+def load_lexical_index(path: Path) -> LexicalIndex:
+    """Loads a saved index; a missing or unreadable file gives an empty one."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return LexicalIndex.from_dict(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return LexicalIndex()
+
+def save_lexical_index(index: LexicalIndex, path: Path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index.to_dict(), f, separators=(",", ":"))
+    os.replace(tmp_path, path)
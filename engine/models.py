@@ -0,0 +1,223 @@
+# --- engine/models.py ---
+
+import logging
+import os
+import queue
+import threading
+import time
+from threading import Lock
+
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from sentence_transformers import CrossEncoder
+
+import config
+
+class ModelRegistry:
+    """
+    Thread-safe, process-wide registry of loaded models.
+    Each model is loaded at most once per process and shared by every caller,
+    so the indexer and the query path never pay the weight-loading cost twice.
+    """
+
+    def __init__(self):
+        self._models: dict[tuple[str, str], object] = {}
+        self._lock = Lock()
+
+    def get_or_load(self, kind: str, name: str, loader):
+        key = (kind, name)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        # Loading is rare and expensive, so a single lock is enough to make
+        # concurrent first requests wait for one load instead of racing.
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                logging.info(f"--- [MODELS] Loading {kind} model '{name}'... ---")
+                started = time.perf_counter()
+                model = loader()
+                self._models[key] = model
+                logging.info(f"--- [MODELS] Loaded {kind} model '{name}' in {time.perf_counter() - started:.2f}s ---")
+            return model
+
+    def loaded(self) -> list[tuple[str, str]]:
+        return list(self._models)
+
+    def items(self) -> list[tuple[tuple[str, str], object]]:
+        return list(self._models.items())
+
+_registry = ModelRegistry()
+
+
+class _PredictRequest:
+    def __init__(self, pairs):
+        self.pairs = pairs
+        self.scores = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchingCrossEncoder:
+    """
+    Wraps a single CrossEncoder shared by every query engine and merges the
+    predict() calls of concurrent requests into one forward pass.
+    """
+
+    def __init__(self, model: CrossEncoder, max_batch_pairs: int = None, max_wait_ms: float = None):
+        self.model = model
+        self._max_batch_pairs = max_batch_pairs or config.RERANK_MAX_BATCH_PAIRS
+        self._max_wait = (config.RERANK_BATCH_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self._queue: queue.Queue[_PredictRequest] = queue.Queue()
+        self._thread = None
+        self._thread_pid = None
+        self._thread_lock = Lock()
+        self.batches_run = 0
+        self.requests_served = 0
+
+    def _ensure_thread(self):
+        # Threads do not survive fork(), so an RQ job process that inherited a
+        # warmed-up model must start its own batching thread.
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._thread_lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def predict(self, pairs: list[tuple[str, str]]) -> list[float]:
+        if not pairs:
+            return []
+        self._ensure_thread()
+        request = _PredictRequest(list(pairs))
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.scores
+
+    def _collect_batch(self) -> list[_PredictRequest]:
+        batch = [self._queue.get()]
+        pair_count = len(batch[0].pairs)
+        deadline = time.monotonic() + self._max_wait
+        while pair_count < self._max_batch_pairs:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            pair_count += len(request.pairs)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            pairs = [pair for request in batch for pair in request.pairs]
+            try:
+                scores = self.model.predict(pairs, batch_size=self._max_batch_pairs)
+                offset = 0
+                for request in batch:
+                    request.scores = [float(s) for s in scores[offset:offset + len(request.pairs)]]
+                    offset += len(request.pairs)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                self.batches_run += 1
+                self.requests_served += len(batch)
+                for request in batch:
+                    request.done.set()
+
+
+INFERENCE_BACKENDS = ("torch", "onnx")
+
+def _check_backend(backend: str) -> str:
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'; expected one of {INFERENCE_BACKENDS}.")
+    return backend
+
+def model_id(model_name: str, backend: str) -> str:
+    """
+    Identifies a model together with the backend that runs it. Backends give
+    slightly different outputs, so anything keyed by model (e.g. the embedding
+    cache) must use this instead of the bare name.
+    """
+    if backend == "torch":
+        return model_name
+    return f"{model_name}@{backend}-{'int8' if config.ONNX_QUANTIZE else 'fp32'}"
+
+def embed_model_id(model_name: str = None, backend: str = None) -> str:
+    return model_id(model_name or config.EMBEDDING_MODEL_NAME, backend or config.EMBEDDING_BACKEND)
+
+def _load_embed_model(model_name: str, backend: str):
+    if backend == "onnx":
+        from engine.onnx_models import OnnxEmbedding
+        return OnnxEmbedding(model_name, quantize=config.ONNX_QUANTIZE)
+    return HuggingFaceEmbedding(model_name=model_name)
+
+def _load_cross_encoder(model_name: str, backend: str):
+    if backend == "onnx":
+        from engine.onnx_models import OnnxCrossEncoder
+        return OnnxCrossEncoder(model_name, quantize=config.ONNX_QUANTIZE)
+    return CrossEncoder(model_name)
+
+def get_embed_model(model_name: str = None, backend: str = None) -> HuggingFaceEmbedding:
+    """Returns the shared embedding model for the configured backend, loading it on first use."""
+    model_name = model_name or config.EMBEDDING_MODEL_NAME
+    backend = _check_backend(backend or config.EMBEDDING_BACKEND)
+    return _registry.get_or_load(
+        "embedding", model_id(model_name, backend), lambda: _load_embed_model(model_name, backend)
+    )
+
+def get_reranker_model(model_name: str = None, backend: str = None) -> BatchingCrossEncoder:
+    """Returns the shared, request-batching cross-encoder, loading it on first use."""
+    model_name = model_name or config.RERANKER_MODEL_NAME
+    backend = _check_backend(backend or config.RERANKER_BACKEND)
+    return _registry.get_or_load(
+        "reranker", model_id(model_name, backend),
+        lambda: BatchingCrossEncoder(_load_cross_encoder(model_name, backend)),
+    )
+
+def _parameter_bytes(model) -> int | None:
+    """
+    Size of a model's weights, found by unwrapping to the underlying torch
+    module, or to the ONNX session wrapper's model file size.
+    """
+    module = model
+    for _ in range(3):
+        if getattr(module, "model_bytes", None) is not None:
+            return module.model_bytes
+        if hasattr(module, "parameters") and callable(module.parameters):
+            try:
+                return sum(p.numel() * p.element_size() for p in module.parameters())
+            except Exception:
+                return None
+        module = getattr(module, "model", None) or getattr(module, "_model", None)
+        if module is None:
+            return None
+    return None
+
+def model_memory_report() -> list[dict]:
+    """Reports the approximate weight memory of every model loaded in this process."""
+    report = []
+    for (kind, name), model in _registry.items():
+        entry = {"kind": kind, "name": name, "parameter_bytes": _parameter_bytes(model)}
+        if isinstance(model, BatchingCrossEncoder):
+            entry["batches_run"] = model.batches_run
+            entry["requests_served"] = model.requests_served
+        report.append(entry)
+    return report
+
+def warm_up_models():
+    """
+    Eagerly loads the models used on the request path so the first query
+    does not pay the model loading latency.
+    """
+    started = time.perf_counter()
+    get_embed_model()
+    get_reranker_model()
+    logging.info(f"--- [MODELS] Warm-up complete in {time.perf_counter() - started:.2f}s ---")
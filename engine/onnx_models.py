@@ -0,0 +1,195 @@
+# --- engine/onnx_models.py ---
+
+"""
+ONNX Runtime inference backend for the embedding model and the reranker.
+
+On first use a Hugging Face model is exported to ONNX and, by default,
+dynamically quantized to int8 weights. The exported files are kept under
+config.ONNX_MODEL_PATH and reused by every later process. Both wrappers
+reproduce their PyTorch counterparts' pre- and post-processing:
+- OnnxEmbedding matches sentence-transformers' mean pooling plus L2
+  normalization.
+- OnnxCrossEncoder matches CrossEncoder.predict, including the sigmoid it
+  applies to single-logit models.
+As a result the two backends can be swapped with config.INFERENCE_BACKEND.
+
+onnxruntime is an optional dependency and is only imported when this
+backend is selected.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.embeddings import BaseEmbedding
+
+import config
+
+# sentence-transformers resolves bare model names against its own organisation.
+_DEFAULT_ORG = "sentence-transformers"
+_export_lock = threading.Lock()
+
+def _hub_name(model_name: str) -> str:
+    if "/" in model_name or Path(model_name).exists():
+        return model_name
+    return f"{_DEFAULT_ORG}/{model_name}"
+
+def onnx_model_dir(model_name: str) -> Path:
+    return config.ONNX_MODEL_PATH / re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError(
+            "INFERENCE_BACKEND='onnx' requires onnxruntime. Install it with `pip install onnxruntime`."
+        ) from e
+    return onnxruntime
+
+def export_onnx_model(model_name: str, task: str, quantize: bool = True) -> Path:
+    """
+    Exports a Hugging Face model to ONNX (task 'embedding' exports the
+    encoder's hidden states, 'rerank' the classification logits) and returns
+    the path of the model file to load. Files that already exist are reused.
+    """
+    target_dir = onnx_model_dir(model_name)
+    fp32_path = target_dir / "model.onnx"
+    int8_path = target_dir / "model_int8.onnx"
+    model_path = int8_path if quantize else fp32_path
+    if model_path.is_file():
+        return model_path
+
+    with _export_lock:
+        if model_path.is_file():
+            return model_path
+        import torch
+        from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+
+        started = time.perf_counter()
+        target_dir.mkdir(parents=True, exist_ok=True)
+        if not fp32_path.is_file():
+            logging.info(f"--- [ONNX] Exporting '{model_name}' to {fp32_path} ---")
+            hub_name = _hub_name(model_name)
+            tokenizer = AutoTokenizer.from_pretrained(hub_name)
+            model_cls = AutoModelForSequenceClassification if task == "rerank" else AutoModel
+            model = model_cls.from_pretrained(hub_name).eval()
+
+            class _Exported(torch.nn.Module):
+                def __init__(self, wrapped):
+                    super().__init__()
+                    self.wrapped = wrapped
+
+                def forward(self, input_ids, attention_mask):
+                    return self.wrapped(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+            sample = tokenizer(["def f(x): return x"], ["sample"] if task == "rerank" else None, return_tensors="pt")
+            # Write next to the target and rename, so a concurrent process never
+            # loads a half-written file.
+            tmp_path = fp32_path.with_suffix(f".{os.getpid()}.tmp")
+            with torch.no_grad():
+                torch.onnx.export(
+                    _Exported(model),
+                    (sample["input_ids"], sample["attention_mask"]),
+                    str(tmp_path),
+                    input_names=["input_ids", "attention_mask"],
+                    output_names=["output"],
+                    dynamic_axes={
+                        "input_ids": {0: "batch", 1: "sequence"},
+                        "attention_mask": {0: "batch", 1: "sequence"},
+                        "output": {0: "batch"},
+                    },
+                    opset_version=14,
+                )
+            os.replace(tmp_path, fp32_path)
+            tokenizer.save_pretrained(target_dir)
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logging.info(f"--- [ONNX] Quantizing '{model_name}' to int8 ---")
+            tmp_path = int8_path.with_suffix(f".{os.getpid()}.tmp")
+            quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+            os.replace(tmp_path, int8_path)
+        logging.info(f"--- [ONNX] Prepared '{model_name}' in {time.perf_counter() - started:.1f}s ---")
+    return model_path
+
+
+class OnnxSession:
+    """A tokenizer plus an ONNX Runtime session for one exported model."""
+
+    def __init__(self, model_name: str, task: str, quantize: bool = True, max_length: int = 512):
+        onnxruntime = _import_onnxruntime()
+        from transformers import AutoTokenizer
+
+        model_path = export_onnx_model(model_name, task, quantize=quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path.parent)
+        self.max_length = max_length
+        self.model_bytes = model_path.stat().st_size
+        options = onnxruntime.SessionOptions()
+        if config.ONNX_THREADS > 0:
+            options.intra_op_num_threads = config.ONNX_THREADS
+        self.session = onnxruntime.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+
+    def run(self, texts: list[str], text_pairs: list[str] | None = None) -> tuple[np.ndarray, np.ndarray]:
+        encoded = self.tokenizer(
+            texts, text_pairs, padding=True, truncation=True, max_length=self.max_length, return_tensors="np",
+        )
+        mask = encoded["attention_mask"].astype(np.int64)
+        output = self.session.run(None, {"input_ids": encoded["input_ids"].astype(np.int64), "attention_mask": mask})[0]
+        return output, mask
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """Drop-in replacement for HuggingFaceEmbedding backed by ONNX Runtime."""
+
+    _model: OnnxSession = PrivateAttr()
+
+    def __init__(self, model_name: str, quantize: bool = True, max_length: int = 256, **kwargs):
+        super().__init__(model_name=model_name, **kwargs)
+        self._model = OnnxSession(model_name, "embedding", quantize=quantize, max_length=max_length)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        hidden, mask = self._model.run(texts)
+        # Mean pooling over real tokens, then L2 normalization.
+        weights = mask[..., None].astype(hidden.dtype)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts)
+
+
+class OnnxCrossEncoder:
+    """Drop-in replacement for sentence-transformers' CrossEncoder.predict backed by ONNX Runtime."""
+
+    def __init__(self, model_name: str, quantize: bool = True, max_length: int = 512):
+        self.model = OnnxSession(model_name, "rerank", quantize=quantize, max_length=max_length)
+
+    def predict(self, pairs: list[tuple[str, str]], batch_size: int = 32) -> np.ndarray:
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            logits, _ = self.model.run([query for query, _ in batch], [text for _, text in batch])
+            if logits.shape[-1] == 1:
+                scores.append(1 / (1 + np.exp(-logits[:, 0])))
+            else:
+                scores.append(logits)
+        return np.concatenate(scores) if scores else np.array([])
@@ -1,71 +1,324 @@
 # --- engine/rag.py ---
 
 import os
+import array
+import hashlib
 import logging
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
 from dotenv import load_dotenv
 from typing import List
 
 import chromadb
 from llama_index.core import VectorStoreIndex, Settings, QueryBundle
 from llama_index.core.schema import NodeWithScore
-from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.retrievers import BaseRetriever, VectorIndexRetriever
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.core.postprocessor.types import BaseNodePostprocessor
-from sentence_transformers import CrossEncoder
 # --- THE FIX: Corrected import path for Gemini ---
 from llama_index.llms.gemini import Gemini
 
 import config
+from engine.cache import LRUCache
 from engine.context import ProjectContext
+from engine.lexical_index import LexicalIndex, load_lexical_index, reciprocal_rank_fusion
+from engine.models import embed_model_id, get_embed_model, get_reranker_model
 
 load_dotenv()
 
+# Query embeddings depend only on the model and the text, so they are shared by
+# every project. Rerank scores are keyed by project and index version as well,
+# and a project's scores are dropped when it is re-indexed.
+_query_embeddings = LRUCache("query_embeddings", max_entries=config.QUERY_EMBEDDING_CACHE_MAX_ENTRIES)
+_rerank_scores = LRUCache("rerank_scores", max_entries=config.RERANK_SCORE_CACHE_MAX_ENTRIES)
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def normalize_query_text(query: str) -> str:
+    # Only whitespace is normalized: case can matter to cased models.
+    return re.sub(r"\s+", " ", query.strip())
+
+def get_query_embedding(query: str) -> list[float]:
+    """The query's embedding under the current model, computed once per distinct query."""
+    text = normalize_query_text(query)
+    key = (embed_model_id(), text)
+    cached = _query_embeddings.get(key)
+    if cached is not None:
+        return cached.tolist()
+    embedding = get_embed_model().get_query_embedding(text)
+    # Packed float32s take a fraction of the memory of a list of Python floats.
+    packed = array.array("f", embedding)
+    _query_embeddings.put(key, packed, size_bytes=packed.itemsize * len(packed))
+    return embedding
+
+def retrieval_cache_stats() -> dict:
+    return {"query_embeddings": _query_embeddings.stats(), "rerank_scores": _rerank_scores.stats()}
+
+_rerank_counts = {"full": 0, "skipped": 0, "early_exit": 0, "pairs_scored": 0, "pairs_skipped": 0}
+_rerank_counts_lock = Lock()
+
+def _count_rerank(**amounts):
+    with _rerank_counts_lock:
+        for key, amount in amounts.items():
+            _rerank_counts[key] += amount
+
+def rerank_stats() -> dict:
+    """How often reranking ran in full, was skipped or exited early, and the (query, chunk) pairs it scored or skipped."""
+    with _rerank_counts_lock:
+        return dict(_rerank_counts)
+
+# Bookkeeping the retriever and reranker attach to node metadata, hidden from
+# the LLM prompt and from embedding text.
+VECTOR_SCORE_KEY = "vector_score"
+SCORE_TYPE_KEY = "score_type"
+
+def _annotate(node: NodeWithScore, key: str, value):
+    node.node.metadata[key] = value
+    for excluded in (node.node.excluded_llm_metadata_keys, node.node.excluded_embed_metadata_keys):
+        if key not in excluded:
+            excluded.append(key)
+
+def _with_retrieval_scores(nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+    """
+    Labels nodes returned without reranking. Those with a vector similarity
+    report it as their score; the rest keep their retrieval score (RRF or BM25).
+    """
+    for node in nodes:
+        vector_score = node.node.metadata.get(VECTOR_SCORE_KEY)
+        if vector_score is not None:
+            node.score = vector_score
+            _annotate(node, SCORE_TYPE_KEY, "vector")
+        else:
+            _annotate(node, SCORE_TYPE_KEY, "retrieval")
+    return nodes
+
+
 class LocalRerank(BaseNodePostprocessor):
     # ... (class code is correct and remains the same)
-    def __init__(self, model_name: str = "BAAI/bge-reranker-base", top_n: int = 3):
+    def __init__(self, model_name: str = None, top_n: int = 3, cache_namespace: tuple = None, settings: dict = None):
         super().__init__()
-        self._model = CrossEncoder(model_name)
+        # One cross-encoder is shared by every project's engine; concurrent
+        # predictions are batched together by the shared model wrapper.
+        self._model = get_reranker_model(model_name)
         self._top_n = top_n
+        # (project, index version): scores are only reused within one index version.
+        self._cache_namespace = cache_namespace
+        self._settings = settings or config.get_rerank_settings()
+
+    def _score(self, query: str, nodes: List[NodeWithScore]) -> list[float]:
+        contents = [node.get_content() for node in nodes]
+        if self._cache_namespace is None:
+            return self._model.predict([(query, content) for content in contents])
+        query_hash = _text_hash(query)
+        keys = [(*self._cache_namespace, query_hash, _text_hash(content)) for content in contents]
+        scores = [_rerank_scores.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            computed = self._model.predict([(query, contents[i]) for i in missing])
+            for i, score in zip(missing, computed):
+                scores[i] = float(score)
+                _rerank_scores.put(keys[i], scores[i])
+        return scores
 
     def _postprocess_nodes(
         self, nodes: List[NodeWithScore], query_bundle: QueryBundle
     ) -> List[NodeWithScore]:
         if not nodes or not query_bundle.query_str:
             return nodes
-        query_and_nodes = [(query_bundle.query_str, node.get_content()) for node in nodes]
-        scores = self._model.predict(query_and_nodes)
+        if self._settings["mode"] == "adaptive":
+            return self._rerank_adaptive(query_bundle.query_str, nodes)
+        scores = self._score(query_bundle.query_str, nodes)
         for node, score in zip(nodes, scores):
             node.score = float(score)
+            _annotate(node, SCORE_TYPE_KEY, "rerank")
+        _count_rerank(full=1, pairs_scored=len(nodes))
         sorted_nodes = sorted(nodes, key=lambda x: x.score or 0.0, reverse=True)
         return sorted_nodes[:self._top_n]
 
+    def _vector_margin(self, ranked: List[NodeWithScore]) -> float:
+        """
+        How clearly the vector similarities separate the retrieval's top-n from
+        the next candidate, relative to the best similarity. Fused (RRF) scores
+        are about 1 / (k + rank) and never show a margin, so vector similarities
+        are used instead. A top-n the vector search does not agree with (say, a
+        lexical-only hit) has no margin.
+        """
+        top_n = self._top_n
+        by_vector = sorted(
+            (node for node in ranked if node.node.metadata.get(VECTOR_SCORE_KEY) is not None),
+            key=lambda x: x.node.metadata[VECTOR_SCORE_KEY], reverse=True,
+        )
+        if len(by_vector) <= top_n or {id(n) for n in by_vector[:top_n]} != {id(n) for n in ranked[:top_n]}:
+            return 0.0
+        best = by_vector[0].node.metadata[VECTOR_SCORE_KEY]
+        gap = by_vector[top_n - 1].node.metadata[VECTOR_SCORE_KEY] - by_vector[top_n].node.metadata[VECTOR_SCORE_KEY]
+        return gap / best if best > 0 else 0.0
+
+    def _rerank_adaptive(self, query: str, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        """
+        Skips the cross-encoder when the vector similarities leave no doubt
+        about the top-n, and otherwise scores candidates in retrieval order, a
+        batch at a time, until the top-n stops changing.
+        """
+        top_n = self._top_n
+        ranked = sorted(nodes, key=lambda x: x.score or 0.0, reverse=True)
+        if len(ranked) <= top_n:
+            _count_rerank(skipped=1, pairs_skipped=len(ranked))
+            return _with_retrieval_scores(ranked)
+        if self._vector_margin(ranked) >= self._settings["skip_margin"]:
+            _count_rerank(skipped=1, pairs_skipped=len(ranked))
+            return _with_retrieval_scores(ranked[:top_n])
+
+        batch_size = max(1, self._settings["batch_size"])
+        scored, top, stable = [], None, 0
+        for start in range(0, len(ranked), batch_size):
+            batch = ranked[start:start + batch_size]
+            for node, score in zip(batch, self._score(query, batch)):
+                node.score = float(score)
+                _annotate(node, SCORE_TYPE_KEY, "rerank")
+            scored.extend(batch)
+            current = [id(node) for node in sorted(scored, key=lambda x: x.score, reverse=True)[:top_n]]
+            stable = stable + 1 if len(scored) >= top_n and current == top else 0
+            top = current
+            if stable >= self._settings["patience"]:
+                break
+        if len(scored) < len(ranked):
+            _count_rerank(early_exit=1)
+        _count_rerank(pairs_scored=len(scored), pairs_skipped=len(ranked) - len(scored))
+        return sorted(scored, key=lambda x: x.score, reverse=True)[:top_n]
+
+
+class ProjectRetriever(BaseRetriever):
+    """
+    Retrieves RAG candidates for one project. Dense vector results are fused
+    with the project's lexical (BM25) index by reciprocal rank when it has one.
+    A question that names identifiers occurring verbatim in the code is
+    answered from the lexical index alone, skipping the query embedding and
+    the vector search. Query embeddings come from the shared query embedding
+    cache.
+    """
+
+    def __init__(self, vector_retriever: VectorIndexRetriever, lexical_index: LexicalIndex | None,
+                 chroma_collection, top_k: int = None):
+        super().__init__()
+        self._vector_retriever = vector_retriever
+        self._lexical_index = lexical_index
+        self._collection = chroma_collection
+        self._top_k = top_k or config.RETRIEVAL_TOP_K
+        self.shortcircuits = 0
+
+    def _load_nodes(self, chunk_ids: list[str]) -> dict:
+        if not chunk_ids:
+            return {}
+        stored = self._collection.get(ids=chunk_ids, include=["documents", "metadatas"])
+        return {
+            chunk_id: metadata_dict_to_node(metadata, text=document)
+            for chunk_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+
+    def _vector_retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = get_query_embedding(query_bundle.query_str)
+        hits = self._vector_retriever.retrieve(query_bundle)
+        # Kept through fusion, for adaptive reranking's skip margin.
+        for hit in hits:
+            if hit.score is not None:
+                _annotate(hit, VECTOR_SCORE_KEY, float(hit.score))
+        return hits
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        query = query_bundle.query_str
+        if self._lexical_index is None:
+            return self._vector_retrieve(query_bundle)
+        if config.HYBRID_IDENTIFIER_SHORTCIRCUIT:
+            matches = self._lexical_index.identifier_matches(query, self._top_k)
+            if matches:
+                self.shortcircuits += 1
+                nodes = self._load_nodes([chunk_id for chunk_id, _ in matches])
+                return [NodeWithScore(node=nodes[cid], score=score) for cid, score in matches if cid in nodes]
+
+        vector_hits = self._vector_retrieve(query_bundle)
+        lexical_hits = self._lexical_index.search(query, self._top_k)
+        fused = reciprocal_rank_fusion(
+            [[hit.node.node_id for hit in vector_hits], [chunk_id for chunk_id, _ in lexical_hits]],
+            k=config.HYBRID_RRF_K,
+        )[:self._top_k]
+        nodes = {hit.node.node_id: hit.node for hit in vector_hits}
+        nodes.update(self._load_nodes([chunk_id for chunk_id, _ in fused if chunk_id not in nodes]))
+        return [NodeWithScore(node=nodes[cid], score=score) for cid, score in fused if cid in nodes]
+
 
-_query_engines = {}
+def get_retriever(project_name: str, vector_store_path: str, hybrid: bool = None):
+    """
+    The retriever for a project's vector store, plus its Chroma collection:
+    hybrid when enabled and the project has a lexical index, otherwise dense only.
+    """
+    Settings.embed_model = get_embed_model()
+    collection_name = config.get_collection_name(project_name)
+    chroma_collection = chromadb.PersistentClient(path=vector_store_path).get_collection(collection_name)
+    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+    index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
+    retriever = VectorIndexRetriever(index=index, similarity_top_k=config.RETRIEVAL_TOP_K)
+
+    lexical_index = None
+    hybrid = config.HYBRID_RETRIEVAL_ENABLED if hybrid is None else hybrid
+    if hybrid:
+        lexical_index = load_lexical_index(config.get_lexical_index_path(project_name))
+        if len(lexical_index):
+            lexical_index.build_trigram_index()
+        else:
+            logging.info(f"--- [RAG] No lexical index for '{project_name}'; using vector retrieval only. ---")
+            lexical_index = None
+    return ProjectRetriever(retriever, lexical_index, chroma_collection), chroma_collection
+
+
+# Rough resident cost of one cached engine: fixed client/LLM overhead plus the
+# HNSW vectors and links Chroma keeps in memory for each chunk, and its
+# lexical index postings.
+_ENGINE_BASE_BYTES = 16 * 1024 ** 2
+_BYTES_PER_CHUNK = 3 * 1024
+
+_query_engines = LRUCache(
+    "query_engines",
+    max_entries=config.RAG_ENGINE_CACHE_MAX_ENTRIES,
+    max_bytes=config.RAG_ENGINE_CACHE_MAX_BYTES,
+)
+
+def invalidate_query_engine(project_name: str) -> bool:
+    """Drops a project's cached engine and rerank scores, e.g. after it was re-indexed or deleted."""
+    _rerank_scores.invalidate_where(lambda key: key[0] == project_name)
+    return _query_engines.invalidate(project_name)
+
+def query_engine_cache_stats() -> dict:
+    return _query_engines.stats()
 
 def get_query_engine(context: ProjectContext):
-    # ... (this function is correct and remains the same)
     project_name = context.project_id
-    if project_name in _query_engines:
-        return _query_engines[project_name]
+    index_version = context.index_version
+    cached = _query_engines.get(project_name)
+    if cached is not None:
+        cached_version, cached_engine = cached
+        if cached_version == index_version:
+            return cached_engine
+        logging.info(f"--- [RAG] Index for '{project_name}' changed; rebuilding engine. ---")
+        invalidate_query_engine(project_name)
 
     logging.info(f"--- [RAG] Initializing ADVANCED engine for '{project_name}'... ---")
     
-    Settings.embed_model = HuggingFaceEmbedding(model_name=config.EMBEDDING_MODEL_NAME)
-    
     # --- THE FIX: Use the new Gemini class name ---
     llm = Gemini(model_name=config.AGENT_MODEL_NAME, api_key=os.environ.get("GOOGLE_API_KEY"))
 
-    vector_store_path = str(context.vector_store_path)
-    collection_name = config.get_collection_name(project_name)
-    vector_store = ChromaVectorStore(
-        chroma_collection=chromadb.PersistentClient(path=vector_store_path).get_collection(collection_name)
+    retriever, chroma_collection = get_retriever(project_name, str(context.vector_store_path))
+    # Scores cached for an older index version can never be hit again.
+    _rerank_scores.invalidate_where(lambda key: key[0] == project_name and key[1] != index_version)
+    reranker = LocalRerank(
+        top_n=3, cache_namespace=(project_name, index_version), settings=config.get_rerank_settings(project_name),
     )
-    index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
-
-    retriever = VectorIndexRetriever(index=index, similarity_top_k=10)
-    reranker = LocalRerank(top_n=3)
 
     query_engine = RetrieverQueryEngine.from_args(
         retriever,
@@ -74,7 +327,92 @@ def get_query_engine(context: ProjectContext):
         streaming=True,
     )
 
-    _query_engines[project_name] = query_engine
+    approx_bytes = _ENGINE_BASE_BYTES + chroma_collection.count() * _BYTES_PER_CHUNK
+    _query_engines.put(project_name, (index_version, query_engine), size_bytes=approx_bytes)
     logging.info(f"--- [RAG] Advanced RAG engine for '{project_name}' initialized! ---")
     return query_engine
 
+def retrieve_nodes(query_engine: RetrieverQueryEngine, query_bundle: QueryBundle) -> tuple[List[NodeWithScore], dict]:
+    """
+    Same as query_engine.retrieve (retrieval, then reranking), but also returns
+    how long each stage took, in milliseconds. Retrieval includes embedding the query.
+    """
+    started = time.perf_counter()
+    nodes = query_engine.retriever.retrieve(query_bundle)
+    retrieved = time.perf_counter()
+    nodes = query_engine._apply_node_postprocessors(nodes, query_bundle=query_bundle)
+    reranked = time.perf_counter()
+    return nodes, {
+        "retrieve_ms": round((retrieved - started) * 1000, 1),
+        "rerank_ms": round((reranked - retrieved) * 1000, 1),
+    }
+
+def node_sources(nodes: List[NodeWithScore]) -> list[dict]:
+    """The file, line span and score of each retrieved chunk, best first."""
+    sources = []
+    for node in nodes:
+        metadata = node.node.metadata
+        sources.append({
+            # Chunks indexed before line spans were recorded only carry their file path.
+            "path": metadata.get("relative_path") or metadata.get("file_path"),
+            "start_line": metadata.get("start_line"),
+            "end_line": metadata.get("end_line"),
+            "score": round(float(node.score), 4) if node.score is not None else None,
+            # 'rerank' (cross-encoder), 'vector' (similarity) or 'retrieval' (fused or BM25 score).
+            "score_type": metadata.get(SCORE_TYPE_KEY, "retrieval"),
+        })
+    return sources
+
+
+class SpeculativeRetrieval:
+    """
+    Runs retrieval + reranking on a thread pool while routing is in flight.
+    The caller either claims the result (RAG route) or discards it (AGENT route),
+    and the wasted work is accounted for.
+    """
+
+    def __init__(self, max_workers: int):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative-retrieval")
+        self._lock = Lock()
+        self._counts = {"started": 0, "used": 0, "cancelled": 0, "wasted": 0, "wasted_seconds": 0.0}
+
+    def _count(self, key: str, amount=1):
+        with self._lock:
+            self._counts[key] += amount
+
+    def start(self, context: ProjectContext, query: str) -> Future:
+        self._count("started")
+        return self._pool.submit(self._timed_retrieve, context, query)
+
+    @staticmethod
+    def _timed_retrieve(context: ProjectContext, query: str):
+        started = time.perf_counter()
+        query_engine = get_query_engine(context)
+        engine_ready = time.perf_counter()
+        nodes, timings = retrieve_nodes(query_engine, QueryBundle(query))
+        timings["engine_ms"] = round((engine_ready - started) * 1000, 1)
+        return query_engine, nodes, timings, time.perf_counter() - started
+
+    def claim(self, future: Future):
+        """Waits for a speculative retrieval and returns (query_engine, nodes, stage timings)."""
+        query_engine, nodes, timings, _ = future.result()
+        self._count("used")
+        return query_engine, nodes, timings
+
+    def discard(self, future: Future):
+        """Cancels a speculative retrieval, or records its cost if it already ran."""
+        if future.cancel():
+            self._count("cancelled")
+            return
+
+        def account(done: Future):
+            self._count("wasted")
+            if done.exception() is None:
+                self._count("wasted_seconds", done.result()[3])
+        future.add_done_callback(account)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+speculative_retrieval = SpeculativeRetrieval(max_workers=config.SPECULATIVE_RETRIEVAL_WORKERS)
@@ -0,0 +1,243 @@
+# --- engine/router.py ---
+
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Sequence
+
+import config
+from engine.cache import LRUCache
+
+# --- Tier 1: keyword/regex rules for the obvious cases ---
+# Each rule is (pattern, route, confidence). The first matching rule wins.
+# Command rules only match imperatives at the start of the query ("fix ...",
+# "could you add tests ..."), so questions such as "how does the parser extract
+# tokens?" or "what does the workspace module do?" are not mistaken for commands.
+# There is no catch-all rule for questions: "what is in main.py?" is a read
+# request, so question-shaped queries go to the classifier or the LLM router.
+_IMPERATIVE = r"^\s*(please\s+)?((can|could|would)\s+you\s+)?(please\s+)?"
+ROUTING_RULES = [
+    (re.compile(_IMPERATIVE + r"(read|open|show|cat|print|display)\b.*\.\w{1,5}\b", re.I), "AGENT", 0.95),
+    (re.compile(_IMPERATIVE + r"(list|ls)\b", re.I), "AGENT", 0.95),
+    (re.compile(r"\b(callers?|callees?|call\s+graph|who\s+calls|what\s+calls|called\s+by|calls\s+to)\b", re.I), "AGENT", 0.95),
+    (re.compile(r"\bwhere\s+is\s+\S+\s+(used|called|invoked)\b", re.I), "AGENT", 0.9),
+    (re.compile(r"\b(which|what)\s+(functions?|methods?|classes)\s+(calls?|invokes?|uses?)\b", re.I), "AGENT", 0.9),
+    (re.compile(r"\bdoes\s+\S+\s+call\b", re.I), "AGENT", 0.9),
+    (re.compile(_IMPERATIVE + r"(fix|debug|refactor|extract)\b", re.I), "AGENT", 0.9),
+    (re.compile(_IMPERATIVE + r"(generate|write|create|add)\s+(some\s+)?(unit\s+)?tests?\b", re.I), "AGENT", 0.95),
+    (re.compile(_IMPERATIVE + r"run\s+(the\s+)?tests?\b", re.I), "AGENT", 0.95),
+    (re.compile(_IMPERATIVE + r"(create|update|write|save)\b.*\b(file|workspace)\b", re.I), "AGENT", 0.9),
+]
+
+# Questions that lean on earlier turns need the full LLM router.
+HISTORY_REFERENCE = re.compile(
+    r"\b(it|that|this|those|these|them|above|previous|earlier|again|you\s+said|your\s+(last\s+)?answer)\b", re.I
+)
+
+# --- Tier 2: labeled exemplars for the embedding-similarity classifier ---
+ROUTING_EXEMPLARS = [
+    ("What is this project about?", "RAG"),
+    ("Give me a high-level overview of the architecture.", "RAG"),
+    ("How does authentication work in this codebase?", "RAG"),
+    ("Explain how the indexing pipeline is structured.", "RAG"),
+    ("What is the purpose of the config module?", "RAG"),
+    ("How are database connections managed?", "RAG"),
+    ("Which libraries does the project depend on?", "RAG"),
+    ("Describe the data flow from the API to the database.", "RAG"),
+    ("How is error handling done in the request handlers?", "RAG"),
+    ("What design patterns are used here?", "RAG"),
+    ("Read the file app.py", "AGENT"),
+    ("Show me the contents of utils/helpers.py", "AGENT"),
+    ("List the files in the src directory", "AGENT"),
+    ("Which functions call set_password?", "AGENT"),
+    ("Find the callers of build_index", "AGENT"),
+    ("What does process_repository call?", "AGENT"),
+    ("Generate unit tests for hash_password in models.py", "AGENT"),
+    ("Run the tests in the workspace", "AGENT"),
+    ("Fix the bug in parse_config where empty strings crash", "AGENT"),
+    ("Refactor the validation logic into its own function", "AGENT"),
+    ("Can you expand on your previous answer?", "AGENT"),
+    ("What did you mean by that?", "AGENT"),
+]
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+def history_fingerprint(chat_history: Sequence) -> str:
+    """Stable hash of the most recent turns, used as part of the routing cache key."""
+    recent = chat_history[-config.ROUTER_HISTORY_TURNS:] if chat_history else []
+    digest = hashlib.sha1()
+    for message in recent:
+        digest.update(f"{getattr(message, 'type', '')}:{getattr(message, 'content', message)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class QueryRouter:
+    """
+    Decides between the RAG and AGENT routes without an LLM call whenever the
+    answer is obvious: first with keyword rules, then with a nearest-exemplar
+    embedding classifier. Low-confidence queries fall back to the LLM router.
+    Decisions are cached by normalized query and history fingerprint.
+    """
+
+    def __init__(
+        self,
+        llm_router: Callable[[str, Sequence], str | None],
+        embed_fn: Callable[[list[str]], list[list[float]]] | None = None,
+        exemplars: list[tuple[str, str]] = ROUTING_EXEMPLARS,
+    ):
+        self._llm_router = llm_router
+        self._embed_fn = embed_fn
+        self._exemplars = exemplars
+        self._exemplar_vectors = None
+        self._exemplar_lock = threading.Lock()
+        self._decisions = LRUCache("routing_decisions", max_entries=config.ROUTER_CACHE_MAX_ENTRIES)
+        self._stats_lock = threading.Lock()
+        self._counts = {
+            "decisions": 0,
+            "cache_hits": 0,
+            "rule_hits": 0,
+            "embedding_hits": 0,
+            "llm_fallbacks": 0,
+            # Local best guesses checked against the LLM on fallback...
+            "fallback_comparisons": 0,
+            "fallback_agreements": 0,
+            # ...and sampled fast-path decisions re-checked in the background.
+            "shadow_comparisons": 0,
+            "shadow_agreements": 0,
+            "shadow_skipped": 0,
+        }
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="router-shadow")
+        self._shadow_slots = threading.BoundedSemaphore(config.ROUTER_SHADOW_MAX_PENDING)
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._counts[key] += n
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        if self._embed_fn is None:
+            from engine.models import get_embed_model
+            return get_embed_model().get_text_embedding_batch(texts)
+        return self._embed_fn(texts)
+
+    def _classify_by_rules(self, query: str) -> tuple[str, float] | None:
+        for pattern, route, confidence in ROUTING_RULES:
+            if pattern.search(query):
+                return route, confidence
+        return None
+
+    def _classify_by_embedding(self, query: str) -> tuple[str, float, float]:
+        """Returns (route, best similarity, margin over the best exemplar of the other route)."""
+        if self._exemplar_vectors is None:
+            with self._exemplar_lock:
+                if self._exemplar_vectors is None:
+                    self._exemplar_vectors = self._embed([text for text, _ in self._exemplars])
+        query_vector = self._embed([query])[0]
+        best = {}
+        for (_, route), vector in zip(self._exemplars, self._exemplar_vectors):
+            # Embeddings are L2-normalized, so the dot product is the cosine similarity.
+            similarity = sum(a * b for a, b in zip(query_vector, vector))
+            best[route] = max(best.get(route, -1.0), similarity)
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        route, similarity = ranked[0]
+        margin = similarity - (ranked[1][1] if len(ranked) > 1 else -1.0)
+        return route, similarity, margin
+
+    def classify_locally(self, query: str, chat_history: Sequence) -> tuple[str | None, float, str]:
+        """
+        Returns (route, confidence, source). Only 'rules' and 'embedding' sources
+        are confident decisions; for any other source the route is just the best
+        local guess (or None) and the LLM router must decide.
+        """
+        refers_to_history = bool(chat_history) and HISTORY_REFERENCE.search(query) is not None
+
+        rule = self._classify_by_rules(query)
+        if rule is not None and not (refers_to_history and rule[0] == "RAG"):
+            return rule[0], rule[1], "rules"
+        if refers_to_history:
+            return "AGENT", 0.5, "history"
+
+        try:
+            route, similarity, margin = self._classify_by_embedding(query)
+        except Exception as e:
+            logging.warning(f"--- [ROUTE] Embedding classifier unavailable: {e} ---")
+            return None, 0.0, "none"
+        if similarity >= config.ROUTER_MIN_SIMILARITY and margin >= config.ROUTER_MIN_MARGIN:
+            return route, similarity, "embedding"
+        return route, similarity, "embedding-low"
+
+    def _shadow_compare(self, query: str, chat_history: Sequence, local_route: str):
+        """Runs the LLM router in the background to measure agreement with a fast-path decision."""
+        if not self._shadow_slots.acquire(blocking=False):
+            self._count("shadow_skipped")
+            return
+
+        def compare():
+            try:
+                llm_route = self._llm_router(query, chat_history)
+            except Exception as e:
+                logging.warning(f"--- [ROUTE] Shadow LLM routing failed: {e} ---")
+                return
+            finally:
+                self._shadow_slots.release()
+            self._count("shadow_comparisons")
+            if llm_route == local_route:
+                self._count("shadow_agreements")
+            else:
+                logging.info(f"--- [ROUTE] Shadow disagreement: local={local_route} llm={llm_route} ---")
+        self._shadow_pool.submit(compare)
+
+    def route(
+        self, query: str, chat_history: Sequence, before_llm: Callable[[], None] | None = None
+    ) -> str | None:
+        """
+        Returns 'RAG', 'AGENT' or None. before_llm is called right before a slow
+        LLM routing call, so callers can overlap work with it.
+        """
+        started = time.perf_counter()
+        self._count("decisions")
+        cache_key = (normalize_query(query), history_fingerprint(chat_history))
+        cached = self._decisions.get(cache_key)
+        if cached is not None:
+            self._count("cache_hits")
+            return cached
+
+        local_route, confidence, source = self.classify_locally(query, chat_history)
+        if source in ("rules", "embedding"):
+            self._count("rule_hits" if source == "rules" else "embedding_hits")
+            logging.info(
+                f"--- [ROUTE] Fast path ({source}, confidence {confidence:.2f}) "
+                f"chose {local_route} in {(time.perf_counter() - started) * 1000:.1f}ms ---"
+            )
+            if config.ROUTER_SHADOW_RATE > 0 and random.random() < config.ROUTER_SHADOW_RATE:
+                self._shadow_compare(query, chat_history, local_route)
+            self._decisions.put(cache_key, local_route)
+            return local_route
+
+        self._count("llm_fallbacks")
+        if before_llm is not None:
+            before_llm()
+        route = self._llm_router(query, chat_history)
+        if local_route is not None:
+            self._count("fallback_comparisons")
+            if route == local_route:
+                self._count("fallback_agreements")
+        if route in ("RAG", "AGENT"):
+            self._decisions.put(cache_key, route)
+        return route
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            counts = dict(self._counts)
+        decided = counts["decisions"] - counts["cache_hits"]
+        fast = counts["rule_hits"] + counts["embedding_hits"]
+        counts["fast_path_rate"] = fast / decided if decided else 0.0
+        for kind in ("fallback", "shadow"):
+            compared = counts[f"{kind}_comparisons"]
+            counts[f"{kind}_agreement_rate"] = counts[f"{kind}_agreements"] / compared if compared else None
+        counts["cache"] = self._decisions.stats()
+        return counts
@@ -6,6 +6,14 @@ import EmptyState from "./EmptyState";
 import { ConfirmationDialog } from "@/components/ui/confirmation-dialog";
 import { Tooltip, TooltipContent, TooltipTrigger } from "@/components/ui/tooltip";
 
+export interface ChatSource {
+  path: string;
+  start_line?: number;
+  end_line?: number;
+  score?: number;
+  score_type?: string;
+}
+
 export interface ChatMessage {
   role: "user" | "assistant";
   content: string;
@@ -16,6 +24,10 @@ export interface ChatMessage {
     label?: string; 
     tool_name?: string; 
   }>;
+  // RAG answers only: the chunks the answer is based on and per-stage timings (ms).
+  sources?: ChatSource[];
+  timings?: Record<string, number>;
+  cached?: boolean;
   createdAt?: number;
 }
 
@@ -83,6 +95,9 @@ export default function ChatWindow({ selectedProject, apiBaseUrl, messages, onMe
       label?: string; 
       tool_name?: string; 
     }> = [];
+    let sources: ChatSource[] | undefined;
+    let timings: Record<string, number> | undefined;
+    let cached = false;
 
     try {
       const controller = new AbortController();
@@ -131,6 +146,13 @@ export default function ChatWindow({ selectedProject, apiBaseUrl, messages, onMe
             const parsed = JSON.parse(payload);
             if (parsed.type === "chunk" && parsed.content) {
               assistantMessageContent += parsed.content;
+              if (parsed.cached) cached = true;
+            } else if (parsed.type === "sources" && Array.isArray(parsed.sources)) {
+              // Sent before the answer (also for cached answers), so show them while it streams
+              sources = parsed.sources;
+              if (parsed.cached) cached = true;
+            } else if (parsed.type === "timing" && parsed.timings) {
+              timings = parsed.timings;
             } else if (parsed.type === "thought" && parsed.content) {
               // Legacy thought format - keep for backward compatibility
               thoughts.push({ type: parsed.type, content: parsed.content });
@@ -171,6 +193,9 @@ export default function ChatWindow({ selectedProject, apiBaseUrl, messages, onMe
                 ...updated[lastIndex],
                 content: assistantMessageContent,
                 thoughts: thoughts.length > 0 ? thoughts : undefined,
+                sources,
+                timings,
+                cached: cached || undefined,
               };
               messagesRef.current = updated;
               onMessagesChange(updated);
@@ -256,7 +281,7 @@ export default function ChatWindow({ selectedProject, apiBaseUrl, messages, onMe
             ) : (
             <div className="px-4">
               {messages.map((msg, idx) => (
-                <Message key={idx} role={msg.role} content={msg.content} thoughts={msg.thoughts} createdAt={msg.createdAt} />
+                <Message key={idx} role={msg.role} content={msg.content} thoughts={msg.thoughts} sources={msg.sources} timings={msg.timings} cached={msg.cached} createdAt={msg.createdAt} />
               ))}
 
               {/* --- ENHANCED: Live "Working on it..." display with structured events --- */}
@@ -1,8 +1,9 @@
 import { useState } from "react";
 import ReactMarkdown from "react-markdown";
 import remarkGfm from "remark-gfm";
-import { User, Bot, ChevronDown, Brain, Terminal, Copy, Check } from "lucide-react";
+import { User, Bot, ChevronDown, Brain, Terminal, Copy, Check, FileText } from "lucide-react";
 import DeerLoader from "./DeerLoader";
+import type { ChatSource } from "./ChatWindow";
 
 import Editor from 'react-simple-code-editor';
 import { highlight, languages } from 'prismjs/components/prism-core';
@@ -15,11 +16,15 @@ interface MessageProps {
   role: "user" | "assistant";
   content: string;
   thoughts?: Array<{ type: string; content: string }>;
+  sources?: ChatSource[];
+  timings?: Record<string, number>;
+  cached?: boolean;
   createdAt?: number;
 }
 
-export default function Message({ role, content, thoughts, createdAt }: MessageProps) {
+export default function Message({ role, content, thoughts, sources, timings, cached, createdAt }: MessageProps) {
   const [showThoughts, setShowThoughts] = useState(false);
+  const [showSources, setShowSources] = useState(false);
   const [copied, setCopied] = useState(false);
   const [copiedCode, setCopiedCode] = useState(false);
 
@@ -140,6 +145,42 @@ export default function Message({ role, content, thoughts, createdAt }: MessageP
           )}
         </div>
 
+        {role === "assistant" && (!!sources?.length || timings?.total_ms !== undefined) && (
+          <div className="space-y-2">
+            <div className="flex items-center gap-3 text-sm text-muted-foreground">
+              {sources && sources.length > 0 && (
+                <button
+                  onClick={() => setShowSources(!showSources)}
+                  className="inline-flex items-center gap-2 transition-colors hover:text-foreground"
+                >
+                  <FileText className="h-4 w-4" />
+                  <span>Sources ({sources.length})</span>
+                  <ChevronDown className={`h-4 w-4 transition-transform ${showSources ? "rotate-180" : ""}`} />
+                </button>
+              )}
+              {timings?.total_ms !== undefined && (
+                <span className="text-xs">{cached ? "Cached · " : ""}{Math.round(timings.total_ms)} ms</span>
+              )}
+            </div>
+
+            {showSources && sources && (
+              <ul className="space-y-1 rounded-lg border bg-surface-alt p-4 text-left text-xs text-muted-foreground">
+                {sources.map((source, idx) => (
+                  <li key={idx} className="flex items-start justify-between gap-2">
+                    <span className="break-all font-mono">
+                      {source.path}
+                      {source.start_line !== undefined ? `:${source.start_line}-${source.end_line ?? source.start_line}` : ""}
+                    </span>
+                    {source.score !== undefined && (
+                      <span title={source.score_type}>{source.score.toFixed(2)}</span>
+                    )}
+                  </li>
+                ))}
+              </ul>
+            )}
+          </div>
+        )}
+
         {role === "assistant" && thoughts && thoughts.length > 0 && (
           <div className="space-y-2">
             <button
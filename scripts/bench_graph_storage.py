@@ -0,0 +1,80 @@
+# --- scripts/bench_graph_storage.py ---
+
+"""
+Compares loading a code graph from JSON and from the binary CSR format:
+file size, load time, peak RSS of the loading process and first-query latency.
+Each load runs in a fresh subprocess so RSS numbers do not interfere.
+
+    python -m scripts.bench_graph_storage --nodes 200000 --edges 1000000
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from engine.graph_storage import write_csr_graph
+from scripts.bench_graph_traversal import synthetic_graph
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def measure_load(graph_path: str, entity: str) -> dict:
+    """Runs in the child process: load the graph, answer one query, report timings."""
+    from engine.graph_index import load_graph_index
+
+    baseline_rss = _peak_rss_mb()
+    started = time.perf_counter()
+    graph = load_graph_index(Path(graph_path))
+    loaded = time.perf_counter()
+    for key in graph.find(entity):
+        graph.callers(key)
+    queried = time.perf_counter()
+    return {
+        "load_ms": round((loaded - started) * 1000, 1),
+        "first_query_ms": round((queried - loaded) * 1000, 2),
+        "rss_mb": round(_peak_rss_mb() - baseline_rss, 1),
+        "nodes": len(graph),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=200_000)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    parser.add_argument("--load", help=argparse.SUPPRESS)
+    parser.add_argument("--entity", default="f42", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.load:
+        print(json.dumps(measure_load(args.load, args.entity)))
+        return
+
+    graph = synthetic_graph(args.nodes, args.edges)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / "bench_graph.json"
+        csr_path = Path(tmp) / "bench_graph.csr"
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(graph, f, indent=2)
+        write_csr_graph(graph, csr_path)
+        del graph
+
+        for label, path in (("json", json_path), ("csr", csr_path)):
+            output = subprocess.run(
+                [sys.executable, "-m", "scripts.bench_graph_storage", "--load", str(path), "--entity", args.entity],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            size_mb = path.stat().st_size / (1024 * 1024)
+            print(
+                f"{label:>5}: file={size_mb:7.1f}MB load={result['load_ms']:8.1f}ms "
+                f"rss=+{result['rss_mb']:7.1f}MB first_query={result['first_query_ms']:.2f}ms"
+            )
+
+if __name__ == "__main__":
+    main()
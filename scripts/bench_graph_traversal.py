@@ -0,0 +1,71 @@
+# --- scripts/bench_graph_traversal.py ---
+
+"""
+Micro-benchmark for multi-hop code graph traversal on a synthetic graph.
+
+    python -m scripts.bench_graph_traversal --nodes 100000 --edges 500000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+import config
+from engine.graph_index import CodeGraphIndex
+
+def synthetic_graph(node_count: int, edge_count: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    nodes = [{"id": f"mod{i // 50}.py::f{i}", "name": f"f{i}"} for i in range(node_count)]
+    edges = []
+    for _ in range(edge_count):
+        # Mostly local calls with some long-range ones, like a real project.
+        source = rng.randrange(node_count)
+        target = source + rng.randint(1, 200) if rng.random() < 0.8 else rng.randrange(node_count)
+        edges.append({
+            "source": nodes[source]["id"],
+            "target": nodes[target % node_count]["id"],
+            "confidence": rng.choice((1.0, 1.0, 0.9, 0.8, 0.4, 0.2)),
+        })
+    return {"nodes": nodes, "edges": edges}
+
+def _percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"p50={statistics.median(samples):.2f}ms p95={p95:.2f}ms max={samples[-1]:.2f}ms"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=100_000)
+    parser.add_argument("--edges", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=config.GRAPH_TRAVERSAL_MAX_DEPTH)
+    parser.add_argument("--min-confidence", type=float, default=0.8)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    graph = CodeGraphIndex.from_dict(synthetic_graph(args.nodes, args.edges))
+    print(f"Built index: {len(graph)} nodes, {graph.edge_count} edges in {time.perf_counter() - started:.2f}s")
+
+    rng = random.Random(11)
+    ids = list(graph.nodes_by_id)
+    budgets = {"max_depth": args.depth, "min_confidence": args.min_confidence, "max_nodes": config.GRAPH_TRAVERSAL_MAX_NODES}
+    timings = {"impact": [], "callees": [], "path": []}
+    for _ in range(args.queries):
+        start, goal = rng.choice(ids), rng.choice(ids)
+        for kind in timings:
+            t0 = time.perf_counter()
+            deadline = t0 + config.GRAPH_TRAVERSAL_TIMEOUT_MS / 1000
+            if kind == "impact":
+                graph.impact_set([start], deadline=deadline, **budgets)
+            elif kind == "callees":
+                graph.expand([start], "callees", deadline=deadline, **budgets)
+            else:
+                graph.shortest_path([start], [goal], deadline=deadline, **budgets)
+            timings[kind].append((time.perf_counter() - t0) * 1000)
+
+    for kind, samples in timings.items():
+        print(f"{kind:>8}: {_percentiles(samples)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# --- scripts/bench_inference.py ---
+
+"""
+Compares the PyTorch and ONNX (int8) inference backends for the embedding
+model and the reranker: load time, embedding throughput, latency of reranking
+one query's candidates (p50/p95) and peak RSS. Each backend runs in a fresh
+subprocess so RSS numbers do not interfere.
+
+    python -m scripts.bench_inference --candidates 10 --runs 50
+"""
+
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from scripts.bench_graph_storage import _peak_rss_mb
+
+def _sample_chunks(count: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    words = ["project", "graph", "index", "node", "edge", "cache", "query", "config", "path", "load"]
+    chunks = []
+    for i in range(count):
+        body = "\n".join(
+            f"    {rng.choice(words)}_{j} = {rng.choice(words)}({rng.choice(words)}, {j})"
+            for j in range(rng.randint(5, 30))
+        )
+        chunks.append(f"def {rng.choice(words)}_{i}(self, {rng.choice(words)}):\n{body}\n    return None")
+    return chunks
+
+def measure_backend(backend: str, candidates: int, runs: int, chunks: int) -> dict:
+    """Runs in the child process: load both models on one backend and time them."""
+    from engine.models import get_embed_model, get_reranker_model
+
+    baseline_rss = _peak_rss_mb()
+    started = time.perf_counter()
+    embed_model = get_embed_model(backend=backend)
+    reranker = get_reranker_model(backend=backend).model
+    load_seconds = time.perf_counter() - started
+
+    texts = _sample_chunks(chunks)
+    embed_model.get_text_embedding_batch(texts[:8])  # warm-up
+    started = time.perf_counter()
+    embed_model.get_text_embedding_batch(texts)
+    embed_seconds = time.perf_counter() - started
+
+    query = "How does the graph cache decide when to reload a project?"
+    pairs = [(query, text) for text in texts[:candidates]]
+    reranker.predict(pairs)  # warm-up
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        reranker.predict(pairs)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "load_s": round(load_seconds, 2),
+        "embed_chunks_per_s": round(len(texts) / embed_seconds, 1),
+        "rerank_p50_ms": round(statistics.median(timings), 1),
+        "rerank_p95_ms": round(timings[int(len(timings) * 0.95) - 1], 1),
+        "rss_mb": round(_peak_rss_mb() - baseline_rss, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--chunks", type=int, default=256)
+    parser.add_argument("--backends", default="torch,onnx")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure_backend(args.measure, args.candidates, args.runs, args.chunks)))
+        return
+
+    for backend in args.backends.split(","):
+        output = subprocess.run(
+            [sys.executable, "-m", "scripts.bench_inference", "--measure", backend,
+             "--candidates", str(args.candidates), "--runs", str(args.runs), "--chunks", str(args.chunks)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{backend:>5}: load={result['load_s']:6.2f}s embed={result['embed_chunks_per_s']:7.1f} chunks/s "
+            f"rerank[{args.candidates}] p50={result['rerank_p50_ms']:6.1f}ms p95={result['rerank_p95_ms']:6.1f}ms "
+            f"rss=+{result['rss_mb']:7.1f}MB"
+        )
+
+if __name__ == "__main__":
+    main()
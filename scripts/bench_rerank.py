@@ -0,0 +1,90 @@
+# --- scripts/bench_rerank.py ---
+
+"""
+Compares full and adaptive reranking on an indexed project: rerank latency
+(p50/p95), cross-encoder pairs scored, and how often the adaptive top-n
+agrees with the full one (same top-1, and overlap of the top-n sets).
+
+Queries are the ones scripts.bench_retrieval generates from the project's
+own definitions. Candidates are retrieved once per query and both rerankers
+see the same candidates, with the rerank score cache disabled.
+
+    python -m scripts.bench_rerank my_project --queries 100 --skip-margin 0.25
+"""
+
+import argparse
+import copy
+import statistics
+import time
+
+from llama_index.core import QueryBundle
+
+import config
+from engine.rag import LocalRerank, get_retriever, rerank_stats
+from scripts.bench_retrieval import _definitions, make_queries
+
+def _percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+def _rerank(reranker: LocalRerank, query: str, nodes: list) -> tuple[list[str], float]:
+    # Rerankers overwrite node scores, so each one gets its own copy.
+    nodes = copy.deepcopy(nodes)
+    started = time.perf_counter()
+    top = reranker.postprocess_nodes(nodes, QueryBundle(query))
+    return [node.node.node_id for node in top], (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("project")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--skip-margin", type=float, default=config.RERANK_SKIP_MARGIN)
+    parser.add_argument("--batch-size", type=int, default=config.RERANK_BATCH_SIZE)
+    parser.add_argument("--patience", type=int, default=config.RERANK_PATIENCE)
+    args = parser.parse_args()
+
+    vector_store_path = str(config.get_vector_store_path(args.project))
+    retriever, chroma_collection = get_retriever(args.project, vector_store_path)
+    queries = make_queries(_definitions(chroma_collection), args.queries)
+    full = LocalRerank(top_n=args.top_n, settings={**config.get_rerank_settings(args.project), "mode": "full"})
+    adaptive = LocalRerank(top_n=args.top_n, settings={
+        "mode": "adaptive", "skip_margin": args.skip_margin, "batch_size": args.batch_size, "patience": args.patience,
+    })
+    print(f"{len(queries)} queries over {chroma_collection.count()} chunks, top_n={args.top_n}")
+
+    # Warm up both models so the first query does not pay for loading them.
+    full.postprocess_nodes(retriever.retrieve(QueryBundle("warm up")), QueryBundle("warm up"))
+    timings = {"full": [], "adaptive": []}
+    adaptive_counts = {"skipped": 0, "early_exit": 0, "pairs_scored": 0}
+    top1_agree, overlap, candidates = 0, 0.0, 0
+    for _, query, _ in queries:
+        nodes = retriever.retrieve(QueryBundle(query))
+        if not nodes:
+            continue
+        candidates += len(nodes)
+        full_top, full_ms = _rerank(full, query, nodes)
+        before = rerank_stats()
+        adaptive_top, adaptive_ms = _rerank(adaptive, query, nodes)
+        after = rerank_stats()
+        for key in adaptive_counts:
+            adaptive_counts[key] += after[key] - before[key]
+        timings["full"].append(full_ms)
+        timings["adaptive"].append(adaptive_ms)
+        top1_agree += full_top[:1] == adaptive_top[:1]
+        overlap += len(set(full_top) & set(adaptive_top)) / max(1, len(full_top))
+
+    runs = len(timings["full"])
+    if not runs:
+        print("No query retrieved any candidates.")
+        return
+    for label, values in timings.items():
+        print(f"{label:>8}: p50={statistics.median(values):6.1f}ms p95={_percentile(values, 0.95):6.1f}ms")
+    print(f"agreement: top-1={top1_agree / runs:.3f} top-{args.top_n} overlap={overlap / runs:.3f}")
+    print(
+        f"adaptive: skipped {adaptive_counts['skipped']} and exited early on {adaptive_counts['early_exit']} "
+        f"of {runs} queries, scored {adaptive_counts['pairs_scored']} of {candidates} pairs"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# --- scripts/bench_retrieval.py ---
+
+"""
+Compares dense-only and hybrid (vector + lexical) retrieval on an indexed
+project: retrieval latency (p50/p95) and recall@k.
+
+Queries are generated from the project itself. For a sample of functions and
+classes defined in the indexed chunks it asks where each one is defined,
+once naming the identifier and once describing it in words. A query counts
+as a hit if a chunk containing the definition is in the top k.
+
+    python -m scripts.bench_retrieval my_project --queries 100
+"""
+
+import argparse
+import random
+import re
+import statistics
+import time
+
+from llama_index.core import QueryBundle
+
+import config
+from engine.lexical_index import split_identifier
+from engine.rag import get_retriever
+from scripts.build_index import UPSERT_BATCH_SIZE
+
+_DEFINITION = re.compile(r"^\s*(?:async\s+)?(def|class)\s+([A-Za-z_]\w*)", re.MULTILINE)
+
+def _definitions(chroma_collection) -> dict[tuple[str, str], set[str]]:
+    """(kind, name) -> IDs of the chunks containing that definition."""
+    definitions = {}
+    offset = 0
+    while True:
+        page = chroma_collection.get(include=["documents"], limit=UPSERT_BATCH_SIZE, offset=offset)
+        for chunk_id, document in zip(page["ids"], page["documents"]):
+            for kind, name in _DEFINITION.findall(document or ""):
+                definitions.setdefault((kind, name), set()).add(chunk_id)
+        if len(page["ids"]) < UPSERT_BATCH_SIZE:
+            return definitions
+        offset += len(page["ids"])
+
+def make_queries(definitions: dict, count: int, seed: int = 13) -> list[tuple[str, str, set[str]]]:
+    """(style, query, relevant chunk IDs) for a sample of multi-word definitions."""
+    candidates = sorted(key for key in definitions if len(split_identifier(key[1])) > 1)
+    sample = random.Random(seed).sample(candidates, min(count, len(candidates)))
+    queries = []
+    for kind, name in sample:
+        noun = "function" if kind == "def" else "class"
+        relevant = definitions[(kind, name)]
+        queries.append(("identifier", f"Where is `{name}` defined?", relevant))
+        queries.append(("descriptive", f"Where is the {' '.join(split_identifier(name))} {noun} defined?", relevant))
+    return queries
+
+def evaluate(retriever, queries: list, k: int) -> dict:
+    results = {}
+    for style in sorted({style for style, _, _ in queries}):
+        timings, hits = [], 0
+        for query_style, query, relevant in queries:
+            if query_style != style:
+                continue
+            started = time.perf_counter()
+            nodes = retriever.retrieve(QueryBundle(query))
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += any(node.node.node_id in relevant for node in nodes[:k])
+        timings.sort()
+        results[style] = {
+            "recall": hits / len(timings),
+            "p50_ms": statistics.median(timings),
+            "p95_ms": timings[max(0, int(len(timings) * 0.95) - 1)],
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("project")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=config.RETRIEVAL_TOP_K)
+    args = parser.parse_args()
+
+    vector_store_path = str(config.get_vector_store_path(args.project))
+    dense, chroma_collection = get_retriever(args.project, vector_store_path, hybrid=False)
+    hybrid, _ = get_retriever(args.project, vector_store_path, hybrid=True)
+    queries = make_queries(_definitions(chroma_collection), args.queries)
+    print(f"{len(queries)} queries over {chroma_collection.count()} chunks, recall@{args.k}")
+
+    # Warm up the embedding model so the first query does not pay for loading it.
+    dense.retrieve(QueryBundle("warm up"))
+    for label, retriever in (("dense", dense), ("hybrid", hybrid)):
+        for style, result in evaluate(retriever, queries, args.k).items():
+            print(
+                f"{label:>6} {style:>11}: recall={result['recall']:.3f} "
+                f"p50={result['p50_ms']:6.1f}ms p95={result['p95_ms']:6.1f}ms"
+            )
+
+if __name__ == "__main__":
+    main()
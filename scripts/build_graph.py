@@ -2,11 +2,32 @@
 
 import ast
 import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import logging
 
 import config
 
+# Confidence of a heuristic (name-only) call resolution. When several symbols
+# share the called name, this is split evenly between all of them.
+HEURISTIC_CONFIDENCE = 0.4
+
+def resolve_by_name(method_name: str, name_index: dict) -> list[tuple[str, float]]:
+    """
+    Heuristic fallback for unresolved attribute calls: every symbol whose short
+    name matches is a candidate, each with an equal share of HEURISTIC_CONFIDENCE.
+    Names defined more than GRAPH_MAX_HEURISTIC_CANDIDATES times are too ambiguous
+    to be useful and resolve to nothing.
+    """
+    candidates = name_index.get(method_name)
+    if not candidates or len(candidates) > config.GRAPH_MAX_HEURISTIC_CANDIDATES:
+        return []
+    confidence = round(HEURISTIC_CONFIDENCE / len(candidates), 4)
+    return [(candidate, confidence) for candidate in candidates]
+
 class DefinitionVisitor(ast.NodeVisitor):
     """
     Pass 1: Visits AST nodes to find all class, function, and method definitions
@@ -44,11 +65,16 @@ class ContextAwareCallVisitor(ast.NodeVisitor):
     """
     Pass 2: Visits AST nodes to find all function/method calls, using
     import context to resolve them intelligently.
+
+    Attribute calls that cannot be resolved from the file itself are recorded
+    in `unresolved` as (caller_id, method_name), so they can be resolved later
+    against the symbols of the whole project.
     """
-    def __init__(self, relative_path, edges, symbol_table):
+    def __init__(self, relative_path, edges, symbol_table, unresolved):
         self.relative_path = relative_path
         self.edges = edges
         self.symbol_table = symbol_table
+        self.unresolved = unresolved
         self.scope_stack = []
         self.imports = {}
         self.from_imports = {}
@@ -122,14 +148,9 @@ class ContextAwareCallVisitor(ast.NodeVisitor):
                     callee_id = f"{module_name}::{method_name}"
                     confidence = 0.9
         
-        # Heuristic Fallback for unresolved attribute calls
+        # Unresolved attribute calls are guessed by name later, in merge_summaries
         if not callee_id and isinstance(node.func, ast.Attribute):
-             method_name = node.func.attr
-             for key in self.symbol_table:
-                 if key.endswith(f"::{method_name}"):
-                     callee_id = key
-                     confidence = 0.4 # Low confidence: heuristic guess
-                     break
+            self.unresolved.append((caller_id, node.func.attr))
 
         if callee_id:
             self.edges.append({
@@ -141,51 +162,199 @@ class ContextAwareCallVisitor(ast.NodeVisitor):
         
         self.generic_visit(node)
 
-def build_code_graph(project_name: str, project_path: Path):
+def summarize_file(task: tuple[str, str]) -> dict:
+    """
+    Parses one file exactly once and returns a compact summary of it:
+    its definitions, the calls that could be resolved from the file alone,
+    and the attribute calls that need the project-wide symbol table.
+    Runs in a worker process, so everything it returns is plain tuples.
+    """
+    file_path, relative_path = task
+    try:
+        content = Path(file_path).read_text(encoding="utf-8")
+        tree = ast.parse(content)
+    except Exception as e:
+        return {"file": relative_path, "error": str(e)}
+
+    nodes, local_symbols = [], {}
+    DefinitionVisitor(relative_path, nodes, local_symbols).visit(tree)
+    edges, unresolved = [], []
+    ContextAwareCallVisitor(relative_path, edges, local_symbols, unresolved).visit(tree)
+    return {
+        "file": relative_path,
+        "nodes": [(n["id"], n["type"], n["name"]) for n in nodes],
+        "edges": [(e["source"], e["target"], e["confidence"]) for e in edges],
+        "unresolved": unresolved,
+    }
+
+def _summarize_files(tasks: list[tuple[str, str]]) -> list[dict]:
+    """Summarizes files in a process pool, or in-process for small projects."""
+    workers = config.GRAPH_BUILD_WORKERS or os.cpu_count() or 1
+    if workers <= 1 or len(tasks) < config.GRAPH_PARALLEL_MIN_FILES:
+        return [summarize_file(task) for task in tasks]
+    chunksize = max(1, len(tasks) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() preserves input order, which keeps the merge deterministic.
+        return list(pool.map(summarize_file, tasks, chunksize=chunksize))
+
+def merge_summaries(summaries: list[dict]) -> tuple[list[dict], list[dict]]:
+    """
+    Merge step: combines per-file summaries into graph nodes and edges and
+    resolves the remaining attribute calls through a short name -> symbol IDs
+    index of the whole project.
+    """
+    all_nodes, all_edges, name_index, seen = [], [], {}, set()
+    for summary in summaries:
+        for node_id, node_type, name in summary.get("nodes", []):
+            all_nodes.append({"id": node_id, "type": node_type, "name": name, "file": summary["file"]})
+            # A symbol defined twice (e.g. in both branches of an if) is still one candidate.
+            if node_id not in seen:
+                seen.add(node_id)
+                name_index.setdefault(name, []).append(node_id)
+
+    for summary in summaries:
+        for source, target, confidence in summary.get("edges", []):
+            all_edges.append({"source": source, "target": target, "type": "CALLS", "confidence": confidence})
+        for caller_id, method_name in summary.get("unresolved", []):
+            for target, confidence in resolve_by_name(method_name, name_index):
+                all_edges.append({"source": caller_id, "target": target, "type": "CALLS", "confidence": confidence})
+    return all_nodes, all_edges
+
+def save_code_graph(project_name: str, graph: dict, summaries: list[dict] | None = None, commit: str | None = None) -> Path:
+    """
+    Writes the graph in the configured format (plus a JSON export if requested).
+    The SQLite store is written from the per-file summaries, so that it also
+    holds what incremental updates need, and records the source commit.
+    """
+    save_path = config.get_code_graph_path(project_name)
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    if config.CODE_GRAPH_FORMAT in ("csr", "sqlite"):
+        if config.CODE_GRAPH_FORMAT == "csr":
+            from engine.graph_storage import write_csr_graph
+            write_csr_graph(graph, save_path)
+        elif summaries is not None:
+            from engine.graph_sqlite import SqliteCodeGraph
+            store = SqliteCodeGraph(save_path, readonly=False)
+            try:
+                store.apply_summaries(summaries, resolve=resolve_by_name, clear=True, meta={"commit": commit or ""})
+            finally:
+                store.close()
+        else:
+            from engine.graph_sqlite import write_sqlite_graph
+            write_sqlite_graph(graph, save_path)
+        if not config.CODE_GRAPH_EXPORT_JSON:
+            return save_path
+    with open(config.get_code_graph_path(project_name, "json"), "w", encoding="utf-8") as f:
+        json.dump(graph, f, indent=2)
+    return save_path
+
+def build_code_graph(project_name: str, project_path: Path, commit: str | None = None) -> dict:
     """
     Analyzes a Python codebase in a given path and builds a JSON file
     representing its call graph, including nodes (functions, methods)
     and edges (calls between them).
+
+    Each file is parsed once, in parallel across processes; call resolution
+    then runs as a single merge step. `commit` is the revision being indexed,
+    which later incremental updates diff against. Returns build statistics.
     """
     logging.info(f"--- 🚀 Starting Intelligent Code Graph Construction for project: {project_name} ---")
-    all_nodes, all_edges, symbol_table = [], [], {}
-    
+    started = time.perf_counter()
+
     python_files = list(project_path.rglob("*.py"))
     logging.info(f"Found {len(python_files)} Python files to process.")
 
-    # Pass 1: Discover all definitions
-    logging.info("--- Pass 1: Discovering definitions... ---")
-    for file_path in python_files:
-        relative_path = file_path.relative_to(project_path).as_posix()
-        try:
-            content = file_path.read_text(encoding="utf-8")
-            tree = ast.parse(content)
-            DefinitionVisitor(relative_path, all_nodes, symbol_table).visit(tree)
-        except Exception as e:
-            logging.error(f"  - ❌ Error parsing {relative_path} for definitions: {e}")
+    # Parse every file once and collect definitions and call sites
+    logging.info("--- Parsing files and collecting definitions and call sites... ---")
+    tasks = [(str(file_path), file_path.relative_to(project_path).as_posix()) for file_path in python_files]
+    summaries = _summarize_files(tasks)
+    parse_seconds = time.perf_counter() - started
+    for summary in summaries:
+        if "error" in summary:
+            logging.error(f"  - ❌ Error parsing {summary['file']}: {summary['error']}")
 
+    # Merge: build the symbol table and resolve calls with context
+    logging.info("--- Resolving calls with context... ---")
+    all_nodes, all_edges = merge_summaries(summaries)
     logging.info(f"--- ✅ Found {len(all_nodes)} total definitions. ---")
 
-    # Pass 2: Discover all calls
-    logging.info("--- Pass 2: Resolving calls with context... ---")
-    for file_path in python_files:
-        relative_path = file_path.relative_to(project_path).as_posix()
-        try:
-            content = file_path.read_text(encoding="utf-8")
-            tree = ast.parse(content)
-            ContextAwareCallVisitor(relative_path, all_edges, symbol_table).visit(tree)
-        except Exception as e:
-            logging.error(f"  - ❌ Error parsing {relative_path} for calls: {e}")
-
     # Deduplicate edges based on all key-value pairs
     unique_edges = [dict(t) for t in {tuple(sorted(d.items())) for d in all_edges}]
     logging.info(f"--- ✅ Resolved {len(unique_edges)} total calls. ---")
 
     # Save Graph
     full_graph = {"nodes": all_nodes, "edges": unique_edges}
+    save_path = save_code_graph(project_name, full_graph, summaries=summaries, commit=commit)
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "mode": "full",
+        "files": len(python_files),
+        "failed_files": sum(1 for s in summaries if "error" in s),
+        "nodes": len(all_nodes),
+        "edges": len(unique_edges),
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(len(python_files) / parse_seconds, 1) if parse_seconds > 0 else None,
+    }
+    logging.info(f"--- 🎉 Intelligent code graph for {project_name} saved to {save_path} ({stats}) ---")
+    return stats
+
+def graph_commit(project_name: str) -> str | None:
+    """
+    The commit the stored graph was built from, if it can be updated
+    incrementally (only the SQLite format keeps the state for that).
+    """
+    if config.CODE_GRAPH_FORMAT != "sqlite":
+        return None
+    from engine.graph_sqlite import SqliteCodeGraph
+    try:
+        with SqliteCodeGraph(config.get_code_graph_path(project_name)) as store:
+            return store.get_meta("commit") or None
+    except (FileNotFoundError, sqlite3.Error):
+        return None
+
+def update_code_graph(project_name: str, project_path: Path, changes: dict, commit: str | None = None) -> dict:
+    """
+    Incrementally patches the stored (SQLite) code graph after a change to the repo.
+    `changes` maps 'added', 'modified' and 'deleted' to repo-relative paths, e.g.
+    from a git diff. Only those files are parsed again; heuristic calls are
+    re-resolved only where the set of candidate definitions changed.
+    """
+    from engine.graph_sqlite import SqliteCodeGraph
+
+    started = time.perf_counter()
+    changed, removed = [], [path for path in changes.get("deleted", []) if path.endswith(".py")]
+    for relative_path in changes.get("added", []) + changes.get("modified", []):
+        if not relative_path.endswith(".py"):
+            continue
+        if (project_path / relative_path).is_file():
+            changed.append(relative_path)
+        else:
+            removed.append(relative_path)
+    logging.info(f"--- 🔁 Updating code graph for {project_name}: {len(changed)} changed, {len(removed)} removed files ---")
+
+    summaries = _summarize_files([(str(project_path / relative_path), relative_path) for relative_path in changed])
+    for summary in summaries:
+        if "error" in summary:
+            logging.error(f"  - ❌ Error parsing {summary['file']}: {summary['error']}")
+
     save_path = config.get_code_graph_path(project_name)
-    save_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(full_graph, f, indent=2)
-    
-    logging.info(f"--- 🎉 Intelligent code graph for {project_name} saved to {save_path} ---")
\ No newline at end of file
+    store = SqliteCodeGraph(save_path, readonly=False)
+    try:
+        result = store.apply_summaries(summaries, removed, resolve=resolve_by_name, meta={"commit": commit or ""})
+        if config.CODE_GRAPH_EXPORT_JSON:
+            with open(config.get_code_graph_path(project_name, "json"), "w", encoding="utf-8") as f:
+                json.dump(store.to_dict(), f, indent=2)
+    finally:
+        store.close()
+
+    stats = {
+        "mode": "incremental",
+        "files": len(changed),
+        "removed_files": len(removed),
+        "failed_files": sum(1 for s in summaries if "error" in s),
+        "names_resolved": result["names_resolved"],
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    logging.info(f"--- 🎉 Code graph for {project_name} updated in place ({stats}) ---")
+    return stats
@@ -1,74 +1,373 @@
 # --- scripts/build_index.py ---
 
 import chromadb
+import fnmatch
+import hashlib
+import json
+import os
+import queue
+import threading
 from pathlib import Path
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex, StorageContext
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from typing import Iterable, Iterator
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.schema import MetadataMode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
 from llama_index.core.node_parser import CodeSplitter
 from llama_index.core import Settings
 import logging
 
 import config
+from engine.embedding import EmbeddingStage
+from engine.embedding_cache import EmbeddingCache
+from engine.lexical_index import LexicalIndex, load_lexical_index, save_lexical_index
+from engine.models import embed_model_id, get_embed_model
 
-def build_vector_store(project_name: str, project_path: str):
+# Directory patterns that are never indexed (mirrors the old SimpleDirectoryReader excludes).
+EXCLUDE_PATTERNS = ["*.venv*", "*__pycache__*", "*node_modules*", "*.git*"]
+# Chroma rejects very large writes, so upserts, reads and deletes are paged.
+UPSERT_BATCH_SIZE = 1000
+
+def _iter_python_files(project_path: Path):
+    """Yields every indexable .py file under project_path, skipping excluded directories."""
+    for root, dirs, files in os.walk(project_path):
+        dirs[:] = [d for d in dirs if not any(fnmatch.fnmatch(d, p) for p in EXCLUDE_PATTERNS)]
+        for name in files:
+            if name.endswith(".py"):
+                yield Path(root) / name
+
+def _hash_file(file_path: Path) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def _prefetch(items: Iterable, depth: int) -> Iterator:
+    """
+    Runs an iterator on a background thread, at most `depth` items ahead of the
+    consumer. The bounded queue is the backpressure: a slow consumer stalls the
+    producer instead of letting results pile up in memory. Exceptions raised by
+    the producer are re-raised in the consumer; if the consumer stops early,
+    the producer is told to stop too.
+    """
+    buffer = queue.Queue(maxsize=max(1, depth))
+    finished = object()
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((finished, None))
+        except BaseException as e:
+            put((finished, e))
+
+    producer = threading.Thread(target=produce, name="index-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is finished:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+def _load_manifest(project_name: str) -> dict | None:
+    manifest_path = config.get_index_manifest_path(project_name)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def make_chunk_id(relative_path: str, start_line: int, end_line: int, content: str) -> str:
+    """
+    Deterministic chunk ID derived from the file path, the chunk's line span and
+    a hash of its content. Re-indexing identical code always yields the same IDs,
+    which makes writes idempotent.
+    """
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return hashlib.sha1(f"{relative_path}:{start_line}-{end_line}:{content_hash}".encode("utf-8")).hexdigest()
+
+def _assign_chunk_ids(nodes, documents, project_root: Path):
+    """
+    Replaces the random node IDs produced by the splitter with deterministic ones
+    and records each chunk's relative path and line span in its metadata.
+    Duplicate chunks (same path, span and content) are collapsed.
+    """
+    documents_by_id = {doc.doc_id: doc for doc in documents}
+    search_from = {}
+    unique_nodes = {}
+    for node in nodes:
+        document = documents_by_id[node.ref_doc_id]
+        content = node.get_content(metadata_mode=MetadataMode.NONE)
+        # Chunks overlap, so search forward from the previous chunk's start.
+        start_char = document.text.find(content, search_from.get(document.doc_id, 0))
+        if start_char < 0:
+            start_char = max(document.text.find(content), 0)
+        search_from[document.doc_id] = start_char + 1
+        start_line = document.text.count("\n", 0, start_char) + 1
+        end_line = start_line + content.count("\n")
+
+        relative_path = Path(document.metadata["file_path"]).resolve().relative_to(project_root.resolve()).as_posix()
+        node.metadata["relative_path"] = relative_path
+        node.metadata["start_line"] = start_line
+        node.metadata["end_line"] = end_line
+        for key in ("relative_path", "start_line", "end_line"):
+            if key not in node.excluded_embed_metadata_keys:
+                node.excluded_embed_metadata_keys.append(key)
+            if key not in node.excluded_llm_metadata_keys:
+                node.excluded_llm_metadata_keys.append(key)
+        node.id_ = make_chunk_id(relative_path, start_line, end_line, content)
+        unique_nodes[node.id_] = node
+    return list(unique_nodes.values())
+
+def _iter_chunk_batches(project_root: Path, relative_paths: list[str], splitter) -> Iterator[list]:
+    """
+    Reads and splits files INDEX_FILE_BATCH_SIZE at a time, yielding each
+    batch's chunks (with deterministic IDs) as soon as it is ready.
+    """
+    for i in range(0, len(relative_paths), config.INDEX_FILE_BATCH_SIZE):
+        batch = relative_paths[i:i + config.INDEX_FILE_BATCH_SIZE]
+        documents = SimpleDirectoryReader(input_files=[str(project_root / p) for p in batch]).load_data()
+        nodes = splitter.get_nodes_from_documents(documents)
+        yield _assign_chunk_ids(nodes, documents, project_root)
+
+def _upsert_nodes(chroma_collection, nodes, embedder: EmbeddingStage):
+    """
+    Embeds nodes and upserts them into the collection, in the same layout
+    ChromaVectorStore uses so the query path can read them back unchanged.
+    """
+    for i in range(0, len(nodes), UPSERT_BATCH_SIZE):
+        batch = nodes[i:i + UPSERT_BATCH_SIZE]
+        embeddings = embedder.embed([node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch])
+        chroma_collection.upsert(
+            ids=[node.node_id for node in batch],
+            embeddings=embeddings,
+            metadatas=[node_to_metadata_dict(node, remove_text=True, flat_metadata=True) for node in batch],
+            documents=[node.get_content(metadata_mode=MetadataMode.NONE) for node in batch],
+        )
+
+def _collection_ids(chroma_collection) -> set[str]:
+    ids = set()
+    offset = 0
+    while True:
+        page = chroma_collection.get(include=[], limit=UPSERT_BATCH_SIZE, offset=offset)["ids"]
+        ids.update(page)
+        if len(page) < UPSERT_BATCH_SIZE:
+            return ids
+        offset += len(page)
+
+def _live_chunk_ids(manifest: dict) -> set[str]:
+    return {cid for entry in manifest["files"].values() for cid in entry["chunk_ids"]}
+
+def _compact_collection(chroma_collection, manifest: dict) -> int:
+    """Deletes every chunk in the collection that the manifest does not reference."""
+    dead_ids = list(_collection_ids(chroma_collection) - _live_chunk_ids(manifest))
+    for i in range(0, len(dead_ids), UPSERT_BATCH_SIZE):
+        chroma_collection.delete(ids=dead_ids[i:i + UPSERT_BATCH_SIZE])
+    if dead_ids:
+        logging.info(f"--- 🧹 Compaction purged {len(dead_ids)} orphaned chunks. ---")
+    return len(dead_ids)
+
+def _open_collection(project_name: str):
+    vector_store_path = config.get_vector_store_path(project_name)
+    db = chromadb.PersistentClient(path=str(vector_store_path))
+    return db.get_collection(config.get_collection_name(project_name))
+
+def compact_vector_store(project_name: str) -> int:
+    """Purges orphaned chunks from a project's collection. Returns the number removed."""
+    manifest = _load_manifest(project_name) or {"version": 0, "files": {}}
+    return _compact_collection(_open_collection(project_name), manifest)
+
+def get_index_stats(project_name: str) -> dict:
+    """
+    Reports live (referenced by the manifest) and dead (orphaned) chunk counts
+    for a project's collection.
+    """
+    manifest = _load_manifest(project_name) or {"version": 0, "files": {}}
+    stored_ids = _collection_ids(_open_collection(project_name))
+    live_ids = _live_chunk_ids(manifest)
+    return {
+        "project_name": project_name,
+        "index_version": manifest["version"],
+        "files": len(manifest["files"]),
+        "total_chunks": len(stored_ids),
+        "live_chunks": len(stored_ids & live_ids),
+        "dead_chunks": len(stored_ids - live_ids),
+        "missing_chunks": len(live_ids - stored_ids),
+    }
+
+def _backfill_lexical_index(chroma_collection, lexical_index: LexicalIndex, chunk_ids: set[str]) -> int:
+    """
+    Adds live chunks the lexical index is missing (e.g. an index built before
+    it existed), reading their text back from the collection.
+    """
+    missing = [cid for cid in chunk_ids if cid not in lexical_index]
+    for i in range(0, len(missing), UPSERT_BATCH_SIZE):
+        page = chroma_collection.get(ids=missing[i:i + UPSERT_BATCH_SIZE], include=["documents"])
+        for chunk_id, document in zip(page["ids"], page["documents"]):
+            lexical_index.add(chunk_id, document or "")
+    if missing:
+        logging.info(f"--- 🔤 Added {len(missing)} existing chunks to the lexical index. ---")
+    return len(missing)
+
+def _save_manifest(project_name: str, manifest: dict):
+    manifest_path = config.get_index_manifest_path(project_name)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temp file first so a crashed job never leaves a half-written manifest behind.
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def build_vector_store(project_name: str, project_path: str, incremental: bool = True, progress=None) -> dict:
     """
     Analyzes a codebase in a given path, splits the code into chunks,
     generates embeddings, and stores them in a ChromaDB vector store.
+
+    In incremental mode, a per-project manifest of file hashes and chunk IDs is
+    used to re-embed only added or modified files and to delete the chunks of
+    files that were removed since the last run. Returns a summary of the changes.
+
+    `progress`, if given, is called after every file batch with the files done
+    so far and the embedding throughput.
     """
     logging.info(f"--- 🚀 Starting Index Building for project: {project_name} ---")
 
-    Settings.embed_model = HuggingFaceEmbedding(model_name=config.EMBEDDING_MODEL_NAME)
+    Settings.embed_model = get_embed_model()
     Settings.llm = None
 
-    # --- THE DEFINITIVE FIX ---
-    # 1. Manually check for the existence of .py files before calling LlamaIndex.
-    
-    # We use pathlib to recursively search for any file ending in .py
-    # The `next()` function with a default of `None` is a very efficient way
-    # to check if there's at least one match without iterating through everything.
-    
-    py_files = list(Path(project_path).rglob("*.py"))
-    
-    if not py_files:
+    project_root = Path(project_path)
+    current_hashes = {
+        file_path.relative_to(project_root).as_posix(): _hash_file(file_path)
+        for file_path in _iter_python_files(project_root)
+    }
+
+    manifest = _load_manifest(project_name) if incremental else None
+    if manifest is None:
+        logging.info("--- No usable index manifest found; indexing every file. ---")
+        manifest = {"version": 0, "files": {}}
+    previous_files = manifest["files"]
+    lexical_path = config.get_lexical_index_path(project_name)
+    lexical_index = load_lexical_index(lexical_path) if previous_files else LexicalIndex()
+
+    if not current_hashes and not previous_files:
         logging.warning(f"--- ⚠️ No .py files found in {project_path}. Skipping vector store creation. ---")
-        return # Exit gracefully
-
-    # 2. Only if files are found, proceed with the LlamaIndex reader.
-    reader = SimpleDirectoryReader(
-        input_dir=project_path,
-        required_exts=[".py"],
-        exclude=["*.venv*", "*__pycache__*", "*node_modules*", "*.git*"],
-        recursive=True
-    )
-    documents = reader.load_data()
-    logging.info(f"--- ✅ Loaded {len(documents)} documents. ---")
+        return {"added": 0, "modified": 0, "removed": 0, "unchanged": 0, "chunks_written": 0, "chunks_purged": 0}
 
-    # This check is now redundant but kept as a safeguard.
-    if not documents:
-        logging.warning(f"--- ⚠️ LlamaIndex reader found no documents unexpectedly. Skipping. ---")
-        return
+    added = [p for p in current_hashes if p not in previous_files]
+    modified = [p for p in current_hashes if p in previous_files and previous_files[p]["hash"] != current_hashes[p]]
+    removed = [p for p in previous_files if p not in current_hashes]
+    unchanged = len(current_hashes) - len(added) - len(modified)
+    logging.info(
+        f"--- 📋 Changes: {len(added)} added, {len(modified)} modified, "
+        f"{len(removed)} removed, {unchanged} unchanged ---"
+    )
 
     # Set up the persistent ChromaDB vector store
     vector_store_path = config.get_vector_store_path(project_name)
     collection_name = config.get_collection_name(project_name)
     logging.info(f"--- 💾 Setting up ChromaDB at {vector_store_path} with collection '{collection_name}' ---")
-    
+
     db = chromadb.PersistentClient(path=str(vector_store_path))
     chroma_collection = db.get_or_create_collection(collection_name)
-    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
 
-    # Configure the code splitter
-    python_splitter = CodeSplitter(
-        language="python", chunk_lines=40, chunk_lines_overlap=15, max_chars=1500
-    )
-    Settings.transformations = [python_splitter]
+    cache = EmbeddingCache(config.EMBEDDING_CACHE_PATH, config.EMBEDDING_CACHE_MAX_BYTES) if config.EMBEDDING_CACHE_ENABLED else None
+    embedder = EmbeddingStage(Settings.embed_model, cache=cache, model_name=embed_model_id())
+    to_embed = added + modified
+    new_chunk_ids = {p: [] for p in to_embed}
+    chunks_written = 0
+    oversized = [p for p in to_embed if (project_root / p).stat().st_size > config.INDEX_MAX_FILE_BYTES]
+    if oversized:
+        logging.warning(f"--- ⚠️ Skipping {len(oversized)} files larger than {config.INDEX_MAX_FILE_BYTES} bytes: {oversized[:5]} ---")
+    skipped = set(oversized)
+    to_read = [p for p in to_embed if p not in skipped]
+    if to_read:
+        # Configure the code splitter
+        python_splitter = CodeSplitter(
+            language="python", chunk_lines=40, chunk_lines_overlap=15, max_chars=1500
+        )
+        # Chunks whose deterministic ID was already stored for the same file are
+        # byte-identical, so only genuinely new chunks need to be embedded.
+        existing_ids = {cid for p in modified for cid in previous_files[p]["chunk_ids"]}
 
-    # Process documents and build the index
-    VectorStoreIndex.from_documents(
-        documents,
-        storage_context=storage_context,
-        show_progress=True
-    )
-    logging.info(f"--- 🎉 Index building complete for {project_name}! ---")
+        # Stream: walk -> read -> chunk runs on a background thread, at most a few
+        # batches ahead of embed -> write, so only those batches are held in memory.
+        files_done = 0
+        batches = _iter_chunk_batches(project_root, to_read, python_splitter)
+        try:
+            for nodes in _prefetch(batches, config.INDEX_PREFETCH_BATCHES):
+                for node in nodes:
+                    new_chunk_ids[node.metadata["relative_path"]].append(node.node_id)
+                    lexical_index.add(node.node_id, node.get_content(metadata_mode=MetadataMode.NONE))
+                fresh_nodes = [node for node in nodes if node.node_id not in existing_ids]
+                _upsert_nodes(chroma_collection, fresh_nodes, embedder)
+                chunks_written += len(fresh_nodes)
+                files_done = min(files_done + config.INDEX_FILE_BATCH_SIZE, len(to_read))
+                throughput = embedder.stats()
+                logging.info(
+                    f"--- 📦 Indexed {files_done}/{len(to_read)} files, {chunks_written} chunks written "
+                    f"({throughput['chunks_per_sec']} chunks/s, {throughput['tokens_per_sec']} tokens/s). ---"
+                )
+                if progress:
+                    progress({"files_done": files_done, "files_total": len(to_read), "chunks_written": chunks_written, **throughput})
+        finally:
+            embedder.close()
+
+    # Drop the stale chunks of every file that changed or disappeared.
+    live_ids = {cid for ids in new_chunk_ids.values() for cid in ids}
+    stale_ids = [
+        cid for p in modified + removed for cid in previous_files[p]["chunk_ids"]
+        if cid not in live_ids
+    ]
+    if stale_ids:
+        chroma_collection.delete(ids=stale_ids)
+        logging.info(f"--- 🗑️ Deleted {len(stale_ids)} stale chunks. ---")
+    for p in removed:
+        del previous_files[p]
+    for p in to_embed:
+        if p in skipped:
+            # Left out of the manifest so the next run checks it against the limit again.
+            previous_files.pop(p, None)
+        else:
+            previous_files[p] = {"hash": current_hashes[p], "chunk_ids": new_chunk_ids[p]}
+
+    # The lexical index is saved before the manifest so a new index version
+    # never pairs with a stale lexical index.
+    manifest_ids = _live_chunk_ids(manifest)
+    lexical_index.retain(manifest_ids)
+    _backfill_lexical_index(chroma_collection, lexical_index, manifest_ids)
+    save_lexical_index(lexical_index, lexical_path)
+
+    manifest["version"] += 1
+    _save_manifest(project_name, manifest)
+
+    # Purge anything the manifest does not account for (e.g. chunks left by an
+    # interrupted run or by an index built before manifests existed).
+    purged = _compact_collection(chroma_collection, manifest)
+
+    summary = {
+        "added": len(added),
+        "modified": len(modified),
+        "removed": len(removed),
+        "unchanged": unchanged,
+        "chunks_written": chunks_written,
+        "chunks_purged": purged,
+        **embedder.stats(),
+    }
+    if cache is not None:
+        summary["embedding_cache"] = cache.stats()
+    logging.info(f"--- 🎉 Index building complete for {project_name}! {summary} ---")
+    return summary
@@ -0,0 +1,68 @@
+# --- tests/engine/test_answer_cache.py ---
+
+import pytest
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from engine.answer_cache import AnswerCache, stream_pieces
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def cache(clock):
+    return AnswerCache(max_entries=8, ttl_seconds=60, min_similarity=0.95, clock=clock)
+
+
+def test_exact_match_ignores_case_and_whitespace(cache):
+    """Tests that a repeated question is served, with its sources, without computing its embedding."""
+    sources = [{"path": "README.md", "start_line": 1, "end_line": 12, "score": 0.91, "score_type": "rerank"}]
+    cache.store("proj", "v1", "What is this project about?", "A code assistant.", sources=sources)
+
+    def embed():
+        raise AssertionError("exact matches must not embed the query")
+
+    assert cache.lookup("proj", "v1", "  what is THIS project   about? ", embed=embed) == ("A code assistant.", sources)
+    assert cache.lookup("other", "v1", "What is this project about?") is None
+    assert cache.stats()["exact_hits"] == 1
+
+def test_semantic_match_requires_similarity_and_same_identifiers(cache):
+    """Tests that near-identical questions hit, unless they name different identifiers."""
+    cache.store("proj", "v1", "How does `build_index` work?", "It streams files.", embedding=[1.0, 0.0])
+
+    assert cache.lookup("proj", "v1", "How does `build_index` function?", embed=lambda: [0.99, 0.05]) == ("It streams files.", [])
+    assert cache.lookup("proj", "v1", "How does `build_graph` work?", embed=lambda: [1.0, 0.0]) is None
+    assert cache.lookup("proj", "v1", "What is the license?", embed=lambda: [0.0, 1.0]) is None
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"]) == (1, 2)
+
+def test_entries_expire_and_follow_the_index_version(cache, clock):
+    """Tests TTL expiry and that storing for a new index version drops older answers."""
+    cache.store("proj", "v1", "q1", "old answer", embedding=[1.0, 0.0])
+    clock.now = 61
+    assert cache.lookup("proj", "v1", "q1") is None
+    assert cache.stats()["expired"] == 1
+
+    cache.store("proj", "v1", "q2", "answer", embedding=[1.0, 0.0])
+    cache.store("proj", "v2", "q3", "new answer", embedding=[0.0, 1.0])
+    assert cache.lookup("proj", "v1", "q2") is None
+    assert cache.lookup("proj", "v2", "q3") == ("new answer", [])
+    assert cache.invalidate_project("proj") == 1
+
+def test_stream_pieces_round_trip():
+    """Tests that a cached answer is streamed in pieces that rebuild it exactly."""
+    answer = "word " * 40 + "end."
+    pieces = stream_pieces(answer, size=16)
+    assert len(pieces) > 1
+    assert "".join(pieces) == answer
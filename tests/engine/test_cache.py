@@ -0,0 +1,57 @@
+# --- tests/engine/test_cache.py ---
+
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from engine.cache import LRUCache
+
+
+def test_lru_evicts_least_recently_used_by_count():
+    """Tests that the oldest untouched entry is evicted when the count limit is hit."""
+    cache = LRUCache("test", max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # 'a' is now the most recently used
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_lru_evicts_by_memory_budget():
+    """Tests that entries are evicted until the approximate memory fits the budget."""
+    evicted = []
+    cache = LRUCache("test", max_entries=10, max_bytes=100, on_evict=lambda k, v: evicted.append(k))
+    cache.put("a", "A", size_bytes=60)
+    cache.put("b", "B", size_bytes=30)
+    cache.put("c", "C", size_bytes=50)
+
+    assert evicted == ["a"]
+    assert cache.stats()["approx_bytes"] == 80
+
+def test_lru_keeps_single_oversized_entry():
+    """Tests that an entry larger than the whole budget is still cached on its own."""
+    cache = LRUCache("test", max_entries=10, max_bytes=10)
+    cache.put("big", "value", size_bytes=50)
+    assert cache.get("big") == "value"
+
+def test_lru_invalidation_and_counters():
+    """Tests explicit invalidation and hit/miss accounting."""
+    cache = LRUCache("test", max_entries=10)
+    cache.put(("proj", 1), "x")
+    cache.put(("proj", 2), "y")
+    cache.put(("other", 1), "z")
+
+    assert cache.get("missing") is None
+    assert cache.invalidate_where(lambda key: key[0] == "proj") == 2
+    assert cache.invalidate(("other", 1)) is True
+    assert cache.invalidate(("other", 1)) is False
+
+    stats = cache.stats()
+    assert stats["entries"] == 0
+    assert stats["misses"] == 1
+    assert stats["invalidations"] == 3
@@ -0,0 +1,62 @@
+# --- tests/engine/test_embedding.py ---
+
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from engine.embedding import EmbeddingStage
+
+class FakeEmbedModel:
+    """Embeds a text as [len(text)] and records the batches it was called with."""
+
+    def __init__(self):
+        self.embed_batch_size = 10
+        self.calls = []
+
+    def get_text_embedding_batch(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+TEXTS = ["x" * n for n in (5, 1, 4, 2, 3)]
+
+
+def test_length_sorted_batches_keep_input_order():
+    """Tests that batching by length still returns vectors in the caller's order."""
+    model = FakeEmbedModel()
+    stage = EmbeddingStage(model, batch_size=2, workers=1, threads=1, sort_by_length=True)
+
+    assert stage.embed(TEXTS) == [[5.0], [1.0], [4.0], [2.0], [3.0]]
+    assert model.calls == [["x", "xx"], ["xxx", "xxxx"], ["xxxxx"]]
+    assert model.embed_batch_size == 2
+    stage.close()
+
+def test_close_restores_the_shared_model_settings():
+    """Tests that close() gives the shared model back its own sub-batch size."""
+    model = FakeEmbedModel()
+    stage = EmbeddingStage(model, batch_size=2, workers=1, threads=1)
+    assert model.embed_batch_size == 2
+    stage.close()
+    assert model.embed_batch_size == 10
+
+def test_concurrent_workers_match_serial_results():
+    """Tests that spreading batches over worker threads does not change the output."""
+    serial = EmbeddingStage(FakeEmbedModel(), batch_size=2, workers=1, threads=1, sort_by_length=False)
+    parallel = EmbeddingStage(FakeEmbedModel(), batch_size=2, workers=3, threads=1, sort_by_length=False)
+    try:
+        assert parallel.embed(TEXTS) == serial.embed(TEXTS)
+    finally:
+        parallel.close()
+
+def test_stats_report_throughput():
+    """Tests that chunk and token counts accumulate across calls."""
+    stage = EmbeddingStage(FakeEmbedModel(), batch_size=4, workers=1, threads=1)
+    stage.embed(["def f(): pass", "x = 1"])
+    stage.embed(["y"])
+
+    stats = stage.stats()
+    assert stats["chunks_embedded"] == 3
+    # No tokenizer on the fake model, so words and punctuation are counted.
+    assert stats["tokens_embedded"] == 6 + 3 + 1
+    assert stats["chunks_per_sec"] > 0
@@ -0,0 +1,67 @@
+# --- tests/engine/test_embedding_cache.py ---
+
+import pytest
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from engine.embedding import EmbeddingStage
+from engine.embedding_cache import EmbeddingCache, round_vector, text_hash
+
+class CountingEmbedModel:
+    """Embeds a text as a small vector derived from it and counts the texts it embedded."""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def get_text_embedding_batch(self, texts):
+        self.embedded += len(texts)
+        return [[len(text) / 10, 0.333333, -1.0] for text in texts]
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(tmp_path / "embeddings.sqlite")
+
+
+def test_cache_round_trips_float16_vectors(cache):
+    """Tests that vectors come back at float16 precision and are keyed by model and text."""
+    cache.put_many("model-a", ["def f(): pass"], [[0.1, 0.333333, -1.0]])
+
+    assert cache.get_many("model-a", ["def f(): pass", "x = 1"]) == [round_vector([0.1, 0.333333, -1.0]), None]
+    assert cache.get_many("model-b", ["def f(): pass"]) == [None]
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 2)
+
+def test_stage_only_embeds_cache_misses(cache):
+    """Tests that a second pass over the same texts never reaches the model."""
+    model = CountingEmbedModel()
+    stage = EmbeddingStage(model, batch_size=2, workers=1, threads=1, cache=cache, model_name="m")
+    texts = ["a = 1", "b = 2", "a = 1"]
+
+    first = stage.embed(texts)
+    assert model.embedded == 3
+    second = stage.embed(texts + ["c = 3"])
+    assert model.embedded == 4
+    assert second[:3] == first
+    assert stage.stats()["cache_hits"] == 3
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    """Tests that the cache evicts the oldest entries once it outgrows its size bound."""
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite")
+    texts = [f"chunk {i}" for i in range(2000)]
+    cache.put_many("m", texts, [[float(i)] * 64 for i in range(2000)])
+    # Pretend the chunks were last used in insertion order.
+    with cache._connection() as conn:
+        conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE text_hash = ?",
+            [(i, text_hash(text)) for i, text in enumerate(texts)],
+        )
+    cache.max_bytes = cache.used_bytes() // 2
+
+    removed = cache.evict()
+    assert removed > 0
+    assert cache.used_bytes() <= cache.max_bytes
+    assert cache.get_many("m", [texts[0]])[0] is None
+    assert cache.get_many("m", [texts[-1]])[0] is not None
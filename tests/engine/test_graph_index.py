@@ -0,0 +1,135 @@
+# --- tests/engine/test_graph_index.py ---
+
+import pytest
+import json
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import config
+from engine import graph_index
+from engine.graph_index import CodeGraphIndex, traverse, get_graph_index, graph_cache_stats, invalidate_graph
+
+# main -> handler -> service -> repo.save, plus a low-confidence shortcut main -> repo.save
+# and a second definition named 'save' that nothing calls.
+SAMPLE_GRAPH = {
+    "nodes": [
+        {"id": "app.py::main", "name": "main"},
+        {"id": "api.py::handler", "name": "handler"},
+        {"id": "service.py::service", "name": "service"},
+        {"id": "repo.py::Repo::save", "name": "save"},
+        {"id": "cache.py::Cache::save", "name": "save"},
+        {"id": "cli.py::cli", "name": "cli"},
+    ],
+    "edges": [
+        {"source": "app.py::main", "target": "api.py::handler", "confidence": 1.0},
+        {"source": "api.py::handler", "target": "service.py::service", "confidence": 0.9},
+        {"source": "service.py::service", "target": "repo.py::Repo::save", "confidence": 1.0},
+        {"source": "app.py::main", "target": "repo.py::Repo::save", "confidence": 0.2},
+        {"source": "cli.py::cli", "target": "service.py::service", "confidence": 1.0},
+        {"source": "service.py::service", "target": "json.dumps", "confidence": 1.0},
+    ]
+}
+
+@pytest.fixture
+def graph():
+    return CodeGraphIndex.from_dict(SAMPLE_GRAPH)
+
+@pytest.fixture
+def traversal_limits():
+    mp = pytest.MonkeyPatch()
+    mp.setattr(config, "GRAPH_TRAVERSAL_MAX_DEPTH", 6)
+    mp.setattr(config, "GRAPH_TRAVERSAL_MAX_NODES", 500)
+    mp.setattr(config, "GRAPH_TRAVERSAL_TIMEOUT_MS", 1000)
+    yield
+    mp.undo()
+
+
+def test_expand_respects_depth_and_confidence(graph):
+    """Tests that k-hop expansion stops at max_depth and ignores edges below min_confidence."""
+    result = graph.expand(["repo.py::Repo::save"], "callers", max_depth=2, min_confidence=0.8)
+
+    assert result["depths"] == {
+        "repo.py::Repo::save": 0,
+        "service.py::service": 1,
+        "api.py::handler": 2,
+        "cli.py::cli": 2,
+    }
+    assert result["truncated"] == "max_depth"
+
+def test_impact_set_is_reverse_reachable_set(graph):
+    """Tests that the impact set contains every transitive caller and reports no truncation."""
+    result = graph.impact_set(["repo.py::Repo::save"], max_depth=10, min_confidence=0.8)
+
+    assert set(result["depths"]) - {"repo.py::Repo::save"} == {
+        "service.py::service", "api.py::handler", "cli.py::cli", "app.py::main"
+    }
+    assert result["depths"]["app.py::main"] == 3
+    assert result["truncated"] is None
+
+def test_expand_stops_at_node_budget(graph):
+    """Tests that expansion terminates early once the node budget is exhausted."""
+    result = graph.expand(["repo.py::Repo::save"], "callers", max_depth=10, min_confidence=0.8, max_nodes=3)
+    assert len(result["depths"]) == 3
+    assert result["truncated"] == "max_nodes"
+
+def test_shortest_path_uses_confidence_threshold(graph):
+    """Tests that the low-confidence shortcut is only taken when the threshold allows it."""
+    strict = graph.shortest_path(["app.py::main"], ["repo.py::Repo::save"], max_depth=6, min_confidence=0.8)
+    assert strict["path"] == ["app.py::main", "api.py::handler", "service.py::service", "repo.py::Repo::save"]
+
+    loose = graph.shortest_path(["app.py::main"], ["repo.py::Repo::save"], max_depth=6, min_confidence=0.1)
+    assert loose["path"] == ["app.py::main", "repo.py::Repo::save"]
+
+    unreachable = graph.shortest_path(["repo.py::Repo::save"], ["app.py::main"], max_depth=6)
+    assert unreachable["path"] is None
+
+def test_traverse_resolves_names_and_describes_nodes(graph, traversal_limits):
+    """Tests the name-based entry point used by the agent tool and the HTTP endpoint."""
+    result = traverse(graph, "callees", "service", depth=1)
+    assert result["matched"] == ["service.py::service"]
+    assert {"id": "json.dumps", "external": True, "depth": 1} in result["nodes"]
+
+    impact = traverse(graph, "impact", "save", depth=1)
+    assert impact["matched"] == ["repo.py::Repo::save", "cache.py::Cache::save"]
+    assert [node["id"] for node in impact["nodes"]] == ["service.py::service"]
+
+    path = traverse(graph, "path", "cli", target="save")
+    assert [node["id"] for node in path["path"]] == ["cli.py::cli", "service.py::service", "repo.py::Repo::save"]
+
+    with pytest.raises(ValueError):
+        traverse(graph, "path", "cli")
+    with pytest.raises(ValueError):
+        traverse(graph, "siblings", "cli")
+
+def test_traverse_honours_zero_depth_and_rejects_negative(graph, traversal_limits):
+    """Tests that depth=0 means no hops rather than the maximum depth."""
+    result = traverse(graph, "callees", "main", depth=0)
+    assert result["matched"] == ["app.py::main"]
+    assert result["nodes"] == []
+    with pytest.raises(ValueError):
+        traverse(graph, "callees", "main", depth=-1)
+
+def test_graph_cache_shares_and_reloads_graphs(tmp_path):
+    """Tests that a graph is loaded once per version and reloaded after the file is rewritten."""
+    path = tmp_path / "cached_graph.json"
+    path.write_text(json.dumps(SAMPLE_GRAPH))
+    before = graph_cache_stats()
+
+    first = get_graph_index(path)
+    assert get_graph_index(path) is first
+    stats = graph_cache_stats()
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["hits"] - before["hits"] == 1
+    assert stats["approx_bytes"] > before["approx_bytes"]
+
+    path.write_text(json.dumps({"nodes": SAMPLE_GRAPH["nodes"][:1], "edges": []}))
+    reloaded = get_graph_index(path)
+    assert reloaded is not first and len(reloaded) == 1
+    assert graph_cache_stats()["reloads"] - before["reloads"] == 1
+
+    assert invalidate_graph(path)
+    assert str(path) not in graph_index._graph_locks
+    assert get_graph_index(path) is not reloaded
@@ -0,0 +1,149 @@
+# --- tests/engine/test_graph_sqlite.py ---
+
+import pytest
+import sqlite3
+import threading
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from engine.graph_index import CodeGraphIndex, get_graph_index, graph_file_version, invalidate_graph, load_graph_index, traverse
+from engine.graph_sqlite import SqliteCodeGraph, write_sqlite_graph
+
+SAMPLE_GRAPH = {
+    "nodes": [
+        {"id": "app.py::main", "type": "function", "name": "main", "file": "app.py"},
+        {"id": "repo.py::Repo::save", "type": "method", "name": "save", "file": "repo.py"},
+        {"id": "cache.py::Cache::save", "type": "method", "name": "save", "file": "cache.py"},
+        {"id": "service.py::run", "type": "function", "name": "run", "file": "service.py"},
+    ],
+    "edges": [
+        {"source": "app.py::main", "target": "service.py::run", "type": "CALLS", "confidence": 1.0},
+        {"source": "service.py::run", "target": "repo.py::Repo::save", "type": "CALLS", "confidence": 0.9},
+        {"source": "service.py::run", "target": "cache.py::Cache::save", "type": "CALLS", "confidence": 0.2},
+        {"source": "service.py", "target": "logging.getLogger", "type": "CALLS", "confidence": 0.8},
+    ]
+}
+
+@pytest.fixture
+def graph_path(tmp_path):
+    path = tmp_path / "sample_graph.sqlite"
+    write_sqlite_graph(SAMPLE_GRAPH, path)
+    return path
+
+
+def test_sqlite_queries_match_json_index(graph_path):
+    """Tests that lookups and traversals return the same results as the in-memory index."""
+    store = load_graph_index(graph_path)
+    index = CodeGraphIndex.from_dict(SAMPLE_GRAPH)
+    assert isinstance(store, SqliteCodeGraph)
+    assert (len(store), store.edge_count) == (len(index), index.edge_count)
+
+    for entity in ("save", "main", "service.py::run", "missing"):
+        assert store.find(entity) == index.find(entity)
+    for node_id in index.nodes_by_id:
+        assert store.node(node_id) == index.node(node_id)
+        for relationship in ("callers", "callees"):
+            assert store.neighbors(node_id, relationship, 0.5) == index.neighbors(node_id, relationship, 0.5)
+    assert store.to_dict()["nodes"] == SAMPLE_GRAPH["nodes"]
+
+    mp = pytest.MonkeyPatch()
+    mp.setattr("config.GRAPH_TRAVERSAL_TIMEOUT_MS", 1000)
+    assert traverse(store, "path", "main", target="save")["path"] == traverse(index, "path", "main", target="save")["path"]
+    mp.undo()
+
+def test_file_scoped_queries(graph_path):
+    """Tests that definitions and calls can be listed per file; module-level calls belong to their file."""
+    store = SqliteCodeGraph(graph_path)
+    assert [n["id"] for n in store.file_nodes("service.py")] == ["service.py::run"]
+    assert {e["target"] for e in store.file_edges("service.py")} == {
+        "repo.py::Repo::save", "cache.py::Cache::save", "logging.getLogger"
+    }
+    assert store.files() == ["app.py", "cache.py", "repo.py", "service.py"]
+
+def test_replace_file_is_transactional(graph_path):
+    """Tests per-file replacement, file removal, and that a failed update leaves the graph unchanged."""
+    writer = SqliteCodeGraph(graph_path, readonly=False)
+    writer.replace_file(
+        "service.py",
+        [{"id": "service.py::run_v2", "type": "function", "name": "run_v2", "file": "service.py"}],
+        [{"source": "service.py::run_v2", "target": "repo.py::Repo::save", "confidence": 1.0}],
+    )
+    writer.replace_file("cache.py", [], [])
+
+    reader = SqliteCodeGraph(graph_path)
+    assert reader.find("run") == []
+    assert reader.callers("repo.py::Repo::save") == [("service.py::run_v2", 1.0)]
+    assert reader.find("save") == ["repo.py::Repo::save"]
+
+    before = reader.to_dict()
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.replace_files({
+            "app.py": ([], []),
+            "repo.py": ([], [{"source": "repo.py::Repo::save", "target": None, "confidence": 1.0}]),
+        })
+    assert reader.to_dict() == before
+
+def test_readers_in_other_threads_see_committed_graph(graph_path):
+    """Tests that each thread reads through its own connection while a writer updates the graph."""
+    reader = SqliteCodeGraph(graph_path)
+    writer = SqliteCodeGraph(graph_path, readonly=False)
+    writer.replace_file("app.py", [], [])
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(reader.find("main")))
+    thread.start()
+    thread.join()
+    assert results == [[]]
+    with pytest.raises(sqlite3.OperationalError):
+        reader._connection().execute("DELETE FROM nodes")
+
+def test_failed_rebuild_keeps_graph_and_indexes(graph_path):
+    """Tests that a full rebuild, index drops included, rolls back as one transaction."""
+    writer = SqliteCodeGraph(graph_path, readonly=False)
+    writer.apply_summaries([{"file": "a.py", "nodes": [], "edges": [], "unresolved": []}])
+    before = writer.to_dict()
+    indexes = lambda: {row[0] for row in writer._connection().execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    expected_indexes = indexes()
+
+    def failing_resolve(name, name_index):
+        raise RuntimeError("crash mid-rebuild")
+
+    summary = {"file": "b.py", "nodes": [("b.py::f", "function", "f")], "edges": [], "unresolved": [("b.py::f", "save")]}
+    with pytest.raises(RuntimeError):
+        writer.apply_summaries([summary], resolve=failing_resolve, clear=True)
+    assert writer.to_dict() == before
+    assert indexes() == expected_indexes
+    writer.close()
+
+def test_version_changes_on_writes_only(graph_path):
+    """Tests that reader-created WAL files do not change the graph version, but commits do."""
+    version = graph_file_version(graph_path)
+    with SqliteCodeGraph(graph_path) as reader:
+        assert reader.find("main") == ["app.py::main"]
+        assert graph_file_version(graph_path) == version
+
+    with SqliteCodeGraph(graph_path, readonly=False) as writer:
+        writer.replace_file("app.py", [], [])
+    assert graph_file_version(graph_path) != version
+
+def test_close_releases_every_thread_connection(graph_path):
+    """Tests that close() closes connections opened by other threads, and evicted graphs are closed."""
+    graph = get_graph_index(graph_path)
+    thread = threading.Thread(target=lambda: graph.find("main"))
+    thread.start()
+    thread.join()
+    graph.find("main")
+    connections = list(graph._connections)
+    assert len(connections) == 2
+
+    assert invalidate_graph(graph_path)
+    assert graph._connections == []
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    # A closed graph reopens on next use.
+    assert graph.find("main") == ["app.py::main"]
+    graph.close()
@@ -0,0 +1,80 @@
+# --- tests/engine/test_graph_storage.py ---
+
+import pytest
+import json
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from engine.graph_index import CodeGraphIndex, load_graph_index
+from engine.graph_storage import CsrCodeGraph, GraphFormatError, export_json, load_csr_graph, write_csr_graph
+
+SAMPLE_GRAPH = {
+    "nodes": [
+        {"id": "app.py::main", "type": "function", "name": "main", "file": "app.py"},
+        {"id": "repo.py::Repo", "type": "class", "name": "Repo", "file": "repo.py"},
+        {"id": "repo.py::Repo::save", "type": "method", "name": "save", "file": "repo.py"},
+        {"id": "cache.py::Cache::save", "type": "method", "name": "save", "file": "cache.py"},
+        {"id": "ünïcode.py::grüße", "type": "function", "name": "grüße", "file": "ünïcode.py"},
+    ],
+    "edges": [
+        {"source": "app.py::main", "target": "repo.py::Repo::save", "type": "CALLS", "confidence": 0.9},
+        {"source": "app.py::main", "target": "cache.py::Cache::save", "type": "CALLS", "confidence": 0.2},
+        {"source": "app.py::main", "target": "json.dumps", "type": "CALLS", "confidence": 1.0},
+        {"source": "ünïcode.py::grüße", "target": "app.py::main", "type": "CALLS", "confidence": 0.1333},
+    ]
+}
+
+@pytest.fixture
+def csr_graph(tmp_path):
+    path = tmp_path / "sample_graph.csr"
+    write_csr_graph(SAMPLE_GRAPH, path)
+    return load_csr_graph(path)
+
+
+def test_csr_lookups_match_json_index(csr_graph):
+    """Tests that name/ID lookups and node records match the in-memory JSON index."""
+    index = CodeGraphIndex.from_dict(SAMPLE_GRAPH)
+    assert isinstance(csr_graph, CsrCodeGraph)
+    assert len(csr_graph) == len(index) == 5
+    assert csr_graph.edge_count == index.edge_count == 4
+
+    for entity in ("save", "main", "Repo", "grüße", "repo.py::Repo::save", "missing"):
+        assert [csr_graph.node_id(v) for v in csr_graph.find(entity)] == index.find(entity)
+    for node in SAMPLE_GRAPH["nodes"]:
+        assert csr_graph.node(csr_graph.find(node["id"])[0]) == node
+
+def test_csr_neighbors_keep_confidence_order_and_threshold(csr_graph):
+    """Tests that float16 confidences still pass thresholds equal to their stored value."""
+    main = csr_graph.find("main")[0]
+    callees = [(csr_graph.node_id(v), conf) for v, conf in csr_graph.callees(main)]
+    assert callees == [("json.dumps", 1.0), ("repo.py::Repo::save", 0.9), ("cache.py::Cache::save", 0.2)]
+    assert [csr_graph.node_id(v) for v, _ in csr_graph.callees(main, min_confidence=0.9)] == ["json.dumps", "repo.py::Repo::save"]
+    # Library endpoints are vertices without a node record.
+    assert csr_graph.node(csr_graph.callees(main)[0][0]) is None
+
+def test_csr_export_round_trips_to_json(csr_graph, tmp_path):
+    """Tests that the JSON export contains the same nodes and edges (confidences to 3 decimals)."""
+    json_path = tmp_path / "export.json"
+    csr_path = tmp_path / "sample_graph.csr"
+    export_json(csr_path, json_path)
+    exported = json.loads(json_path.read_text(encoding="utf-8"))
+
+    assert exported["nodes"] == SAMPLE_GRAPH["nodes"]
+    expected = {(e["source"], e["target"], round(e["confidence"], 3)) for e in SAMPLE_GRAPH["edges"]}
+    assert {(e["source"], e["target"], e["confidence"]) for e in exported["edges"]} == expected
+
+def test_load_graph_index_handles_csr_and_bad_files(tmp_path):
+    """Tests format dispatch by suffix and that corrupt or empty graphs load as empty."""
+    path = tmp_path / "empty_graph.csr"
+    write_csr_graph({"nodes": [], "edges": []}, path)
+    assert len(load_graph_index(path)) == 0
+
+    bad = tmp_path / "bad_graph.csr"
+    bad.write_bytes(b"not a graph at all")
+    with pytest.raises(GraphFormatError):
+        load_csr_graph(bad)
+    assert len(load_graph_index(bad)) == 0
+    assert len(load_graph_index(tmp_path / "missing_graph.csr")) == 0
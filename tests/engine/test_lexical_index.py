@@ -0,0 +1,81 @@
+# --- tests/engine/test_lexical_index.py ---
+
+import pytest
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from engine.lexical_index import (
+    LexicalIndex, load_lexical_index, save_lexical_index,
+    query_identifiers, reciprocal_rank_fusion, tokenize,
+)
+
+CHUNKS = {
+    "config": "def get_collection_name(project_name):\n    return f\"{project_name}_collection\"",
+    "rag": "collection = client.get_collection(config.get_collection_name(project_name))",
+    "graph": "def build_code_graph(project_name, project_path):\n    summaries = parse_files(project_path)",
+    "cache": "class LRUCache:\n    def get(self, key):\n        return self._entries.get(key)",
+}
+
+@pytest.fixture
+def index():
+    lexical = LexicalIndex()
+    for chunk_id, text in CHUNKS.items():
+        lexical.add(chunk_id, text)
+    return lexical
+
+
+def test_tokenize_splits_identifiers():
+    """Tests that identifiers are indexed whole and by their snake_case/camelCase parts."""
+    assert tokenize("LRUCache.get_entry") == ["lrucache", "lru", "cache", "get_entry", "get", "entry"]
+
+def test_query_identifiers():
+    """Tests which words of a question are treated as identifiers."""
+    assert query_identifiers("where is `get_collection_name` used") == ["get_collection_name"]
+    assert query_identifiers("what does config.get_code_graph_path() return for LRUCache") == ["get_code_graph_path", "LRUCache"]
+    assert query_identifiers("what is this project about?") == []
+
+def test_query_identifiers_ignore_prose_with_parentheses(index):
+    """Tests that prose before a parenthesis is not taken for an identifier, but backticked words are."""
+    assert query_identifiers("How does indexing work (incremental mode)?") == []
+    assert query_identifiers("Does it run on iOS or macOS (and URLs)?") == []
+    assert query_identifiers("what does save() return?") == []
+    assert query_identifiers("what does `repo.save` return?") == ["save"]
+    assert query_identifiers("where is `save` defined?") == ["save"]
+    assert index.identifier_matches("How does the collection work (name lookup)?") is None
+
+def test_search_ranks_by_bm25(index):
+    """Tests that word-level queries find chunks through identifier parts."""
+    results = index.search("how is the code graph built from a project path", top_k=2)
+    assert results[0][0] == "graph"
+
+def test_identifier_matches_short_circuit(index):
+    """Tests that only queries whose identifiers all occur verbatim short-circuit."""
+    matches = index.identifier_matches("where is `get_collection_name` used?")
+    assert {chunk_id for chunk_id, _ in matches} == {"config", "rag"}
+    assert index.identifier_matches("where is `get_table_name` used?") is None
+    assert index.identifier_matches("how are collections named?") is None
+
+def test_misspelled_identifiers_use_trigrams(index):
+    """Tests that an unknown identifier is expanded to similar vocabulary terms."""
+    assert "get_collection_name" in index.similar_terms("get_colection_name")
+    assert index.search("where is get_colection_name defined")[0][0] in {"config", "rag"}
+
+def test_incremental_updates_and_round_trip(index, tmp_path):
+    """Tests that removed chunks disappear from results and the index survives a save/load."""
+    index.remove("rag")
+    assert index.retain({"config", "graph"}) == 1
+    path = tmp_path / "lexical_index.json"
+    save_lexical_index(index, path)
+
+    loaded = load_lexical_index(path)
+    assert loaded.chunk_ids() == {"config", "graph"}
+    assert loaded.search("collection name") == index.search("collection name")
+    assert len(load_lexical_index(tmp_path / "missing.json")) == 0
+
+def test_reciprocal_rank_fusion():
+    """Tests that items ranked well in both lists beat items ranked first in only one."""
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "a"]], k=60)
+    assert [item for item, _ in fused][:2] == ["b", "a"]
@@ -0,0 +1,60 @@
+# --- tests/engine/test_onnx_models.py ---
+
+import pytest
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+# Parity checks need the real models and both runtimes; skip where they are unavailable.
+pytest.importorskip("onnxruntime")
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+np = pytest.importorskip("numpy")
+
+import config
+from engine.models import get_embed_model, get_reranker_model
+
+CHUNKS = [
+    "def get_collection_name(project_name):\n    return f\"{project_name}_collection\"",
+    "class LRUCache:\n    def get(self, key):\n        return self._entries.get(key)",
+    "def build_code_graph(project_name, project_path):\n    summaries = parse_files(project_path)",
+    "app = Flask(__name__)\nCORS(app)",
+    "def hash_password(password):\n    return bcrypt.hashpw(password, bcrypt.gensalt())",
+]
+QUERY = "How is the vector store collection name derived from the project?"
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory):
+    mp = pytest.MonkeyPatch()
+    mp.setattr(config, "ONNX_MODEL_PATH", tmp_path_factory.mktemp("onnx_models"))
+    yield
+    mp.undo()
+
+def _load(loader, **kwargs):
+    try:
+        return loader(**kwargs)
+    except OSError as e:
+        pytest.skip(f"Model weights unavailable: {e}")
+
+
+def test_onnx_embeddings_match_torch(onnx_dir):
+    """Tests that int8 ONNX embeddings stay within cosine 0.98 of the PyTorch ones."""
+    torch_vectors = np.array(_load(get_embed_model, backend="torch").get_text_embedding_batch(CHUNKS))
+    onnx_vectors = np.array(_load(get_embed_model, backend="onnx").get_text_embedding_batch(CHUNKS))
+
+    cosines = (torch_vectors * onnx_vectors).sum(axis=1) / (
+        np.linalg.norm(torch_vectors, axis=1) * np.linalg.norm(onnx_vectors, axis=1)
+    )
+    assert cosines.min() > 0.98
+
+def test_onnx_reranker_preserves_ranking(onnx_dir):
+    """Tests that the ONNX reranker picks the same top candidates as the PyTorch one."""
+    pairs = [(QUERY, chunk) for chunk in CHUNKS]
+    torch_scores = _load(get_reranker_model, backend="torch").predict(pairs)
+    onnx_scores = _load(get_reranker_model, backend="onnx").predict(pairs)
+
+    assert np.argmax(onnx_scores) == np.argmax(torch_scores)
+    assert set(np.argsort(onnx_scores)[-3:]) == set(np.argsort(torch_scores)[-3:])
+    assert np.abs(np.array(onnx_scores) - np.array(torch_scores)).max() < 0.1
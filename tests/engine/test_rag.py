@@ -0,0 +1,168 @@
+# --- tests/engine/test_rag.py ---
+
+import pytest
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from llama_index.core import QueryBundle
+from llama_index.core.schema import NodeWithScore, TextNode
+
+import engine.rag as rag
+
+class FakeCrossEncoder:
+    """Scores a pair by the length of the chunk and records every pair it scored."""
+
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs):
+        self.pairs.extend(pairs)
+        return [float(len(text)) for _, text in pairs]
+
+class FakeEmbedModel:
+    def __init__(self):
+        self.calls = 0
+
+    def get_query_embedding(self, query):
+        self.calls += 1
+        return [0.5, float(len(query))]
+
+@pytest.fixture
+def fake_models():
+    mp = pytest.MonkeyPatch()
+    cross_encoder = FakeCrossEncoder()
+    embed_model = FakeEmbedModel()
+    mp.setattr(rag, "get_reranker_model", lambda model_name=None: cross_encoder)
+    mp.setattr(rag, "get_embed_model", lambda: embed_model)
+    rag._query_embeddings.clear()
+    rag._rerank_scores.clear()
+    yield cross_encoder, embed_model
+    mp.undo()
+
+def _nodes(*texts):
+    return [NodeWithScore(node=TextNode(text=text), score=0.0) for text in texts]
+
+
+def test_query_embeddings_are_cached_by_normalized_text(fake_models):
+    """Tests that queries differing only in whitespace share one embedding."""
+    _, embed_model = fake_models
+    first = rag.get_query_embedding("how  does indexing work?")
+    second = rag.get_query_embedding(" how does indexing work? ")
+
+    assert first == second
+    assert embed_model.calls == 1
+    assert rag.retrieval_cache_stats()["query_embeddings"]["hits"] == 1
+
+def test_rerank_scores_are_reused_within_an_index_version(fake_models):
+    """Tests that only unseen (query, chunk) pairs reach the cross-encoder."""
+    cross_encoder, _ = fake_models
+    reranker = rag.LocalRerank(top_n=2, cache_namespace=("proj", "v1"))
+    query = QueryBundle("what is cached?")
+
+    top = reranker.postprocess_nodes(_nodes("a", "bbb", "cc"), query)
+    assert [node.get_content() for node in top] == ["bbb", "cc"]
+    reranker.postprocess_nodes(_nodes("a", "bbb", "dddd"), query)
+    assert [text for _, text in cross_encoder.pairs] == ["a", "bbb", "cc", "dddd"]
+
+    # A new index version starts from scratch.
+    rag.LocalRerank(cache_namespace=("proj", "v2")).postprocess_nodes(_nodes("a"), query)
+    assert len(cross_encoder.pairs) == 5
+
+def test_invalidating_a_project_drops_its_rerank_scores(fake_models):
+    """Tests that re-indexing (or deleting) a project clears its cached scores."""
+    rag.LocalRerank(cache_namespace=("proj", "v1")).postprocess_nodes(_nodes("a", "b"), QueryBundle("q"))
+    rag.LocalRerank(cache_namespace=("other", "v1")).postprocess_nodes(_nodes("a"), QueryBundle("q"))
+
+    rag.invalidate_query_engine("proj")
+    assert rag.retrieval_cache_stats()["rerank_scores"]["entries"] == 1
+
+def _scored_nodes(*pairs):
+    """Dense retrieval results: the retrieval score is the vector similarity."""
+    return [
+        NodeWithScore(node=TextNode(text=text, metadata={rag.VECTOR_SCORE_KEY: score}), score=score)
+        for text, score in pairs
+    ]
+
+def _fused_nodes(*triples):
+    """Hybrid retrieval results: RRF scores, with the vector similarity where the vector search found the chunk."""
+    nodes = []
+    for rank, (text, vector_score) in enumerate(triples, start=1):
+        metadata = {} if vector_score is None else {rag.VECTOR_SCORE_KEY: vector_score}
+        nodes.append(NodeWithScore(node=TextNode(text=text, metadata=metadata), score=1.0 / (60 + rank)))
+    return nodes
+
+ADAPTIVE = {"mode": "adaptive", "skip_margin": 0.25, "batch_size": 2, "patience": 1}
+
+def test_adaptive_rerank_skips_when_retrieval_margin_is_large(fake_models):
+    """Tests that a clear gap after the top-n retrieval scores skips the cross-encoder."""
+    cross_encoder, _ = fake_models
+    reranker = rag.LocalRerank(top_n=2, settings=ADAPTIVE)
+    nodes = _scored_nodes(("a", 0.9), ("bb", 0.8), ("ccc", 0.3), ("dddd", 0.2))
+
+    top = reranker.postprocess_nodes(nodes, QueryBundle("q"))
+    assert [node.get_content() for node in top] == ["a", "bb"]
+    assert [source["score_type"] for source in rag.node_sources(top)] == ["vector", "vector"]
+    assert cross_encoder.pairs == []
+
+def test_adaptive_rerank_stops_once_the_top_n_is_stable(fake_models):
+    """Tests that batches are scored in retrieval order until the top-n stops changing."""
+    cross_encoder, _ = fake_models
+    reranker = rag.LocalRerank(top_n=2, settings=ADAPTIVE)
+    # Close retrieval scores; the fake cross-encoder prefers longer chunks.
+    nodes = _scored_nodes(("aaaa", 0.9), ("bbbbb", 0.89), ("cc", 0.88), ("d", 0.87), ("eee", 0.86), ("f", 0.85))
+    before = rag.rerank_stats()
+
+    top = reranker.postprocess_nodes(nodes, QueryBundle("q"))
+    assert [node.get_content() for node in top] == ["bbbbb", "aaaa"]
+    assert [text for _, text in cross_encoder.pairs] == ["aaaa", "bbbbb", "cc", "d"]
+    after = rag.rerank_stats()
+    assert after["early_exit"] - before["early_exit"] == 1
+    assert after["pairs_skipped"] - before["pairs_skipped"] == 2
+
+def test_adaptive_rerank_skip_uses_vector_scores_under_hybrid_retrieval(fake_models):
+    """Tests that the skip margin is read from vector similarities, not from RRF scores."""
+    cross_encoder, _ = fake_models
+    reranker = rag.LocalRerank(top_n=2, settings=ADAPTIVE)
+    nodes = _fused_nodes(("a", 0.9), ("bb", 0.85), ("ccc", 0.3), ("dddd", None))
+
+    top = reranker.postprocess_nodes(nodes, QueryBundle("q"))
+    assert [node.get_content() for node in top] == ["a", "bb"]
+    assert cross_encoder.pairs == []
+    # Reported scores are the similarities, not the RRF values.
+    assert [source["score"] for source in rag.node_sources(top)] == [0.9, 0.85]
+
+def test_adaptive_rerank_does_not_skip_past_a_lexical_only_hit(fake_models):
+    """Tests that a top-n candidate the vector search did not find forces reranking."""
+    cross_encoder, _ = fake_models
+    reranker = rag.LocalRerank(top_n=2, settings=ADAPTIVE)
+    nodes = _fused_nodes(("a", 0.9), ("bb", None), ("ccc", 0.85), ("dddd", 0.2))
+
+    top = reranker.postprocess_nodes(nodes, QueryBundle("q"))
+    assert cross_encoder.pairs
+    assert {source["score_type"] for source in rag.node_sources(top)} == {"rerank"}
+
+def test_project_overrides_adjust_rerank_settings():
+    """Tests that per-project overrides are layered over the global rerank settings."""
+    mp = pytest.MonkeyPatch()
+    mp.setattr(rag.config, "RERANK_PROJECT_OVERRIDES", {"proj": {"mode": "adaptive", "patience": 2}})
+    try:
+        settings = rag.config.get_rerank_settings("proj")
+        assert settings["mode"] == "adaptive" and settings["patience"] == 2
+        assert settings["batch_size"] == rag.config.RERANK_BATCH_SIZE
+        assert rag.config.get_rerank_settings("other")["mode"] == rag.config.RERANK_MODE
+    finally:
+        mp.undo()
+
+def test_node_sources_report_paths_line_spans_and_scores():
+    """Tests the payload of the 'sources' event, including chunks indexed without line spans."""
+    spanned = TextNode(text="x", metadata={"relative_path": "engine/rag.py", "start_line": 10, "end_line": 24})
+    legacy = TextNode(text="y", metadata={"file_path": "/repo/app.py"})
+
+    sources = rag.node_sources([NodeWithScore(node=spanned, score=0.91234567), NodeWithScore(node=legacy, score=None)])
+    assert sources == [
+        {"path": "engine/rag.py", "start_line": 10, "end_line": 24, "score": 0.9123, "score_type": "retrieval"},
+        {"path": "/repo/app.py", "start_line": None, "end_line": None, "score": None, "score_type": "retrieval"},
+    ]
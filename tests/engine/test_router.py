@@ -0,0 +1,106 @@
+# --- tests/engine/test_router.py ---
+
+import pytest
+import os
+import threading
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from engine.router import QueryRouter
+
+# A tiny, deterministic "embedding": one dimension per route keyword.
+def fake_embed(texts):
+    vectors = []
+    for text in texts:
+        lowered = text.lower()
+        rag = 1.0 if ("architecture" in lowered or "overview" in lowered) else 0.0
+        agent = 1.0 if "contents" in lowered else 0.0
+        norm = (rag ** 2 + agent ** 2) ** 0.5 or 1.0
+        vectors.append([rag / norm, agent / norm])
+    return vectors
+
+EXEMPLARS = [
+    ("Give me an overview of the architecture", "RAG"),
+    ("Show me the contents of a module", "AGENT"),
+]
+
+@pytest.fixture
+def llm_calls():
+    return []
+
+@pytest.fixture
+def router(llm_calls, monkeypatch):
+    # Shadow sampling would make LLM calls at random; test_shadow_samples enables it explicitly.
+    monkeypatch.setattr("config.ROUTER_SHADOW_RATE", 0.0)
+    def llm_router(query, chat_history):
+        llm_calls.append(query)
+        return "RAG"
+    return QueryRouter(llm_router=llm_router, embed_fn=fake_embed, exemplars=EXEMPLARS)
+
+
+def test_rules_route_obvious_agent_commands_without_llm(router, llm_calls):
+    """Tests that command-like queries are routed by the keyword rules alone."""
+    assert router.route("Read the file app.py", []) == "AGENT"
+    assert router.route("Which functions call set_password?", []) == "AGENT"
+    assert router.route("Generate unit tests for hash_password", []) == "AGENT"
+    assert llm_calls == []
+    assert router.stats()["rule_hits"] == 3
+
+def test_edit_verbs_route_to_agent_only_as_commands(router, llm_calls):
+    """Tests that fix/refactor/extract route to the agent as commands but not inside questions."""
+    assert router.route("Fix the crash in parse_config", []) == "AGENT"
+    assert router.route("Could you refactor the validation logic?", []) == "AGENT"
+    assert router.stats()["rule_hits"] == 2
+    for query in [
+        "How does the parser extract tokens?",
+        "What does the debug flag do?",
+        "Explain why we refactor the config on startup",
+        "How do I add tests for the parser?",
+        "What does the workspace module do?",
+    ]:
+        assert router.classify_locally(query, [])[2] != "rules", query
+    assert llm_calls == []
+
+def test_question_shaped_requests_are_not_decided_by_rules(router, llm_calls):
+    """Tests that questions asking for file listings or contents reach the LLM router."""
+    router.route("What files are in the src directory?", [])
+    router.route("What is in main.py?", [])
+    assert llm_calls == ["What files are in the src directory?", "What is in main.py?"]
+    assert router.stats()["rule_hits"] == 0
+
+def test_shadow_samples_are_counted_apart_from_fallbacks(router, llm_calls, monkeypatch):
+    """Tests that sampled fast-path decisions are compared in the background and reported separately."""
+    monkeypatch.setattr("config.ROUTER_SHADOW_RATE", 1.0)
+    assert router.route("Fix the crash in parse_config", []) == "AGENT"
+    done = threading.Event()
+    router._shadow_pool.submit(done.set)
+    assert done.wait(5)
+    stats = router.stats()
+    assert llm_calls == ["Fix the crash in parse_config"]
+    assert stats["shadow_comparisons"] == 1
+    assert stats["shadow_agreement_rate"] == 0.0
+    assert stats["fallback_comparisons"] == 0
+    assert stats["fallback_agreement_rate"] is None
+
+def test_embedding_classifier_handles_confident_matches(router, llm_calls):
+    """Tests that a close exemplar match is routed without the LLM."""
+    assert router.route("Architecture overview please", []) == "RAG"
+    assert llm_calls == []
+    assert router.stats()["embedding_hits"] == 1
+
+def test_low_confidence_falls_back_to_llm_and_is_cached(router, llm_calls):
+    """Tests the LLM fallback for ambiguous queries and the decision cache."""
+    assert router.route("Tell me about login", []) == "RAG"
+    assert router.route("  tell me ABOUT login ", []) == "RAG"
+    assert llm_calls == ["Tell me about login"]
+    stats = router.stats()
+    assert stats["llm_fallbacks"] == 1
+    assert stats["cache_hits"] == 1
+
+def test_history_references_defer_to_llm(router, llm_calls):
+    """Tests that follow-ups referring to the conversation are not decided locally."""
+    history = ["What does the worker do?", "It processes repositories."]
+    router.route("Why does it do that?", history)
+    assert llm_calls == ["Why does it do that?"]
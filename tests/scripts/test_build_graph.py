@@ -0,0 +1,181 @@
+# --- tests/scripts/test_build_graph.py ---
+
+import pytest
+import json
+from pathlib import Path
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from scripts.build_graph import build_code_graph
+
+SAMPLE_FILES = {
+    "pkg/models.py": (
+        "class User:\n"
+        "    def save(self):\n"
+        "        self.validate()\n"
+        "    def validate(self):\n"
+        "        pass\n"
+    ),
+    "pkg/service.py": (
+        "from pkg.models import User\n"
+        "def helper():\n"
+        "    pass\n"
+        "def create_user(repo):\n"
+        "    helper()\n"
+        "    user = User()\n"
+        "    repo.save()\n"
+    ),
+    "pkg/store.py": (
+        "class Store:\n"
+        "    def save(self):\n"
+        "        pass\n"
+    ),
+    "broken.py": "def oops(:\n",
+}
+
+@pytest.fixture
+def sample_project(tmp_path: Path):
+    """Writes a small project to disk and points the graph output at tmp_path."""
+    project_path = tmp_path / "sample"
+    for relative_path, content in SAMPLE_FILES.items():
+        file_path = project_path / relative_path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+
+    mp = pytest.MonkeyPatch()
+    mp.setattr("config.CODE_GRAPH_BASE_PATH", tmp_path / "code_graphs")
+    yield project_path
+    mp.undo()
+
+def _edges(graph):
+    return {(e["source"], e["target"], e["confidence"]) for e in graph["edges"]}
+
+
+def test_build_code_graph_resolves_calls(sample_project, tmp_path):
+    """Tests that definitions and calls of every confidence tier are captured."""
+    stats = build_code_graph("sample", sample_project)
+    graph = json.loads((tmp_path / "code_graphs" / "sample_graph.json").read_text())
+
+    assert {n["id"] for n in graph["nodes"]} == {
+        "pkg/models.py::User",
+        "pkg/models.py::User::save",
+        "pkg/models.py::User::validate",
+        "pkg/service.py::helper",
+        "pkg/service.py::create_user",
+        "pkg/store.py::Store",
+        "pkg/store.py::Store::save",
+    }
+    edges = _edges(graph)
+    assert ("pkg/models.py::User::save", "pkg/models.py::User::validate", 1.0) in edges
+    assert ("pkg/service.py::create_user", "pkg/service.py::helper", 0.9) in edges
+    assert ("pkg/service.py::create_user", "pkg.models.User", 1.0) in edges
+    assert stats["files"] == 4
+    assert stats["failed_files"] == 1
+
+def test_ambiguous_method_calls_split_confidence(sample_project, tmp_path):
+    """Tests that an unresolved call links to every same-named method with split confidence."""
+    build_code_graph("sample", sample_project)
+    graph = json.loads((tmp_path / "code_graphs" / "sample_graph.json").read_text())
+
+    # repo.save() cannot be resolved from imports, and two methods are named 'save'
+    guesses = {(t, c) for s, t, c in _edges(graph) if s == "pkg/service.py::create_user" and c < 0.5}
+    assert guesses == {("pkg/models.py::User::save", 0.2), ("pkg/store.py::Store::save", 0.2)}
+
+def test_heuristic_fallback_skips_overly_common_names(sample_project, tmp_path):
+    """Tests that names with too many definitions produce no guessed edges."""
+    mp = pytest.MonkeyPatch()
+    mp.setattr("config.GRAPH_MAX_HEURISTIC_CANDIDATES", 1)
+    build_code_graph("sample", sample_project)
+    mp.undo()
+    graph = json.loads((tmp_path / "code_graphs" / "sample_graph.json").read_text())
+
+    assert not [e for e in _edges(graph) if e[0] == "pkg/service.py::create_user" and e[2] < 0.5]
+
+def test_parallel_build_matches_serial_build(sample_project, tmp_path):
+    """Tests that the process pool produces exactly the same graph as in-process parsing."""
+    mp = pytest.MonkeyPatch()
+    mp.setattr("config.GRAPH_PARALLEL_MIN_FILES", 10 ** 9)
+    build_code_graph("sample", sample_project)
+    serial = json.loads((tmp_path / "code_graphs" / "sample_graph.json").read_text())
+
+    mp.setattr("config.GRAPH_PARALLEL_MIN_FILES", 0)
+    mp.setattr("config.GRAPH_BUILD_WORKERS", 2)
+    build_code_graph("sample", sample_project)
+    parallel = json.loads((tmp_path / "code_graphs" / "sample_graph.json").read_text())
+    mp.undo()
+
+    assert serial["nodes"] == parallel["nodes"]
+    assert _edges(serial) == _edges(parallel)
+
+def test_csr_format_writes_binary_graph_with_same_content(sample_project, tmp_path):
+    """Tests that the 'csr' format stores the same graph and can still export JSON."""
+    from engine.graph_storage import load_csr_graph
+
+    build_code_graph("sample", sample_project)
+    json_graph = json.loads((tmp_path / "code_graphs" / "sample_graph.json").read_text())
+
+    mp = pytest.MonkeyPatch()
+    mp.setattr("config.CODE_GRAPH_FORMAT", "csr")
+    mp.setattr("config.CODE_GRAPH_EXPORT_JSON", False)
+    (tmp_path / "code_graphs" / "sample_graph.json").unlink()
+    build_code_graph("sample", sample_project)
+    mp.undo()
+
+    assert not (tmp_path / "code_graphs" / "sample_graph.json").exists()
+    csr_graph = load_csr_graph(tmp_path / "code_graphs" / "sample_graph.csr").to_dict()
+    assert csr_graph["nodes"] == json_graph["nodes"]
+    assert _edges(csr_graph) == {(s, t, round(c, 3)) for s, t, c in _edges(json_graph)}
+
+def test_sqlite_format_writes_queryable_graph(sample_project, tmp_path):
+    """Tests that the 'sqlite' format stores the same graph as the JSON build."""
+    from engine.graph_sqlite import SqliteCodeGraph
+
+    build_code_graph("sample", sample_project)
+    json_graph = json.loads((tmp_path / "code_graphs" / "sample_graph.json").read_text())
+
+    mp = pytest.MonkeyPatch()
+    mp.setattr("config.CODE_GRAPH_FORMAT", "sqlite")
+    build_code_graph("sample", sample_project)
+    build_code_graph("sample", sample_project)  # a rebuild replaces, not appends
+    mp.undo()
+
+    store = SqliteCodeGraph(tmp_path / "code_graphs" / "sample_graph.sqlite")
+    assert store.to_dict()["nodes"] == json_graph["nodes"]
+    assert _edges(store.to_dict()) == _edges(json_graph)
+
+def test_incremental_update_matches_full_rebuild(sample_project, tmp_path):
+    """Tests that patching changed files gives the same graph as rebuilding from scratch."""
+    from engine.graph_sqlite import SqliteCodeGraph
+    from scripts.build_graph import graph_commit, update_code_graph
+
+    mp = pytest.MonkeyPatch()
+    mp.setattr("config.CODE_GRAPH_FORMAT", "sqlite")
+    build_code_graph("sample", sample_project, commit="c1")
+    assert graph_commit("sample") == "c1"
+
+    # Store.save disappears, a new save() appears elsewhere, a broken file is removed.
+    (sample_project / "pkg/store.py").write_text("class Store:\n    def load(self):\n        pass\n")
+    (sample_project / "pkg/extra.py").write_text("class Cache:\n    def save(self):\n        self.flush()\n")
+    (sample_project / "broken.py").unlink()
+    stats = update_code_graph("sample", sample_project, {
+        "added": ["pkg/extra.py", "README.md"],
+        "modified": ["pkg/store.py"],
+        "deleted": ["broken.py"],
+    }, commit="c2")
+    assert stats["mode"] == "incremental"
+    assert (stats["files"], stats["removed_files"]) == (2, 1)
+    assert graph_commit("sample") == "c2"
+    incremental = SqliteCodeGraph(tmp_path / "code_graphs" / "sample_graph.sqlite").to_dict()
+
+    mp.setattr("config.CODE_GRAPH_BASE_PATH", tmp_path / "rebuilt")
+    build_code_graph("sample", sample_project)
+    rebuilt = SqliteCodeGraph(tmp_path / "rebuilt" / "sample_graph.sqlite").to_dict()
+    mp.undo()
+
+    assert sorted(n["id"] for n in incremental["nodes"]) == sorted(n["id"] for n in rebuilt["nodes"])
+    assert _edges(incremental) == _edges(rebuilt)
+    # repo.save() now has two equally likely targets.
+    assert ("pkg/service.py::create_user", "pkg/extra.py::Cache::save", 0.2) in _edges(incremental)
@@ -0,0 +1,47 @@
+# --- tests/scripts/test_build_index.py ---
+
+import pytest
+import threading
+import time
+import os
+
+# Make sure the project root is in the path for imports
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from scripts.build_index import _prefetch
+
+
+def test_prefetch_applies_backpressure():
+    """Tests that the producer never runs more than `depth` items ahead of the consumer."""
+    produced = []
+
+    def items():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    stream = _prefetch(items(), depth=2)
+    assert next(stream) == 0
+    time.sleep(0.2)
+    # One item consumed, at most two buffered, and one blocked in put().
+    assert len(produced) <= 4
+    assert list(stream) == list(range(1, 10))
+
+def test_prefetch_propagates_producer_errors():
+    """Tests that an exception raised while producing is re-raised in the consumer."""
+    def items():
+        yield 1
+        raise RuntimeError("read failed")
+
+    stream = _prefetch(items(), depth=2)
+    assert next(stream) == 1
+    with pytest.raises(RuntimeError, match="read failed"):
+        next(stream)
+
+def test_prefetch_stops_producer_when_consumer_stops():
+    """Tests that closing the stream early shuts the producer thread down."""
+    stream = _prefetch(iter(range(1000)), depth=1)
+    next(stream)
+    stream.close()
+    assert not any(t.name == "index-prefetch" for t in threading.enumerate())
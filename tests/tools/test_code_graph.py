@@ -10,7 +10,7 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
 from engine.context import ProjectContext
-from tools.code_graph import QueryCodeGraphTool
+from tools.code_graph import QueryCodeGraphTool, TraceCallGraphTool
 
 # A sample code graph with varying confidence levels
 SAMPLE_GRAPH_WITH_CONFIDENCE = {
@@ -44,6 +44,8 @@ def setup_graph_project(tmp_path: Path):
     mp.setattr("config.VECTOR_STORE_BASE_PATH", data_root / "vector_stores")
     mp.setattr("config.CODE_GRAPH_BASE_PATH", data_root / "code_graphs")
     mp.setattr("config.TARGET_REPO_PATH", tmp_path)
+    mp.setattr("config.REPOS_BASE_PATH", tmp_path)
+    mp.setattr("config.CODE_GRAPH_FORMAT", "json")
     yield ProjectContext(project_id=project_id)
     mp.undo()
 
@@ -78,4 +80,37 @@ def test_query_graph_no_results_with_high_confidence(setup_graph_project):
     """Tests getting no results when confidence threshold is too high."""
     tool = QueryCodeGraphTool(setup_graph_project)
     result = tool.execute(entity_name="func_a", relationship="callees", min_confidence=0.95)
-    assert "No callees found" in result
\ No newline at end of file
+    assert "No callees found" in result
+
+
+def test_query_graph_ambiguous_name_returns_every_match(setup_graph_project):
+    """Tests that every definition sharing a name is reported, not just the first."""
+    ambiguous_graph = {
+        "nodes": [
+            {"id": "a.py::Store::save", "name": "save"},
+            {"id": "b.py::User::save", "name": "save"},
+            {"id": "c.py::caller", "name": "caller"},
+        ],
+        "edges": [
+            {"source": "c.py::caller", "target": "a.py::Store::save", "confidence": 1.0},
+            {"source": "c.py::caller", "target": "b.py::User::save", "confidence": 0.9},
+        ]
+    }
+    setup_graph_project.code_graph_path.write_text(json.dumps(ambiguous_graph))
+    tool = QueryCodeGraphTool(setup_graph_project)
+    result = tool.execute(entity_name="save", relationship="callers")
+    data = json.loads(result)
+    assert {match["entity"]["id"] for match in data} == {"a.py::Store::save", "b.py::User::save"}
+    assert all(match["callers"][0]["name"] == "caller" for match in data)
+
+def test_trace_call_graph_impact_and_path(setup_graph_project):
+    """Tests multi-hop impact sets and call paths through the agent tool's string input."""
+    tool = TraceCallGraphTool(setup_graph_project)
+    impact = json.loads(tool.execute('{"mode": "impact", "entity": "func_b"}'))
+    assert [(node["name"], node["depth"]) for node in impact["nodes"]] == [("func_a", 1), ("method_c", 2)]
+
+    path = json.loads(tool.execute({"mode": "path", "entity": "method_c", "target": "func_b"}))
+    assert [node["name"] for node in path["path"]] == ["method_c", "func_a", "func_b"]
+
+    assert "No call path found" in tool.execute({"mode": "path", "entity": "heuristic_d", "target": "func_b"})
+    assert tool.execute({"mode": "path", "entity": "method_c"}).startswith("Error:")
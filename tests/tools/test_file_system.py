@@ -57,6 +57,8 @@ def setup_project(tmp_path: Path):
     mp.setattr("config.CODE_GRAPH_BASE_PATH", data_root / "code_graphs")
     # This assumes projects are stored in subdirectories of a base repo path
     mp.setattr("config.TARGET_REPO_PATH", project_root.parent)
+    mp.setattr("config.REPOS_BASE_PATH", project_root.parent)
+    mp.setattr("config.CODE_GRAPH_FORMAT", "json")
     yield ProjectContext(project_id="test_project")
     mp.undo()
 
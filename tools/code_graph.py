@@ -1,20 +1,22 @@
 # --- tools/code_graph.py ---
 
 import json
-from engine.context import ProjectContext, ProjectScopedTool
+from engine.context import ProjectScopedTool
+from engine.graph_index import get_graph_index, traverse
+from .utils import parse_tool_input  # pyright: ignore[reportMissingImports]
 
 class QueryCodeGraphTool(ProjectScopedTool):
     """A tool to query the project's structural code graph."""
-    def __init__(self, context: ProjectContext):
-        super().__init__(context)
-        self.graph = self._load_graph()
+    @property
+    def graph(self):
+        # Served from the process-wide cache, which reloads the file when the worker rewrites it.
+        return get_graph_index(self.context.code_graph_path)
 
-    def _load_graph(self):
-        try:
-            with open(self.context.code_graph_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {"nodes": [], "edges": []}
+    @staticmethod
+    def _related_nodes(graph, node_id: str, relationship: str, min_confidence: float) -> list[dict]:
+        # Edge endpoints that are not definitions in this project (e.g. library calls) are skipped.
+        related = (graph.node(neighbor) for neighbor, _ in graph.neighbors(node_id, relationship, min_confidence))
+        return [node for node in related if node is not None]
 
     def execute(self, entity_name: str, relationship: str, min_confidence: float = 0.8) -> str:
         """
@@ -22,35 +24,73 @@ class QueryCodeGraphTool(ProjectScopedTool):
         - entity_name: The name of the function or method to query.
         - relationship: The relationship to find. Must be 'callers' or 'callees'.
         - min_confidence: The minimum confidence score (0.0 to 1.0) for a relationship to be included. Defaults to 0.8.
+        If several definitions share the name, the results are grouped per matching definition.
         """
-        if not self.graph.get("nodes"):
+        graph = self.graph
+        if not len(graph):
             return f"Error: The code graph for project '{self.context.project_id}' is not available or is empty."
 
         if relationship not in ['callers', 'callees']:
             return "Error: Invalid relationship. Must be 'callers' or 'callees'."
 
-        target_node = next((n for n in self.graph['nodes'] if n['name'] == entity_name), None)
+        target_ids = graph.find(entity_name)
 
-        if not target_node:
+        if not target_ids:
             return f"Error: Entity '{entity_name}' not found in the code graph."
 
-        target_id = target_node['id']
-        results = []
-        
-        # --- NEW: Filter edges by the min_confidence score ---
-        relevant_edges = [
-            edge for edge in self.graph['edges'] 
-            if edge.get('confidence', 1.0) >= min_confidence
+        if len(target_ids) == 1:
+            results = self._related_nodes(graph, target_ids[0], relationship, min_confidence)
+            if not results:
+                return f"No {relationship} found for '{entity_name}' with confidence >= {min_confidence}."
+            return json.dumps(results, indent=2)
+
+        # Ambiguous name: report every matching definition instead of picking one.
+        matches = [
+            {"entity": graph.node(target_id), relationship: self._related_nodes(graph, target_id, relationship, min_confidence)}
+            for target_id in target_ids
         ]
+        if not any(match[relationship] for match in matches):
+            return f"No {relationship} found for any of the {len(matches)} definitions named '{entity_name}' with confidence >= {min_confidence}."
+        return json.dumps(matches, indent=2)
 
-        if relationship == 'callers':
-            caller_ids = {edge['source'] for edge in relevant_edges if edge['target'] == target_id}
-            results = [node for node in self.graph['nodes'] if node['id'] in caller_ids]
-        elif relationship == 'callees':
-            callee_ids = {edge['target'] for edge in relevant_edges if edge['source'] == target_id}
-            results = [node for node in self.graph['nodes'] if node['id'] in callee_ids]
+class TraceCallGraphTool(ProjectScopedTool):
+    """A tool for multi-hop questions over the project's code graph."""
+    @property
+    def graph(self):
+        return get_graph_index(self.context.code_graph_path)
 
-        if not results:
-            return f"No {relationship} found for '{entity_name}' with confidence >= {min_confidence}."
+    def execute(self, tool_input: str | dict) -> str:
+        """
+        Follows calls across several hops of the code graph.
+        The input is a JSON-like string or dictionary with:
+        - mode: 'callers' or 'callees' (everything within `depth` hops), 'impact' (every function that
+          directly or indirectly calls the entity, i.e. what a change to it can break) or 'path'
+          (the shortest chain of calls from `entity` to `target`).
+        - entity: The name of the function or method to start from.
+        - target: The function or method to reach (only for mode 'path').
+        - depth: Optional maximum number of hops.
+        - min_confidence: Optional minimum confidence (0.0 to 1.0) for a call to be followed. Defaults to 0.8.
+        """
+        graph = self.graph
+        if not len(graph):
+            return f"Error: The code graph for project '{self.context.project_id}' is not available or is empty."
+
+        try:
+            args = parse_tool_input(tool_input)
+            mode = args["mode"]
+            entity = args["entity"]
+            depth = int(args["depth"]) if args.get("depth") not in (None, "") else None
+            min_confidence = float(args.get("min_confidence", 0.8))
+        except (ValueError, KeyError) as e:
+            return f"Error: Invalid or unparsable tool input. Details: {e}"
+
+        try:
+            result = traverse(graph, mode, entity, target=args.get("target"), depth=depth, min_confidence=min_confidence)
+        except ValueError as e:
+            return f"Error: {e}"
 
-        return json.dumps(results, indent=2)
\ No newline at end of file
+        if mode == "path" and result["path"] is None:
+            return f"No call path found from '{entity}' to '{args.get('target')}' with confidence >= {min_confidence}."
+        if mode != "path" and not result["nodes"]:
+            return f"No {mode} found for '{entity}' with confidence >= {min_confidence}."
+        return json.dumps(result, indent=2)
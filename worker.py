@@ -13,7 +13,7 @@ from git import Repo
 
 # Ensure our scripts and config are importable by the worker
 from scripts.build_index import build_vector_store
-from scripts.build_graph import build_code_graph
+from scripts.build_graph import build_code_graph, update_code_graph, graph_commit
 import config
 
 # Configure logging for the worker process
@@ -31,6 +31,55 @@ def get_project_name_from_url(git_url):
     project_name = Path(path).stem
     return project_name
 
+def sync_repository(git_url: str, repo_path: Path):
+    """
+    Brings the permanent clone at repo_path up to date with git_url.
+    An existing clone of the same remote is fast-forwarded in place so that
+    unchanged files keep their content and the incremental indexer can skip them.
+    Anything else is removed and cloned fresh.
+    """
+    if repo_path.exists():
+        try:
+            repo = Repo(repo_path)
+            origin = repo.remotes.origin
+            if origin.url == git_url:
+                logging.info(f"Updating existing repository at {repo_path}")
+                origin.fetch()
+                # Hard reset (rather than pull) so force-pushed branches are handled too.
+                repo.git.reset("--hard", "@{u}")
+                # Drop untracked and ignored leftovers (old checkouts, build output) so they are not indexed.
+                repo.git.clean("-fdx")
+                logging.info("Repository updated successfully.")
+                return
+        except Exception as e:
+            logging.warning(f"Could not update existing repository in place ({e}); re-cloning.")
+
+        logging.info(f"Removing existing repository at {repo_path}")
+        # Use shutil.rmtree for robust directory deletion
+        shutil.rmtree(repo_path)
+
+    logging.info(f"Cloning repository into: {repo_path}")
+    Repo.clone_from(git_url, repo_path)
+    logging.info("Repository cloned successfully.")
+
+def changed_files(repo_path: Path, old_commit: str, new_commit: str) -> dict | None:
+    """
+    Files added, modified and deleted between two commits, as repo-relative paths.
+    Renames count as a deletion plus an addition. Returns None if the diff
+    cannot be computed (e.g. the old commit is gone after a force push).
+    """
+    try:
+        output = Repo(repo_path).git.diff("--name-status", "--no-renames", "-z", old_commit, new_commit)
+    except Exception as e:
+        logging.warning(f"Could not diff {old_commit}..{new_commit} ({e}).")
+        return None
+    changes = {"added": [], "modified": [], "deleted": []}
+    fields = output.split("\0")
+    for status, path in zip(fields[::2], fields[1::2]):
+        key = {"A": "added", "D": "deleted"}.get(status[:1], "modified")
+        changes[key].append(path)
+    return changes
+
 def process_repository(git_url: str):
     """
     The main RQ job. Clones a repo to a permanent location and processes it.
@@ -55,16 +104,7 @@ def process_repository(git_url: str):
 
         # --- THE FIX: Clone to a permanent directory ---
         repo_path = config.REPOS_BASE_PATH / project_name
-
-        # Clean up any old version before cloning for a fresh start
-        if repo_path.exists():
-            logging.info(f"Removing existing repository at {repo_path}")
-            # Use shutil.rmtree for robust directory deletion
-            shutil.rmtree(repo_path)
-
-        logging.info(f"Cloning repository into: {repo_path}")
-        Repo.clone_from(git_url, repo_path)
-        logging.info("Repository cloned successfully.")
+        sync_repository(git_url, repo_path)
         
         # Update job progress
         if job_id:
@@ -74,7 +114,14 @@ def process_repository(git_url: str):
         
         # --- Run processing functions on the permanent repo path ---
         logging.info("Building vector store...")
-        build_vector_store(project_name, str(repo_path))
+        def report_index_progress(progress: dict):
+            if job_id:
+                job.meta['index_progress'] = progress
+                job.save_meta()
+        index_summary = build_vector_store(project_name, str(repo_path), progress=report_index_progress)
+        if job_id:
+            job.meta['index_summary'] = index_summary
+            job.save_meta()
         
         # Update job progress
         if job_id:
@@ -82,8 +129,20 @@ def process_repository(git_url: str):
             job.meta['message'] = f'Building code graph for {project_name}...'
             job.save_meta()
         
-        logging.info("Building code graph...")
-        build_code_graph(project_name, repo_path)
+        # Patch the stored graph with just the files changed since it was built,
+        # when the graph format keeps enough state to do so.
+        head = Repo(repo_path).head.commit.hexsha
+        previous = graph_commit(project_name)
+        changes = changed_files(repo_path, previous, head) if previous else None
+        if changes is not None:
+            logging.info(f"Updating code graph from {previous[:10]} to {head[:10]}...")
+            graph_summary = update_code_graph(project_name, repo_path, changes, commit=head)
+        else:
+            logging.info("Building code graph...")
+            graph_summary = build_code_graph(project_name, repo_path, commit=head)
+        if job_id:
+            job.meta['graph_summary'] = graph_summary
+            job.save_meta()
         
         # Update job progress
         if job_id:
@@ -106,4 +165,13 @@ def process_repository(git_url: str):
             job.save_meta()
         
         # Re-raise the exception to mark the job as failed in RQ
-        raise
\ No newline at end of file
+        raise
+
+if __name__ == "__main__":
+    # Running the worker through this module (instead of the bare `rq worker` CLI)
+    # lets us load the models once in the parent; forked job processes inherit them.
+    if config.WARM_START_MODELS:
+        from engine.models import warm_up_models
+        warm_up_models()
+    worker = Worker([Queue(name, connection=conn) for name in listen], connection=conn)
+    worker.work()